@@ -0,0 +1,154 @@
+"""Load generator for the chat graph.
+
+Drives concurrent multi-turn conversations through Graph.arun in-process,
+the same path /api/chat takes, and reports latency percentiles per
+concurrency level. By default the LLM is the offline stub (LLM_PROVIDER=stub),
+so the numbers measure the orchestration layer itself.
+
+    python -m backend.benchmarks.chat_load
+    python -m backend.benchmarks.chat_load --concurrency 1 16 64 --conversations 128 --turns 3
+    LLM_STUB_LATENCY_MS=800 LLM_STUB_TOKENS=200 python -m backend.benchmarks.chat_load
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+
+QUESTIONS = (
+    "What was the maximum roll angle during segment {n}?",
+    "Were there any GPS dropouts around minute {n}?",
+    "How large did the EKF velocity variance get in the first {n} minutes?",
+    "When was the attitude error largest, and how large was it (run {n})?",
+)
+PERCENTILES = (50, 90, 99)
+
+
+def create_flight(duration_s: float) -> str:
+    """Store a synthetic flight so the analyzer has real columns to call tools on."""
+    from backend.benchmarks.ingest_benchmark import synthetic_log
+    from backend.services.data_processor import ingest_messages
+    from backend.services.session_store import get_session_store
+
+    session = get_session_store().create_session(ingest_messages(synthetic_log(duration_s)))
+    return session.flight_id
+
+
+async def run_conversation(index: int, flight_id: Optional[str], turns: int, latencies: List[float],
+                           errors: List[str]) -> None:
+    """One conversation: the same steps as the /api/chat handler, turn after turn."""
+    from backend.graph import Graph
+    from backend.services.conversation_store import get_conversation_store
+
+    store = get_conversation_store()
+    conversation_id = f"load-{index}"
+    for turn in range(turns):
+        question = QUESTIONS[(index + turn) % len(QUESTIONS)].format(n=index * turns + turn)
+        conversation = store.get_or_create(conversation_id)
+        store.append_message(conversation_id, "user", question)
+        conversation["messages"].append({"role": "user", "content": question})
+        conversation["message_count"] += 1
+
+        start = time.perf_counter()
+        try:
+            final_state = await Graph(conversation=conversation, data={"flight_id": flight_id}).arun()
+        except Exception as e:
+            errors.append(f"{type(e).__name__}: {e}")
+            continue
+        latencies.append(time.perf_counter() - start)
+
+        answer = final_state.get("analysis") or final_state.get("clarification_question") or ""
+        store.append_message(conversation_id, "assistant", answer)
+
+
+async def run_level(concurrency: int, conversations: int, turns: int, flight_id: Optional[str],
+                    first_index: int = 0) -> Dict[str, Any]:
+    """Run the conversations with at most `concurrency` of them in flight at once.
+
+    Conversations are numbered from first_index, so later levels ask new
+    questions rather than hitting the response cache.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+    errors: List[str] = []
+
+    async def bounded(index: int) -> None:
+        async with semaphore:
+            await run_conversation(index, flight_id, turns, latencies, errors)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(bounded(i) for i in range(first_index, first_index + conversations)))
+    elapsed = time.perf_counter() - start
+
+    result = {
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "errors": len(errors),
+        "elapsed_s": elapsed,
+        "throughput_rps": len(latencies) / elapsed if elapsed else 0.0,
+    }
+    if latencies:
+        for p, value in zip(PERCENTILES, np.percentile(latencies, PERCENTILES)):
+            result[f"p{p}_ms"] = float(value) * 1000
+        result["max_ms"] = max(latencies) * 1000
+    if errors:
+        result["first_error"] = errors[0]
+    return result
+
+
+async def run_levels(levels: List[int], conversations: int, turns: int, flight_id: Optional[str]) -> List[Dict[str, Any]]:
+    # one event loop for every level, since the async HTTP client is bound to the loop it started on
+    results = []
+    for level, concurrency in enumerate(levels):
+        result = await run_level(concurrency, conversations, turns, flight_id, level * conversations)
+        print_result(result)
+        results.append(result)
+    return results
+
+
+def print_result(result: Dict[str, Any]) -> None:
+    percentiles = "  ".join(f"p{p} {result.get(f'p{p}_ms', float('nan')):8.1f} ms" for p in PERCENTILES)
+    print(f"concurrency {result['concurrency']:>4}: {result['requests']:>5} requests "
+          f"{result['throughput_rps']:8.1f} req/s  {percentiles}  errors {result['errors']}")
+    if "first_error" in result:
+        print(f"    first error: {result['first_error']}")
+
+
+def main_cli() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--conversations", type=int, default=64, help="conversations per concurrency level")
+    parser.add_argument("--turns", type=int, default=2, help="user messages per conversation")
+    parser.add_argument("--provider", default="stub", help="LLM_PROVIDER to run against (stub or openai)")
+    parser.add_argument("--flight-id", help="use a stored flight instead of generating a synthetic one")
+    parser.add_argument("--flight-minutes", type=float, default=10)
+    parser.add_argument("--json", type=Path, help="also write the results to this file")
+    args = parser.parse_args()
+
+    # before any client is created; the provider is read on first use
+    os.environ["LLM_PROVIDER"] = args.provider
+    sys.path.insert(0, str(REPO_ROOT))
+    if args.json:
+        args.json = args.json.resolve()
+    if args.flight_id is None:
+        # keep generated sessions, caches and metadata out of the working tree
+        os.chdir(tempfile.mkdtemp(prefix="chat_load_"))
+    flight_id = args.flight_id or create_flight(args.flight_minutes * 60)
+
+    results = asyncio.run(run_levels(args.concurrency, args.conversations, args.turns, flight_id))
+
+    if args.json:
+        args.json.write_text(json.dumps({"provider": args.provider, "flight_id": flight_id, "levels": results}, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
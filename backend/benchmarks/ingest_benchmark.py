@@ -0,0 +1,231 @@
+"""Throughput benchmark for the flight-data ingest and export pipeline.
+
+Generates synthetic ArduPilot-shaped logs and times each stage of
+process_messages. Every case runs in a fresh process so peak RSS is per case.
+
+    python -m backend.benchmarks.ingest_benchmark                    # all cases
+    python -m backend.benchmarks.ingest_benchmark --cases 1m 10m --repeat 3
+    python -m backend.benchmarks.ingest_benchmark --save-baseline    # record this machine's numbers
+    python -m backend.benchmarks.ingest_benchmark --check            # exit 1 on regression
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from pathlib import Path
+from typing import Any, Dict, List
+
+import numpy as np
+
+BASELINE_PATH = Path(__file__).resolve().parent / "baselines.json"
+REPO_ROOT = Path(__file__).resolve().parents[2]
+
+CASES = {
+    "1m": 60,
+    "10m": 10 * 60,
+    "30m": 30 * 60,
+    "2h": 2 * 60 * 60,
+}
+DEFAULT_TOLERANCE = 0.2
+
+# (rate Hz, fields) per message type, roughly a copter with default LOG_BITMASK
+MESSAGE_RATES = {
+    "ATT": (25, ["DesRoll", "Roll", "DesPitch", "Pitch", "DesYaw", "Yaw", "ErrRP", "ErrYaw", "AEKF"]),
+    "AHR2": (10, ["Roll", "Pitch", "Yaw", "Alt", "Lat", "Lng", "Q1", "Q2", "Q3", "Q4"]),
+    "GPS[0]": (5, ["I", "Status", "GMS", "GWk", "NSats", "HDop", "Lat", "Lng", "Alt", "Spd", "GCrs", "VZ", "Yaw", "U"]),
+    "XKF4[0]": (10, ["C", "SV", "SP", "SH", "SM", "SVT", "errRP", "OFN", "OFE", "FS", "TS", "SS", "GPS", "PI"]),
+    "XKF4[1]": (10, ["C", "SV", "SP", "SH", "SM", "SVT", "errRP", "OFN", "OFE", "FS", "TS", "SS", "GPS", "PI"]),
+}
+
+
+def synthetic_log(duration_s: float, seed: int = 0) -> Dict[str, Dict[str, List[Any]]]:
+    """A FlightDataRequest-style messages dict: lists of samples per field, as the frontend sends."""
+    rng = np.random.default_rng(seed)
+    messages = {}
+    for msg_type, (rate, fields) in MESSAGE_RATES.items():
+        count = int(duration_s * rate)
+        # scheduler jitter of a few percent of the logging interval
+        time_ms = np.arange(count) * (1000.0 / rate) + rng.normal(0, 0.02 * 1000.0 / rate, count)
+        time_ms = np.maximum.accumulate(np.round(time_ms, 3))
+        phase = time_ms / 1000.0
+        columns = {"time_boot_ms": time_ms, "TimeUS": time_ms * 1000.0}
+        for i, field in enumerate(fields):
+            if field in ("Lat",):
+                values = -35.363261 + np.cumsum(rng.normal(0, 1e-6, count))
+            elif field in ("Lng",):
+                values = 149.165230 + np.cumsum(rng.normal(0, 1e-6, count))
+            elif field in ("I", "C", "AEKF", "Status", "NSats", "GWk", "U", "FS", "TS", "SS", "GPS", "PI"):
+                values = np.full(count, float(i % 4 + 3)).round()
+            else:
+                values = 10.0 * np.sin(phase / (5.0 + i)) + rng.normal(0, 0.1, count)
+            columns[field] = values
+        messages[msg_type] = {name: values.tolist() for name, values in columns.items()}
+    return messages
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss / (1024 * 1024) if sys.platform == "darwin" else maxrss / 1024
+
+
+def run_case(duration_s: float, seed: int = 0) -> Dict[str, Any]:
+    """Run the pipeline once over a synthetic log, in a scratch working directory."""
+    sys.path.insert(0, str(REPO_ROOT))
+    os.chdir(tempfile.mkdtemp(prefix="ingest_benchmark_"))
+    Path("flight_data_exports").mkdir()
+
+    import main
+    from backend.services.data_processor import ingest_messages
+    from backend.services.session_store import SessionStore, get_session_store
+
+    messages = synthetic_log(duration_s, seed)
+    samples = sum(len(fields["time_boot_ms"]) for fields in messages.values())
+    rss_before = peak_rss_mb()
+    stages: Dict[str, float] = {}
+
+    def timed(stage: str, func, *args):
+        start = time.perf_counter()
+        result = func(*args)
+        stages[stage] = stages.get(stage, 0.0) + time.perf_counter() - start
+        return result
+
+    total_start = time.perf_counter()
+    # the same steps as process_messages / process_columns, one message type at a time
+    store = timed("ingest_messages", ingest_messages, messages)
+    # a store of its own, so the end-to-end run below doesn't find this flight and append to it
+    session = timed("create_session", SessionStore(Path("stepwise_sessions")).create_session, store)
+    output_dir = Path("flight_data_exports")
+    processed_data = {"generated_timestamp": "benchmark", "message_types": {}}
+    for msg_type in session.message_types:
+        msg_data = session.get_columns(msg_type)
+        timed("create_csv_for_message_type", main.create_csv_for_message_type, msg_type, msg_data, output_dir, "benchmark")
+        processed_data["message_types"][msg_type] = timed(
+            "create_message_metadata", main.create_message_metadata, msg_type, msg_data)
+    timed("export_metadata_to_json", main.export_metadata_to_json, processed_data)
+    total = time.perf_counter() - total_start
+
+    # end-to-end through the real entry point, including the parallel ingest pool
+    start = time.perf_counter()
+    main.process_messages(messages)
+    process_messages_s = time.perf_counter() - start
+    if len(get_session_store().list_sessions()) != 1:
+        raise RuntimeError("process_messages did not store the log as a new flight")
+
+    return {
+        "duration_s": duration_s,
+        "samples": samples,
+        "stages_s": stages,
+        "total_s": total,
+        "process_messages_s": process_messages_s,
+        "samples_per_s": samples / process_messages_s,
+        "input_rss_mb": rss_before,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def run_isolated(duration_s: float, seed: int) -> Dict[str, Any]:
+    # a fresh interpreter per case so ru_maxrss is not inherited from earlier cases
+    with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as executor:
+        return executor.submit(run_case, duration_s, seed).result()
+
+
+def median_result(results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Per-metric median over repeated runs."""
+    merged = dict(results[0])
+    for key in ("total_s", "process_messages_s", "samples_per_s", "input_rss_mb", "peak_rss_mb"):
+        merged[key] = float(np.median([result[key] for result in results]))
+    merged["stages_s"] = {
+        stage: float(np.median([result["stages_s"][stage] for result in results]))
+        for stage in results[0]["stages_s"]
+    }
+    return merged
+
+
+def environment() -> Dict[str, Any]:
+    return {
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "cpu_count": os.cpu_count(),
+        "ingest_workers": os.getenv("INGEST_WORKERS"),
+    }
+
+
+def compare(name: str, result: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Regressions of one case against its baseline, as human-readable lines."""
+    regressions = []
+    if result["samples_per_s"] < baseline["samples_per_s"] * (1 - tolerance):
+        regressions.append(f"{name}: throughput {result['samples_per_s']:.0f} samples/s "
+                           f"< baseline {baseline['samples_per_s']:.0f}")
+    if result["peak_rss_mb"] > baseline["peak_rss_mb"] * (1 + tolerance):
+        regressions.append(f"{name}: peak RSS {result['peak_rss_mb']:.0f} MB > baseline {baseline['peak_rss_mb']:.0f} MB")
+    for stage, seconds in result["stages_s"].items():
+        expected = baseline["stages_s"].get(stage)
+        # sub-10ms stages are too noisy to gate on
+        if expected is not None and seconds > 0.01 and seconds > expected * (1 + tolerance):
+            regressions.append(f"{name}: {stage} {seconds * 1000:.1f} ms > baseline {expected * 1000:.1f} ms")
+    return regressions
+
+
+def print_result(name: str, result: Dict[str, Any]) -> None:
+    print(f"{name}: {result['samples']} samples, {result['samples_per_s']:.0f} samples/s, "
+          f"peak RSS {result['peak_rss_mb']:.0f} MB (input {result['input_rss_mb']:.0f} MB)")
+    for stage, seconds in result["stages_s"].items():
+        print(f"    {stage:<30} {seconds * 1000:10.1f} ms")
+    print(f"    {'process_messages (end to end)':<30} {result['process_messages_s'] * 1000:10.1f} ms")
+
+
+def main_cli() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cases", nargs="+", choices=list(CASES), default=list(CASES))
+    parser.add_argument("--repeat", type=int, default=1, help="runs per case; the median is reported")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--save-baseline", action="store_true", help=f"write results to {BASELINE_PATH.name}")
+    parser.add_argument("--check", action="store_true", help="compare with the saved baseline, exit 1 on regression")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument("--json", type=Path, help="also write the results to this file")
+    args = parser.parse_args()
+
+    results = {}
+    for name in args.cases:
+        runs = [run_isolated(CASES[name], args.seed) for _ in range(args.repeat)]
+        results[name] = median_result(runs)
+        print_result(name, results[name])
+
+    report = {"environment": environment(), "cases": results}
+    if args.json:
+        args.json.write_text(json.dumps(report, indent=2))
+
+    if args.save_baseline:
+        baselines = json.loads(BASELINE_PATH.read_text()) if BASELINE_PATH.exists() else {"cases": {}}
+        baselines["environment"] = report["environment"]
+        baselines["cases"].update(results)
+        BASELINE_PATH.write_text(json.dumps(baselines, indent=2))
+        print(f"Saved baseline for {', '.join(results)} to {BASELINE_PATH}")
+
+    if args.check:
+        if not BASELINE_PATH.exists():
+            print(f"No baseline at {BASELINE_PATH}; run with --save-baseline first")
+            return 1
+        baselines = json.loads(BASELINE_PATH.read_text())
+        regressions = []
+        for name, result in results.items():
+            if name in baselines["cases"]:
+                regressions += compare(name, result, baselines["cases"][name], args.tolerance)
+            else:
+                print(f"{name}: no baseline, skipped")
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
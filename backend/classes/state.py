@@ -29,4 +29,6 @@ class AnalysisState(InputState):
     conversation: Dict[str, Any] 
     can_analyze: bool
     clarification_question: str
+    analysis: str
+    anomalies: List[Dict[str, Any]]
 
@@ -1,17 +1,28 @@
 import logging
-from typing import Any, Dict, List
+import threading
+from typing import Any, AsyncIterator, Dict, List
 
 from langchain_core.messages import SystemMessage
+from langchain_core.runnables import RunnableLambda
 from langgraph.graph import StateGraph
 
 from .classes.state import InputState, AnalysisState
 from .nodes import Validator
 from .nodes.analyzer import Analyzer
 from .nodes.response_handler import ResponseHandler
+from .services.metrics import span, traced
 
 logger = logging.getLogger(__name__)
 
+NODE_NAMES = ("validator", "analyzer", "response_handler")
+
+
 class Graph:
+    # The workflow and its nodes (with their HTTP clients) are built once per
+    # process; per-request data only travels through InputState.
+    _compiled_graph = None
+    _compile_lock = threading.Lock()
+
     def __init__(self, conversation: List[Dict[str, Any]], data: Dict[str, Any]):
         
         # Initialize InputState
@@ -23,39 +34,51 @@ class Graph:
             ]
         )
 
-        # Initialize nodes
-        self._init_nodes()
-        self._build_workflow()
+        self.compiled_graph = self.get_compiled_graph()
 
-    def _init_nodes(self):
+    @classmethod
+    def get_compiled_graph(cls):
+        """Return the process-wide compiled workflow, building it on first use"""
+        with cls._compile_lock:
+            if cls._compiled_graph is None:
+                with span("graph", "compile"):
+                    cls._init_nodes()
+                    cls._build_workflow()
+                    cls._compiled_graph = cls.workflow.compile()
+            return cls._compiled_graph
+
+    @classmethod
+    def _init_nodes(cls):
         """Initialize all workflow nodes"""
-        self.validator = Validator()
-        self.analyzer = Analyzer()
-        self.response_handler = ResponseHandler()
-        self.route_after_validation = self._route_after_validation
+        cls.validator = Validator()
+        cls.analyzer = Analyzer()
+        cls.response_handler = ResponseHandler()
     
-    def _route_after_validation(self, state: AnalysisState) -> str:
-        print("validating")
+    @staticmethod
+    def _route_after_validation(state: AnalysisState) -> str:
         if state.get("can_analyze", False):
             return "analyzer"  # ← This string becomes the lookup key
         else:
             return "response_handler"  # ← This string becomes the lookup key
     
-    def _build_workflow(self):
+    @classmethod
+    def _build_workflow(cls):
         """Configure the state graph workflow"""
-        self.workflow = StateGraph(AnalysisState)
+        cls.workflow = StateGraph(AnalysisState)
         
-        # Add nodes with their respective processing functions
-        self.workflow.add_node("validator", self.validator.run)
-        self.workflow.add_node("analyzer", self.analyzer.run)
-        self.workflow.add_node("response_handler", self.response_handler.run)
+        # Add nodes with their respective processing functions; the async
+        # variants are used when the graph runs through ainvoke(). Each node
+        # runs inside a trace span.
+        for name, node in (("validator", cls.validator), ("analyzer", cls.analyzer),
+                           ("response_handler", cls.response_handler)):
+            cls.workflow.add_node(name, RunnableLambda(traced("node", name)(node.run), afunc=traced("node", name)(node.arun)))
         # Set entry point
-        self.workflow.set_entry_point("validator")
+        cls.workflow.set_entry_point("validator")
 
         # Add conditional edge from validator
-        self.workflow.add_conditional_edges(
+        cls.workflow.add_conditional_edges(
             "validator",  # source node
-            self.route_after_validation,  # router function
+            cls._route_after_validation,  # router function
             # dictionary mapping required by LangGraph API
             # this says: when route_after_validation returns "analyzer", go to the analyzer node
             {
@@ -65,25 +88,41 @@ class Graph:
         )
 
         # Both nodes can be terminal, so set multiple finish points
-        self.workflow.set_finish_point("analyzer")
-        self.workflow.set_finish_point("response_handler")
+        cls.workflow.set_finish_point("analyzer")
+        cls.workflow.set_finish_point("response_handler")
 
  
 
     def run(self) -> Dict[str, Any]:
         """Execute the workflow synchronously"""
-        print("compiling graph")
-        compiled_graph = self.workflow.compile()
-        print("graph compiled")
-        
         # Use invoke() for synchronous execution instead of astream()
-        print("invoking graph")
-        final_state = compiled_graph.invoke(
-            self.input_state,
-        )
-        print("graph invoked")
-        return final_state
+        with span("graph", "invoke"):
+            return self.compiled_graph.invoke(
+                self.input_state,
+            )
+
+    async def arun(self) -> Dict[str, Any]:
+        """Execute the workflow asynchronously"""
+        with span("graph", "invoke"):
+            return await self.compiled_graph.ainvoke(
+                self.input_state,
+            )
+
+    async def astream_events(self) -> AsyncIterator[Dict[str, Any]]:
+        """Execute the workflow, yielding node progress, LLM tokens and the final state"""
+        async for event in self.compiled_graph.astream_events(self.input_state, version="v2"):
+            kind = event["event"]
+            name = event.get("name")
+
+            if kind == "on_custom_event" and name == "token":
+                yield {"event": "token", **event["data"]}
+            elif kind == "on_chain_start" and name in NODE_NAMES:
+                yield {"event": "node_start", "node": name}
+            elif kind == "on_chain_end" and name in NODE_NAMES:
+                yield {"event": "node_end", "node": name, "output": event["data"].get("output")}
+            elif kind == "on_chain_end" and not event.get("parent_ids"):
+                # the root run ends with the final graph state
+                yield {"event": "final", "state": event["data"].get("output")}
 
     def compile(self):
-        graph = self.workflow.compile()
-        return graph
\ No newline at end of file
+        return self.get_compiled_graph()
\ No newline at end of file
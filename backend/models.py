@@ -1,5 +1,5 @@
 from pydantic import BaseModel, field_validator
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
 from enum import Enum
 
 
@@ -13,6 +13,8 @@ class AllowedMessagTypes(str, Enum):
 # Pydantic models for request validation
 class FlightDataRequest(BaseModel):
     messages: Dict[str, Any]
+    vehicle: Optional[str] = None  # copter, plane, rover or tracker; selects the field catalog
+    flight_id: Optional[str] = None  # append to this stored flight instead of creating a new one
 
 
     @field_validator('messages')
@@ -25,4 +27,5 @@ class FlightDataRequest(BaseModel):
 # input to the chat endpoint
 class ChatRequest(BaseModel):
     conversation_id: str
-    user_query: str
\ No newline at end of file
+    user_query: str
+    flight_id: Optional[str] = None
\ No newline at end of file
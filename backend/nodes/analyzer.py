@@ -1,8 +1,19 @@
-
+import asyncio
+import functools
 import logging
 import dotenv
+
+from langchain_core.callbacks import adispatch_custom_event
+
+from ..services.analysis_tools import TOOL_SCHEMAS, call_tool
+from ..services.anomaly_detection import get_event_index, summarize_events
+from ..services.history_manager import build_prompt, get_history_manager, history_key
+from ..services.llm_clients import acomplete_with_tools, complete_with_tools
+from ..services.response_cache import get_response_cache
+from ..services.session_store import get_session_store
+from .validator import describe_available_data, get_flight_id, get_last_user_message
 from ..classes import InputState, AnalysisState
-from typing import Any, Dict
+from typing import Any, Dict, List
 
 dotenv.load_dotenv()
 logger = logging.getLogger(__name__)
@@ -10,11 +21,102 @@ logger = logging.getLogger(__name__)
 
 class Analyzer:
     def __init__(self) -> None:
-        pass
+        self.session_store = get_session_store()
+        self.history_manager = get_history_manager()
+        self.response_cache = get_response_cache()
+
+    def _get_session(self, state: AnalysisState):
+        flight_id = get_flight_id(state)
+        if flight_id is None:
+            return None, {"analysis": "No flight has been selected for analysis.", "anomalies": []}
+        try:
+            return self.session_store.get(flight_id), None
+        except KeyError:
+            return None, {"analysis": f"Flight {flight_id} has not been processed.", "anomalies": []}
 
     def analyze(self, state: AnalysisState) -> Dict[str, Any]:
-        print("analyzing")
-        return state
+        logger.debug("Analyzing")
+        session, missing = self._get_session(state)
+        if session is None:
+            return missing
+
+        events = get_event_index(session)["events"]
+        user_query = get_last_user_message(state)
+        summary, recent = self.history_manager.compact(state["conversation"])
+        # the same question after the same history, about the same flight revision, skips the tool loop
+        context = history_key(summary, recent)
+        analysis = self.response_cache.get(session.flight_id, user_query, ANALYSIS_PROMPT_VERSION, session.revision, context)
+        if analysis is not None:
+            return {"analysis": analysis, "anomalies": events}
+        try:
+            # numbers come from tools over the local columns, never from raw data in the prompt
+            analysis = complete_with_tools(
+                build_analysis_messages(summary, recent, describe_available_data(session.flight_id)),
+                TOOL_SCHEMAS,
+                functools.partial(call_tool, session),
+                model="gpt-4.1",
+                temperature=0
+            )
+            self.response_cache.set(
+                session.flight_id, user_query, ANALYSIS_PROMPT_VERSION, analysis, session.revision, context
+            )
+        except Exception as e:
+            logger.error(f"Error running analysis tools: {e}")
+            analysis = summarize_events(events)
+        return {"analysis": analysis, "anomalies": events}
+
+    async def aanalyze(self, state: AnalysisState) -> Dict[str, Any]:
+        logger.debug("Analyzing")
+        session, missing = self._get_session(state)
+        if session is None:
+            return missing
+
+        # the first call per flight scans every column, so keep it off the event loop
+        events = (await asyncio.to_thread(get_event_index, session))["events"]
+        user_query = get_last_user_message(state)
+        summary, recent = await self.history_manager.acompact(state["conversation"])
+        context = history_key(summary, recent)
+        analysis = await asyncio.to_thread(
+            self.response_cache.get, session.flight_id, user_query, ANALYSIS_PROMPT_VERSION, session.revision, context
+        )
+        if analysis is not None:
+            return {"analysis": analysis, "anomalies": events}
+        try:
+            available_data = await asyncio.to_thread(describe_available_data, session.flight_id)
+            analysis = await acomplete_with_tools(
+                build_analysis_messages(summary, recent, available_data),
+                TOOL_SCHEMAS,
+                functools.partial(call_tool, session),
+                model="gpt-4.1",
+                temperature=0
+            )
+            await asyncio.to_thread(
+                self.response_cache.set, session.flight_id, user_query, ANALYSIS_PROMPT_VERSION, analysis,
+                session.revision, context
+            )
+        except Exception as e:
+            logger.error(f"Error running analysis tools: {e}")
+            analysis = summarize_events(events)
+        return {"analysis": analysis, "anomalies": events}
 
     def run(self, state: InputState) -> Dict[str, Any]:
-        return self.analyze(state)
\ No newline at end of file
+        return self.analyze(state)
+
+    async def arun(self, state: InputState) -> Dict[str, Any]:
+        result = await self.aanalyze(state)
+        await adispatch_custom_event("token", {"node": "analyzer", "token": result["analysis"]})
+        return result
+
+
+# bump when the analysis prompt or tools change so cached answers are not reused
+ANALYSIS_PROMPT_VERSION = "analysis-v1"
+ANALYSIS_SYSTEM_PROMPT = """You are an expert flight engineer analyzing an ArduPilot flight log.
+Use the tools to get every number you report: the message types and fields of the flight are listed below
+(list_fields returns the same, with time ranges), then use field_stats, argmax_time, threshold_crossings, correlation or lookup_events.
+Never estimate values yourself. Times are time_boot_ms; report them in seconds.
+Answer concisely and give units where the field implies them."""
+
+
+def build_analysis_messages(summary: str, recent: List[Dict[str, str]], available_data: str = "") -> List[Dict[str, str]]:
+    # system prompt and flight fields first, so the prefix is identical on every turn about this flight
+    return build_prompt(ANALYSIS_SYSTEM_PROMPT, summary, recent, available_data)
@@ -1,25 +1,111 @@
+import asyncio
 import logging
 import dotenv
-from openai import OpenAI
 
 
+from langchain_core.callbacks import adispatch_custom_event
+
+from ..services.history_manager import build_prompt, get_history_manager, history_key
+from ..services.llm_clients import astream_chat_completion, complete, get_async_openai_client, get_openai_client
+from ..services.response_cache import get_response_cache
+from .validator import describe_available_data, get_flight_id, get_flight_revision, get_last_user_message
 from ..classes import AnalysisState
-from typing import Any, Dict
+from typing import Any, Dict, List
 
 dotenv.load_dotenv()
 logger = logging.getLogger(__name__)    
 
 class ResponseHandler:
     def __init__(self): 
-        self.openai_client = OpenAI()
+        self.openai_client = get_openai_client()
+        self.async_openai_client = get_async_openai_client()
+        self.response_cache = get_response_cache()
+        self.history_manager = get_history_manager()
     
     def handle_response(self, state: AnalysisState) -> Dict[str, Any]:
-        print("handling response")
+        logger.debug("Handling response")
+        user_query = get_last_user_message(state)
+        flight_id = get_flight_id(state)
+        revision = get_flight_revision(flight_id)
+
+        # the prompt includes the conversation, so answers are only reused after the same history
+        summary, recent = self.history_manager.compact(state["conversation"])
+        context = history_key(summary, recent)
+        clarification_question = self.response_cache.get(
+            flight_id, user_query, CLARIFICATION_PROMPT_VERSION, revision, context
+        )
+        if clarification_question is None:
+            try:
+                response = complete(
+                    self.openai_client,
+                    model="gpt-4.1",
+                    messages=build_clarification_messages(summary, recent, describe_available_data(flight_id)),
+                    temperature=0
+                )
+                clarification_question = response.choices[0].message.content
+                self.response_cache.set(
+                    flight_id, user_query, CLARIFICATION_PROMPT_VERSION, clarification_question, revision, context
+                )
+            except Exception as e:
+                logger.error(f"Error generating clarification question: {e}")
+                clarification_question = DEFAULT_CLARIFICATION
+
+        analysis_state = {
+            "clarification_question": clarification_question,
+        }
+        return analysis_state
+
+    async def ahandle_response(self, state: AnalysisState) -> Dict[str, Any]:
+        logger.debug("Handling response")
+        user_query = get_last_user_message(state)
+        flight_id = get_flight_id(state)
+        revision = await asyncio.to_thread(get_flight_revision, flight_id)
+
+        # the prompt includes the conversation, so answers are only reused after the same history
+        summary, recent = await self.history_manager.acompact(state["conversation"])
+        context = history_key(summary, recent)
+        clarification_question = await asyncio.to_thread(
+            self.response_cache.get, flight_id, user_query, CLARIFICATION_PROMPT_VERSION, revision, context
+        )
+        if clarification_question is not None:
+            # cached answers still reach streaming clients, as a single token
+            await adispatch_custom_event("token", {"node": "response_handler", "token": clarification_question})
+        else:
+            # tokens are streamed to /api/chat/stream as they arrive
+            try:
+                available_data = await asyncio.to_thread(describe_available_data, flight_id)
+                clarification_question = await astream_chat_completion(
+                    "response_handler",
+                    build_clarification_messages(summary, recent, available_data),
+                    model="gpt-4.1",
+                    temperature=0
+                )
+                await asyncio.to_thread(
+                    self.response_cache.set, flight_id, user_query, CLARIFICATION_PROMPT_VERSION, clarification_question,
+                    revision, context
+                )
+            except Exception as e:
+                logger.error(f"Error generating clarification question: {e}")
+                clarification_question = DEFAULT_CLARIFICATION
 
         analysis_state = {
-            "clarification_question": "what u talkin bout willis",
+            "clarification_question": clarification_question,
         }
         return analysis_state
     
     def run(self, state: AnalysisState) -> Dict[str, Any]:
-        return self.handle_response(state)
\ No newline at end of file
+        return self.handle_response(state)
+
+    async def arun(self, state: AnalysisState) -> Dict[str, Any]:
+        return await self.ahandle_response(state)
+
+
+CLARIFICATION_PROMPT_VERSION = "clarification-v3"
+DEFAULT_CLARIFICATION = "I can't answer that from the flight data yet. Could you clarify what you'd like to know about the flight?"
+
+
+CLARIFICATION_SYSTEM_PROMPT = "You are an expert flight data analyst. The user's question can't be answered from the processed flight data. Ask one short clarifying question."
+
+
+def build_clarification_messages(summary: str, recent: List[Dict[str, str]], available_data: str = "") -> List[Dict[str, str]]:
+    return build_prompt(CLARIFICATION_SYSTEM_PROMPT, summary, recent, available_data)
@@ -1,64 +1,149 @@
+import asyncio
 import logging
 import dotenv
-from openai import OpenAI
 
 
+from ..services.analysis_tools import list_fields
+from ..services.llm_clients import acomplete, complete, get_async_openai_client, get_openai_client
+from ..services.session_store import get_session_store
+from ..services.response_cache import get_response_cache
 from ..classes import InputState, AnalysisState
-from typing import Any, Dict
+from typing import Any, Dict, List, Optional
 
 dotenv.load_dotenv()
 logger = logging.getLogger(__name__)    
 
 class Validator:
     def __init__(self): 
-        self.openai_client = OpenAI()
+        self.openai_client = get_openai_client()
+        self.async_openai_client = get_async_openai_client()
+        self.response_cache = get_response_cache()
 
     def validate(self, state: InputState) -> AnalysisState:
         user_query = get_last_user_message(state)
-        can_analyze = run_validation_prompt(user_query)
+        flight_id = get_flight_id(state)
+        revision = get_flight_revision(flight_id)
+
+        # repeated questions about the same flight (and revision of it) skip the LLM round trip
+        can_analyze = self.response_cache.get(flight_id, user_query, VALIDATION_PROMPT_VERSION, revision)
+        if can_analyze is None:
+            can_analyze = run_validation_prompt(user_query, describe_available_data(flight_id))
+            if can_analyze is not None:
+                self.response_cache.set(flight_id, user_query, VALIDATION_PROMPT_VERSION, can_analyze, revision)
 
         analysis_state = {
-            "can_analyze": can_analyze,
+            "can_analyze": bool(can_analyze),
             "conversation": state["conversation"]
         }
 
         return analysis_state
 
+    async def avalidate(self, state: InputState) -> AnalysisState:
+        user_query = get_last_user_message(state)
+        flight_id = get_flight_id(state)
+        revision = await asyncio.to_thread(get_flight_revision, flight_id)
+
+        # cache lookups may embed the query, so keep them off the event loop
+        can_analyze = await asyncio.to_thread(
+            self.response_cache.get, flight_id, user_query, VALIDATION_PROMPT_VERSION, revision
+        )
+        if can_analyze is None:
+            available_data = await asyncio.to_thread(describe_available_data, flight_id)
+            can_analyze = await arun_validation_prompt(user_query, available_data)
+            if can_analyze is not None:
+                await asyncio.to_thread(
+                    self.response_cache.set, flight_id, user_query, VALIDATION_PROMPT_VERSION, can_analyze, revision
+                )
+
+        analysis_state = {
+            "can_analyze": bool(can_analyze),
+            "conversation": state["conversation"]
+        }
+
+        return analysis_state
 
     def run(self, state: InputState) -> AnalysisState:
         return self.validate(state)
 
+    async def arun(self, state: InputState) -> AnalysisState:
+        return await self.avalidate(state)
+
+
+# bump when the validation prompt changes so cached decisions are not reused
+VALIDATION_PROMPT_VERSION = "validation-v2"
+VALIDATION_SYSTEM_PROMPT = "You are a helpful assistant that validates user queries. You must return a boolean value."
 
-def run_validation_prompt(user_query: str) -> bool:
 
-    print(user_query)
+def describe_available_data(flight_id: Optional[str]) -> str:
+    """Message types and field names of the flight (from the list_fields tool), without any values."""
+    if flight_id is None:
+        return "No flight has been selected."
+    try:
+        fields = list_fields(get_session_store().get(flight_id))
+    except KeyError:
+        return f"Flight {flight_id} has not been processed."
+    return "\n".join(f"{msg_type}: {', '.join(info['fields'])}" for msg_type, info in fields.items())
+
+
+def build_validation_messages(user_query: str, available_data: str = "") -> List[Dict[str, str]]:
     prompt = f"""
     You are a helpful assistant that validates user queries.
     You need to determine if the user query is respondable given the data. 
 
     The data is:
+    {available_data}
 
 
     The user query is:
     User query: {user_query}
     """
-    return False
+    return [
+        {"role": "system", "content": VALIDATION_SYSTEM_PROMPT},
+        {"role": "user", "content": prompt}
+    ]
+
+
+def parse_validation_response(content: Optional[str]) -> bool:
+    return bool(content) and content.strip().lower().startswith("true")
+
+
+def run_validation_prompt(user_query: str, available_data: str = "") -> Optional[bool]:
+    """Ask the LLM whether the query is answerable; None if the call failed."""
+
+    logger.debug(f"Validating query: {user_query}")
     try:
-        client = OpenAI()
-        response = client.chat.completions.create(
+        client = get_openai_client()
+        response = complete(
+            client,
             model="gpt-4.1",
-            messages=[
-                {"role": "system", "content": "You are a helpful assistant that validates user queries. You must return a boolean value."},
-                {"role": "user", "content": prompt}
-            ],
+            messages=build_validation_messages(user_query, available_data),
             temperature=0,
             max_tokens=1000
         )
-        return response.output_text
+        return parse_validation_response(response.choices[0].message.content)
     
     except Exception as e:
         logger.error(f"Error running validation prompt: {e}")
-        return False
+        return None
+
+
+async def arun_validation_prompt(user_query: str, available_data: str = "") -> Optional[bool]:
+
+    logger.debug(f"Validating query: {user_query}")
+    try:
+        client = get_async_openai_client()
+        response = await acomplete(
+            client,
+            model="gpt-4.1",
+            messages=build_validation_messages(user_query, available_data),
+            temperature=0,
+            max_tokens=1000
+        )
+        return parse_validation_response(response.choices[0].message.content)
+
+    except Exception as e:
+        logger.error(f"Error running validation prompt: {e}")
+        return None
 
 
 def get_last_user_message(state: InputState) -> str:
@@ -67,4 +152,18 @@ def get_last_user_message(state: InputState) -> str:
     if role == "user":
         return state["conversation"]["messages"][-1]["content"]
     else:
-        return None # TODO: handle this case
\ No newline at end of file
+        return None # TODO: handle this case
+
+
+def get_flight_id(state: InputState) -> Optional[str]:
+    return (state.get("data") or {}).get("flight_id")
+
+
+def get_flight_revision(flight_id: Optional[str]) -> int:
+    """Revision of the flight's session (bumped by appends), 0 if there is none."""
+    if flight_id is None:
+        return 0
+    try:
+        return get_session_store().get(flight_id).revision
+    except KeyError:
+        return 0
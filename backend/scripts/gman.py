@@ -2,11 +2,15 @@ import json
 from google import genai
 from google.genai import types
 import pandas as pd
-from openai import OpenAI
 import dotenv
 
+from backend.services.context_builder import build_context
+from backend.services.llm_clients import get_openai_client
+from backend.services.session_store import get_session_store
+
 dotenv.load_dotenv()
-openai_client = OpenAI()
+# honours LLM_PROVIDER, so LLM_PROVIDER=stub runs these helpers offline
+openai_client = get_openai_client()
 
 
 # Initialize client
@@ -39,7 +43,11 @@ def get_csv_content(csv_path: str):
     df = pd.read_csv(csv_path)
     return df.to_string()
 
-def create_conversation(chat_id: str):
+def get_timeseries_content(flight_id: str, user_question: str):
+    # only the columns and time windows relevant to the question, downsampled to a token budget
+    return build_context(get_session_store().get(flight_id), user_question)
+
+def create_conversation(chat_id: str, flight_id: str):
     
     system_instruction = """You are an expert flight engineer specializing in telemetry data analysis.
     
@@ -50,12 +58,13 @@ def create_conversation(chat_id: str):
     # Initialize conversation with enhanced system instruction
     conversations[chat_id] = {
         "messages": [],
-        "system_instruction": system_instruction
+        "system_instruction": system_instruction,
+        "flight_id": flight_id
     }
 
-def get_or_create_conversation(chat_id: str):
+def get_or_create_conversation(chat_id: str, flight_id: str):
     if chat_id not in conversations:
-        create_conversation(chat_id)
+        create_conversation(chat_id, flight_id)
     return conversations[chat_id]
 
 def add_message_to_conversation(conversation, message: str, role: str) -> dict:
@@ -104,9 +113,8 @@ def classify_intent(conversation: dict) -> json:
     breakpoint()
     return response.output_text
 
-def create_json_string(json_data_filepath: str) -> str:
-    with open(json_data_filepath, "r") as f:
-        data = json.load(f)
+def create_json_string(flight_id: str) -> str:
+    data = get_session_store().get(flight_id).read_metadata()
     json_data = json.dumps(data)
     return json_data
 
@@ -117,7 +125,7 @@ def create_json_string(json_data_filepath: str) -> str:
 def create_direct_question_query(conversation: dict) -> str:
     # create the query that will be used for direct questions 
     # return the query
-    json_data = create_json_string("../flight_data_exports/flight_metadata_20250801_155049.json")
+    json_data = create_json_string(conversation["flight_id"])
 
     query = f"""
     You are an expert flight engineer. 
@@ -138,7 +146,7 @@ def create_direct_question_query(conversation: dict) -> str:
 def create_investigative_question_query(conversation: dict) -> str:
     # create the query that will be used for investigative questions
     # return the query
-    csv_content = get_csv_content('../flight_data_exports/timeseries_AHR2_20250801_155049.csv')
+    csv_content = get_timeseries_content(conversation["flight_id"], conversation["messages"][-1]["content"])
 
     query = f"""
     You are an expert flight engineer. 
@@ -201,10 +209,10 @@ def add_query_to_conversation(conversation: dict, query: str) -> dict:
         }]
     }
 
-def chat_with_llm(chat_id: str, user_message: str):
+def chat_with_llm(chat_id: str, user_message: str, flight_id: str):
     try:
         # Create new conversation if it doesn't exist
-        conversation = get_or_create_conversation(chat_id)
+        conversation = get_or_create_conversation(chat_id, flight_id)
         # Add user message to conversation
         # add before the LLM call, easier to track if there are errors, re-run inference if fails
         # this can also be await async 
@@ -227,7 +235,9 @@ def chat_with_llm(chat_id: str, user_message: str):
 if __name__ == "__main__":
     
     chat_id = "flight_analysis_001"
-    response = chat_with_llm(chat_id, "What was the maximum altitude reached in this flight?")
+    # most recently processed flight
+    flight_id = get_session_store().list_sessions()[0]["flight_id"]
+    response = chat_with_llm(chat_id, "What was the maximum altitude reached in this flight?", flight_id)
     print(response)
     
 
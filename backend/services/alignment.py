@@ -0,0 +1,224 @@
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .data_processor import TIME_FIELD
+
+logger = logging.getLogger(__name__)
+
+METHODS = ("linear", "asof", "nearest")
+# total size of the cached frames; one long flight at a high rate_hz can be hundreds of MB
+MAX_CACHED_BYTES = int(os.getenv("ALIGN_CACHE_MB", 256)) * 1024 * 1024
+# largest clock a rate_hz request may build; rate_hz comes from API callers and LLM tool calls
+MAX_CLOCK_POINTS = int(os.getenv("ALIGN_MAX_POINTS", 1_000_000))
+
+FieldRef = Tuple[str, str]
+
+
+def parse_field_ref(ref: str) -> FieldRef:
+    """Split "MSG.field" (or "XKF4[0].SV") into (message type, field)."""
+    msg_type, _, field_name = ref.rpartition(".")
+    if not msg_type or not field_name:
+        raise ValueError(f"Field reference {ref!r} must look like MSG.field")
+    return msg_type, field_name
+
+
+def resample(clock: np.ndarray, time_data: np.ndarray, values: np.ndarray, method: str = "linear",
+              tolerance_ms: Optional[float] = None) -> np.ndarray:
+    """Resample a sorted series onto clock; samples outside the series become NaN."""
+    values = np.asarray(values, dtype=np.float64)
+    time_data = np.asarray(time_data, dtype=np.float64)
+    if len(time_data) == 0:
+        return np.full(len(clock), np.nan)
+
+    if method == "linear":
+        result = np.interp(clock, time_data, values, left=np.nan, right=np.nan)
+        if tolerance_ms is None:
+            return result
+        # don't interpolate across source gaps wider than the tolerance
+        index = np.clip(np.searchsorted(time_data, clock), 1, len(time_data) - 1)
+        gap = time_data[index] - time_data[index - 1]
+        result[gap > tolerance_ms] = np.nan
+        return result
+
+    if method == "asof":
+        # last sample at or before each clock tick
+        index = np.searchsorted(time_data, clock, side="right") - 1
+        valid = index >= 0
+        result = np.full(len(clock), np.nan)
+        result[valid] = values[index[valid]]
+        if tolerance_ms is not None:
+            result[valid & (clock - time_data[np.maximum(index, 0)] > tolerance_ms)] = np.nan
+        return result
+
+    if method == "nearest":
+        right = np.clip(np.searchsorted(time_data, clock), 0, len(time_data) - 1)
+        left = np.maximum(right - 1, 0)
+        use_left = np.abs(clock - time_data[left]) <= np.abs(time_data[right] - clock)
+        index = np.where(use_left, left, right)
+        result = values[index]
+        if tolerance_ms is not None:
+            result = np.where(np.abs(time_data[index] - clock) > tolerance_ms, np.nan, result)
+        return result
+
+    raise ValueError(f"Unknown resample method {method!r}; expected one of {', '.join(METHODS)}")
+
+
+class AlignedFrame:
+    """Several (message, field) columns on one common clock."""
+
+    def __init__(self, time: np.ndarray, columns: Dict[str, np.ndarray]):
+        self.time = time
+        self.columns = columns
+
+    def __len__(self) -> int:
+        return len(self.time)
+
+    @property
+    def nbytes(self) -> int:
+        return self.time.nbytes + sum(values.nbytes for values in self.columns.values())
+
+    def __getitem__(self, ref: str) -> np.ndarray:
+        return self.columns[ref]
+
+    def to_dict(self) -> Dict[str, List[Any]]:
+        data = {TIME_FIELD: self.time.tolist()}
+        for ref, values in self.columns.items():
+            data[ref] = [None if np.isnan(value) else value for value in values.tolist()]
+        return data
+
+
+def _get_columns(source: Any, msg_type: str):
+    if hasattr(source, "get_columns"):
+        return source.get_columns(msg_type)
+    return source[msg_type]
+
+
+def build_clock(
+    series_times: Sequence[np.ndarray],
+    rate_hz: Optional[float] = None,
+    start_ms: Optional[float] = None,
+    end_ms: Optional[float] = None,
+) -> np.ndarray:
+    """Common clock over the overlap of all series, at rate_hz or on the union of their timestamps."""
+    if start_ms is None:
+        start_ms = max(float(times[0]) for times in series_times)
+    if end_ms is None:
+        end_ms = min(float(times[-1]) for times in series_times)
+    if end_ms < start_ms:
+        return np.empty(0, dtype=np.float64)
+
+    if rate_hz is not None:
+        if not rate_hz > 0:
+            raise ValueError("rate_hz must be positive")
+        # checked before allocating anything
+        points = (end_ms - start_ms) * rate_hz / 1000.0 + 1
+        if points > MAX_CLOCK_POINTS:
+            raise ValueError(
+                f"rate_hz {rate_hz:g} over {(end_ms - start_ms) / 1000.0:g} s needs {points:.0f} samples; "
+                f"the limit is {MAX_CLOCK_POINTS}, so lower rate_hz or narrow the time range"
+            )
+        return np.arange(start_ms, end_ms + 1e-9, 1000.0 / rate_hz)
+
+    windows = []
+    for times in series_times:
+        lo, hi = np.searchsorted(times, start_ms, "left"), np.searchsorted(times, end_ms, "right")
+        windows.append(np.asarray(times[lo:hi], dtype=np.float64))
+    # union of sorted timestamps
+    return np.unique(np.concatenate(windows))
+
+
+def align_columns(
+    source: Any,
+    fields: Sequence[FieldRef],
+    rate_hz: Optional[float] = None,
+    method: str = "linear",
+    start_ms: Optional[float] = None,
+    end_ms: Optional[float] = None,
+    tolerance_ms: Optional[float] = None,
+) -> AlignedFrame:
+    """Align (message, field) columns from a column store or FlightSession onto a common clock."""
+    if not fields:
+        raise ValueError("At least one field is required")
+    if method not in METHODS:
+        raise ValueError(f"Unknown resample method {method!r}; expected one of {', '.join(METHODS)}")
+
+    msg_types = list(dict.fromkeys(msg_type for msg_type, _ in fields))
+    columns_by_type = {msg_type: _get_columns(source, msg_type) for msg_type in msg_types}
+    for msg_type, field_name in fields:
+        if field_name not in columns_by_type[msg_type]:
+            raise KeyError(f"{msg_type} has no field {field_name}")
+
+    clock = build_clock([columns_by_type[msg_type].time for msg_type in msg_types], rate_hz, start_ms, end_ms)
+    aligned = {
+        f"{msg_type}.{field_name}": resample(
+            clock, columns_by_type[msg_type].time, columns_by_type[msg_type][field_name], method, tolerance_ms
+        )
+        for msg_type, field_name in fields
+    }
+    return AlignedFrame(clock, aligned)
+
+
+class AlignmentCache:
+    """Per-session LRU of aligned frames, keyed by flight and alignment arguments and bounded by their size."""
+
+    def __init__(self, max_bytes: int = MAX_CACHED_BYTES):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self._frames: "OrderedDict[tuple, AlignedFrame]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def align(
+        self,
+        session: Any,
+        fields: Sequence[FieldRef],
+        rate_hz: Optional[float] = None,
+        method: str = "linear",
+        start_ms: Optional[float] = None,
+        end_ms: Optional[float] = None,
+        tolerance_ms: Optional[float] = None,
+    ) -> AlignedFrame:
+        # the revision changes when samples are appended to the flight
+        key = (session.flight_id, session.revision, tuple(fields), rate_hz, method, start_ms, end_ms,
+               tolerance_ms)
+        with self._lock:
+            if key in self._frames:
+                self._frames.move_to_end(key)
+                return self._frames[key]
+
+        frame = align_columns(session, fields, rate_hz, method, start_ms, end_ms, tolerance_ms)
+        if frame.nbytes > self.max_bytes:
+            # caching it would evict everything else
+            return frame
+        with self._lock:
+            if key in self._frames:
+                # aligned concurrently by another request
+                return self._frames[key]
+            self._frames[key] = frame
+            self.nbytes += frame.nbytes
+            while self.nbytes > self.max_bytes:
+                _, evicted = self._frames.popitem(last=False)
+                self.nbytes -= evicted.nbytes
+        return frame
+
+    def invalidate(self, flight_id: str) -> None:
+        with self._lock:
+            for key in [key for key in self._frames if key[0] == flight_id]:
+                self.nbytes -= self._frames.pop(key).nbytes
+
+
+_alignment_cache: Optional[AlignmentCache] = None
+_lock = threading.Lock()
+
+
+def get_alignment_cache() -> AlignmentCache:
+    """Process-wide cache of aligned frames."""
+    global _alignment_cache
+    with _lock:
+        if _alignment_cache is None:
+            _alignment_cache = AlignmentCache()
+        return _alignment_cache
@@ -0,0 +1,176 @@
+import json
+import logging
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+from .alignment import MAX_CLOCK_POINTS, align_columns, parse_field_ref
+from .anomaly_detection import get_event_index, runs
+from .data_processor import TIME_FIELD
+
+logger = logging.getLogger(__name__)
+
+MAX_CROSSINGS = 20
+MAX_EVENTS = 50
+
+
+def _finite(value: float) -> Optional[float]:
+    return float(value) if np.isfinite(value) else None
+
+
+def list_fields(session: Any) -> Dict[str, Any]:
+    """Message types in the flight with their numeric fields and time ranges."""
+    return {
+        msg_type: {
+            "fields": [name for name in session.get_columns(msg_type).numeric_fields if name != TIME_FIELD],
+            "start_ms": session.index["message_types"][msg_type]["start_ms"],
+            "end_ms": session.index["message_types"][msg_type]["end_ms"],
+        }
+        for msg_type in session.message_types
+    }
+
+
+def field_stats(session: Any, message_type: str, field: str,
+                start_ms: Optional[float] = None, end_ms: Optional[float] = None) -> Dict[str, Any]:
+    """Min/max/mean/count of a field over a time range."""
+    return session.range_stats(message_type, field, start_ms, end_ms)
+
+
+def argmax_time(session: Any, message_type: str, field: str, mode: str = "max",
+                start_ms: Optional[float] = None, end_ms: Optional[float] = None) -> Dict[str, Any]:
+    """Time and value of a field's maximum (or minimum) over a time range."""
+    if mode not in ("max", "min"):
+        raise ValueError("mode must be 'max' or 'min'")
+    time_data, values = session.query(message_type, field, start_ms, end_ms)
+    values = np.asarray(values, dtype=np.float64)
+    if len(values) == 0 or np.all(np.isnan(values)):
+        return {"time_ms": None, "value": None}
+    index = int(np.nanargmax(values) if mode == "max" else np.nanargmin(values))
+    return {"time_ms": float(time_data[index]), "value": float(values[index])}
+
+
+def threshold_crossings(session: Any, message_type: str, field: str, threshold: float, direction: str = "above",
+                        start_ms: Optional[float] = None, end_ms: Optional[float] = None) -> Dict[str, Any]:
+    """Intervals where a field is above (or below) a threshold."""
+    if direction not in ("above", "below"):
+        raise ValueError("direction must be 'above' or 'below'")
+    time_data, values = session.query(message_type, field, start_ms, end_ms)
+    values = np.asarray(values, dtype=np.float64)
+    mask = values > threshold if direction == "above" else values < threshold
+    starts, ends = runs(mask)
+
+    intervals = []
+    for start, end in zip(starts[:MAX_CROSSINGS].tolist(), ends[:MAX_CROSSINGS].tolist()):
+        segment = values[start:end]
+        peak = np.nanmax(segment) if direction == "above" else np.nanmin(segment)
+        intervals.append({
+            "start_ms": float(time_data[start]),
+            "end_ms": float(time_data[end - 1]),
+            "peak": _finite(peak),
+        })
+    return {
+        "count": len(starts),
+        "total_duration_ms": float(np.sum(time_data[ends - 1] - time_data[starts])) if len(starts) else 0.0,
+        "intervals": intervals,
+        "truncated": len(starts) > MAX_CROSSINGS,
+    }
+
+
+def correlation(session: Any, field_a: str, field_b: str, rate_hz: Optional[float] = None,
+                start_ms: Optional[float] = None, end_ms: Optional[float] = None) -> Dict[str, Any]:
+    """Pearson correlation of two MSG.field series after aligning them on a common clock."""
+    refs = [parse_field_ref(field_a), parse_field_ref(field_b)]
+    frame = align_columns(session, refs, rate_hz=rate_hz, start_ms=start_ms, end_ms=end_ms)
+    a, b = frame[field_a], frame[field_b]
+    valid = ~(np.isnan(a) | np.isnan(b))
+    if valid.sum() < 3 or np.std(a[valid]) == 0 or np.std(b[valid]) == 0:
+        return {"pearson_r": None, "samples": int(valid.sum())}
+    return {"pearson_r": float(np.corrcoef(a[valid], b[valid])[0, 1]), "samples": int(valid.sum())}
+
+
+def lookup_events(session: Any, event_type: Optional[str] = None, severity: Optional[str] = None,
+                  start_ms: Optional[float] = None, end_ms: Optional[float] = None) -> Dict[str, Any]:
+    """Detected anomaly events, optionally filtered by type, severity and time range."""
+    events = [
+        event for event in get_event_index(session)["events"]
+        if (event_type is None or event["type"] == event_type)
+        and (severity is None or event["severity"] == severity)
+        and (start_ms is None or event["end_ms"] >= start_ms)
+        and (end_ms is None or event["start_ms"] <= end_ms)
+    ]
+    return {"count": len(events), "events": events[:MAX_EVENTS], "truncated": len(events) > MAX_EVENTS}
+
+
+TOOLS: Dict[str, Callable[..., Dict[str, Any]]] = {
+    "list_fields": list_fields,
+    "field_stats": field_stats,
+    "argmax_time": argmax_time,
+    "threshold_crossings": threshold_crossings,
+    "correlation": correlation,
+    "lookup_events": lookup_events,
+}
+
+_RANGE_PROPERTIES = {
+    "start_ms": {"type": "number", "description": "Range start in time_boot_ms; omit for the flight start"},
+    "end_ms": {"type": "number", "description": "Range end in time_boot_ms; omit for the flight end"},
+}
+_FIELD_PROPERTIES = {
+    "message_type": {"type": "string", "description": "Message type, e.g. ATT or GPS[0]"},
+    "field": {"type": "string", "description": "Field name, e.g. Roll"},
+}
+
+
+def _tool(name: str, description: str, properties: Dict[str, Any], required: List[str]) -> Dict[str, Any]:
+    return {
+        "type": "function",
+        "function": {
+            "name": name,
+            "description": description,
+            "parameters": {"type": "object", "properties": properties, "required": required},
+        },
+    }
+
+
+# OpenAI chat.completions tool definitions for TOOLS
+TOOL_SCHEMAS: List[Dict[str, Any]] = [
+    _tool("list_fields", list_fields.__doc__, {}, []),
+    _tool("field_stats", field_stats.__doc__, {**_FIELD_PROPERTIES, **_RANGE_PROPERTIES}, ["message_type", "field"]),
+    _tool("argmax_time", argmax_time.__doc__, {
+        **_FIELD_PROPERTIES,
+        "mode": {"type": "string", "enum": ["max", "min"]},
+        **_RANGE_PROPERTIES,
+    }, ["message_type", "field"]),
+    _tool("threshold_crossings", threshold_crossings.__doc__, {
+        **_FIELD_PROPERTIES,
+        "threshold": {"type": "number"},
+        "direction": {"type": "string", "enum": ["above", "below"]},
+        **_RANGE_PROPERTIES,
+    }, ["message_type", "field", "threshold"]),
+    _tool("correlation", correlation.__doc__, {
+        "field_a": {"type": "string", "description": "MSG.field, e.g. ATT.Roll"},
+        "field_b": {"type": "string", "description": "MSG.field, e.g. ATT.DesRoll"},
+        "rate_hz": {"type": "number", "description": "Resample rate; omit to use the union of timestamps. "
+                                                  f"At most {MAX_CLOCK_POINTS} samples over the range"},
+        **_RANGE_PROPERTIES,
+    }, ["field_a", "field_b"]),
+    _tool("lookup_events", lookup_events.__doc__, {
+        "event_type": {"type": "string", "enum": [
+            "gps_no_fix", "gps_fix_lost", "gps_low_satellites", "gps_high_hdop",
+            "ekf_variance", "attitude_tracking", "timestamp_gap",
+        ]},
+        "severity": {"type": "string", "enum": ["warning", "critical"]},
+        **_RANGE_PROPERTIES,
+    }, []),
+]
+
+
+def call_tool(session: Any, name: str, arguments: str) -> Dict[str, Any]:
+    """Run a tool call from the LLM; bad names or arguments come back as an error for the model to fix."""
+    if name not in TOOLS:
+        return {"error": f"Unknown tool {name}"}
+    try:
+        kwargs = json.loads(arguments) if arguments else {}
+        return TOOLS[name](session, **kwargs)
+    except (KeyError, ValueError, TypeError) as e:
+        logger.info(f"Tool {name} rejected arguments {arguments}: {e}")
+        return {"error": str(e)}
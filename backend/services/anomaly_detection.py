@@ -0,0 +1,247 @@
+import json
+import logging
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .field_catalog import base_message_type
+
+logger = logging.getLogger(__name__)
+
+EVENTS_FILE = "events.json"
+# bump when detectors or thresholds change so cached indexes are rebuilt
+DETECTOR_VERSION = 1
+
+GPS_MIN_SATS = 6
+GPS_MAX_HDOP = 2.0
+GPS_3D_FIX = 3
+GPS_MIN_DURATION_MS = 1000.0
+# ArduPilot's EKF failsafe triggers at variance ratios around 0.8 (FS_EKF_THRESH)
+EKF_VARIANCE_WARNING = 0.5
+EKF_VARIANCE_CRITICAL = 0.8
+EKF_VARIANCE_FIELDS = ("SV", "SP", "SH")
+ATTITUDE_ERROR_WARNING_DEG = 10.0
+ATTITUDE_ERROR_CRITICAL_DEG = 20.0
+ATTITUDE_WINDOW_MS = 1000.0
+ATTITUDE_AXES = (("Roll", "DesRoll"), ("Pitch", "DesPitch"))
+GAP_FACTOR = 10.0
+MIN_GAP_MS = 500.0
+
+Event = Dict[str, Any]
+
+
+def runs(mask: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Start and (exclusive) end indices of each run of True values."""
+    edges = np.diff(np.concatenate([[False], np.asarray(mask, dtype=bool), [False]]).astype(np.int8))
+    return np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+
+
+def rolling_mean(values: np.ndarray, window: int) -> np.ndarray:
+    """Trailing mean over `window` samples (shorter at the start), NaN samples ignored."""
+    values = np.asarray(values, dtype=np.float64)
+    window = max(1, int(window))
+    valid = ~np.isnan(values)
+    sums = np.cumsum(np.where(valid, values, 0.0))
+    counts = np.cumsum(valid)
+    sums[window:] = sums[window:] - sums[:-window]
+    counts[window:] = counts[window:] - counts[:-window]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return sums / counts
+
+
+def samples_per(time_data: np.ndarray, duration_ms: float) -> int:
+    """Number of samples spanning duration_ms at the series' median rate."""
+    if len(time_data) < 2:
+        return 1
+    step = float(np.median(np.diff(time_data)))
+    return max(1, int(round(duration_ms / step))) if step > 0 else 1
+
+
+def _events_from_mask(
+    time_data: np.ndarray,
+    mask: np.ndarray,
+    values: np.ndarray,
+    peak: np.ufunc,
+    min_duration_ms: float = 0.0,
+) -> List[Tuple[float, float, float]]:
+    """(start_ms, end_ms, peak value) for each run of the mask lasting at least min_duration_ms."""
+    starts, ends = runs(mask)
+    if len(starts) == 0:
+        return []
+    # peak.reduceat over [start, end) pairs; the odd entries span the gaps between runs
+    bounds = np.stack([starts, ends], axis=1).ravel()
+    peaks = peak.reduceat(values, bounds[bounds < len(values)])[::2]
+    start_ms, end_ms = time_data[starts], time_data[ends - 1]
+    keep = (end_ms - start_ms) >= min_duration_ms
+    return list(zip(start_ms[keep].tolist(), end_ms[keep].tolist(), peaks[keep].tolist()))
+
+
+def _event(kind: str, severity: str, msg_type: str, field_name: Optional[str], start_ms: float,
+           end_ms: float, peak: Optional[float], description: str) -> Event:
+    return {
+        "type": kind,
+        "severity": severity,
+        "message_type": msg_type,
+        "field": field_name,
+        "start_ms": start_ms,
+        "end_ms": end_ms,
+        "peak": peak,
+        "description": description,
+    }
+
+
+def detect_gps_dropouts(msg_type: str, columns) -> List[Event]:
+    """Low satellite count, high HDop or lost 3D fix after the first fix."""
+    time_data = np.asarray(columns.time, dtype=np.float64)
+    events = []
+    armed = np.ones(len(time_data), dtype=bool)
+    if "Status" in columns:
+        status = np.asarray(columns["Status"], dtype=np.float64)
+        fixed = np.flatnonzero(status >= GPS_3D_FIX)
+        if len(fixed) == 0:
+            return [_event("gps_no_fix", "critical", msg_type, "Status", float(time_data[0]), float(time_data[-1]),
+                           float(np.nanmax(status)), "GPS never reached a 3D fix")]
+        # before the first fix a missing lock is normal start-up behaviour
+        armed[:fixed[0]] = False
+        for start_ms, end_ms, peak in _events_from_mask(time_data, armed & (status < GPS_3D_FIX), status, np.fmin):
+            events.append(_event("gps_fix_lost", "critical", msg_type, "Status", start_ms, end_ms, peak,
+                                 f"GPS lost 3D fix (status {peak:g})"))
+
+    if "NSats" in columns:
+        sats = np.asarray(columns["NSats"], dtype=np.float64)
+        for start_ms, end_ms, peak in _events_from_mask(
+                time_data, armed & (sats < GPS_MIN_SATS), sats, np.fmin, GPS_MIN_DURATION_MS):
+            events.append(_event("gps_low_satellites", "warning", msg_type, "NSats", start_ms, end_ms, peak,
+                                 f"Satellite count dropped to {peak:g} (below {GPS_MIN_SATS})"))
+
+    if "HDop" in columns:
+        hdop = np.asarray(columns["HDop"], dtype=np.float64)
+        for start_ms, end_ms, peak in _events_from_mask(
+                time_data, armed & (hdop > GPS_MAX_HDOP), hdop, np.fmax, GPS_MIN_DURATION_MS):
+            events.append(_event("gps_high_hdop", "warning", msg_type, "HDop", start_ms, end_ms, peak,
+                                 f"HDop rose to {peak:.2f} (above {GPS_MAX_HDOP:g})"))
+    return events
+
+
+def detect_ekf_variance(msg_type: str, columns) -> List[Event]:
+    """XKF4 velocity/position/height variance ratios approaching the EKF failsafe threshold."""
+    time_data = np.asarray(columns.time, dtype=np.float64)
+    events = []
+    for field_name in EKF_VARIANCE_FIELDS:
+        if field_name not in columns:
+            continue
+        values = np.asarray(columns[field_name], dtype=np.float64)
+        for start_ms, end_ms, peak in _events_from_mask(time_data, values > EKF_VARIANCE_WARNING, values, np.fmax):
+            severity = "critical" if peak >= EKF_VARIANCE_CRITICAL else "warning"
+            events.append(_event("ekf_variance", severity, msg_type, field_name, start_ms, end_ms, peak,
+                                 f"EKF {field_name} variance ratio peaked at {peak:.2f}"))
+    return events
+
+
+def detect_attitude_error(msg_type: str, columns) -> List[Event]:
+    """Sustained difference between desired and achieved roll/pitch."""
+    time_data = np.asarray(columns.time, dtype=np.float64)
+    window = samples_per(time_data, ATTITUDE_WINDOW_MS)
+    events = []
+    for actual, desired in ATTITUDE_AXES:
+        if actual not in columns or desired not in columns:
+            continue
+        error = np.abs(np.asarray(columns[desired], dtype=np.float64) - np.asarray(columns[actual], dtype=np.float64))
+        # a one second mean ignores brief overshoot during aggressive manoeuvres
+        smoothed = rolling_mean(error, window)
+        for start_ms, end_ms, peak in _events_from_mask(
+                time_data, smoothed > ATTITUDE_ERROR_WARNING_DEG, smoothed, np.fmax):
+            severity = "critical" if peak >= ATTITUDE_ERROR_CRITICAL_DEG else "warning"
+            events.append(_event("attitude_tracking", severity, msg_type, actual, start_ms, end_ms, peak,
+                                 f"{actual} lagged {desired} by {peak:.1f} deg on average over 1 s"))
+    return events
+
+
+def detect_timestamp_gaps(msg_type: str, columns) -> List[Event]:
+    """Logging gaps much longer than the message's usual interval."""
+    time_data = np.asarray(columns.time, dtype=np.float64)
+    if len(time_data) < 3:
+        return []
+    steps = np.diff(time_data)
+    threshold = max(GAP_FACTOR * float(np.median(steps)), MIN_GAP_MS)
+    gaps = np.flatnonzero(steps > threshold)
+    return [
+        _event("timestamp_gap", "warning", msg_type, None, float(time_data[i]), float(time_data[i + 1]),
+               float(steps[i]), f"No {msg_type} samples for {steps[i] / 1000.0:.1f} s")
+        for i in gaps.tolist()
+    ]
+
+
+# detectors by base message type; None applies to every message type
+DETECTORS: Dict[Optional[str], List[Callable[[str, Any], List[Event]]]] = {
+    "GPS": [detect_gps_dropouts],
+    "XKF4": [detect_ekf_variance],
+    "ATT": [detect_attitude_error],
+    None: [detect_timestamp_gaps],
+}
+
+
+def detect_anomalies(source: Any) -> List[Event]:
+    """Run every detector over a FlightSession (or column store mapping), ordered by start time."""
+    if hasattr(source, "get_columns"):
+        items = [(msg_type, source.get_columns(msg_type)) for msg_type in source.message_types]
+    else:
+        items = list(source.items())
+
+    events = []
+    for msg_type, columns in items:
+        if len(columns) == 0:
+            continue
+        for detector in DETECTORS.get(base_message_type(msg_type), []) + DETECTORS[None]:
+            try:
+                events.extend(detector(msg_type, columns))
+            except Exception as e:
+                logger.error(f"Anomaly detector {detector.__name__} failed on {msg_type}: {e}")
+    return sorted(events, key=lambda event: (event["start_ms"], event["message_type"]))
+
+
+_index_lock = threading.Lock()
+
+
+def get_event_index(session: Any) -> Dict[str, Any]:
+    """Anomaly event index of a flight session, detected once and cached in the session directory."""
+    path = session.session_dir / EVENTS_FILE
+    # appending samples bumps the session revision, so events are detected again on next use
+    revision = session.revision
+    with _index_lock:
+        if path.exists():
+            with open(path, 'r') as f:
+                index = json.load(f)
+            if index.get("version") == DETECTOR_VERSION and index.get("revision", 0) == revision:
+                return index
+
+        index = {
+            "flight_id": session.flight_id,
+            "version": DETECTOR_VERSION,
+            "revision": revision,
+            "events": detect_anomalies(session),
+        }
+        with open(path, 'w') as f:
+            json.dump(index, f, indent=2)
+        return index
+
+
+def summarize_events(events: List[Event], max_events: int = 20) -> str:
+    """Plain-text summary of detected events, most severe first."""
+    if not events:
+        return "No anomalies were detected in GPS, EKF variance, attitude tracking or logging continuity."
+
+    ranked = sorted(events, key=lambda event: (event["severity"] != "critical", event["start_ms"]))
+    counts: Dict[str, int] = {}
+    for event in events:
+        counts[event["type"]] = counts.get(event["type"], 0) + 1
+    lines = [f"Detected {len(events)} anomalies: " + ", ".join(f"{count} {kind}" for kind, count in counts.items()) + "."]
+    for event in ranked[:max_events]:
+        lines.append(
+            f"- [{event['severity']}] {event['start_ms'] / 1000.0:.1f}-{event['end_ms'] / 1000.0:.1f} s "
+            f"{event['message_type']}: {event['description']}"
+        )
+    if len(events) > max_events:
+        lines.append(f"... and {len(events) - max_events} more")
+    return "\n".join(lines)
@@ -0,0 +1,146 @@
+import io
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional
+
+import numpy as np
+
+from .data_processor import MessageColumns, TIME_FIELD
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = "manifest.json"
+
+
+def message_file_name(msg_type: str) -> str:
+    """File-system safe name for a message type, e.g. GPS[0] -> GPS_0."""
+    return msg_type.replace('[', '_').replace(']', '')
+
+
+def export_message_columns(msg_data: MessageColumns, output_dir: Path) -> str:
+    """Write each column of a message type to .npy and return the manifest path."""
+    msg_dir = Path(output_dir) / message_file_name(msg_data.msg_type)
+    msg_dir.mkdir(parents=True, exist_ok=True)
+
+    columns = {}
+    for field_name, column in msg_data.columns.items():
+        if column.dtype.kind == "O":
+            # object columns would need pickling, which defeats memory mapping
+            logger.info(f"Skipping object column {msg_data.msg_type}.{field_name} in binary export")
+            continue
+        filename = f"{field_name}.npy"
+        np.save(msg_dir / filename, np.ascontiguousarray(column), allow_pickle=False)
+        columns[field_name] = {
+            "file": filename,
+            "dtype": column.dtype.str,
+        }
+
+    manifest = {
+        "message_type": msg_data.msg_type,
+        "time_field": TIME_FIELD,
+        "length": len(msg_data),
+        "columns": columns,
+    }
+    manifest_path = msg_dir / MANIFEST_NAME
+    with open(manifest_path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+    return str(manifest_path)
+
+
+def append_npy(path: Path, values: np.ndarray, at: Optional[int] = None) -> None:
+    """Append values to a 1-D .npy file in place, rewriting only its header.
+
+    With at, values are written from that row on and any rows after it
+    (e.g. left by an interrupted append) are dropped. Existing memory maps of
+    the file stay valid for the rows before at: they keep seeing the old
+    length. Falls back to rewriting the file when the dtype changes (e.g. a
+    longer string) or the new shape no longer fits in the header.
+    """
+    with open(path, 'r+b') as f:
+        version = np.lib.format.read_magic(f)
+        header_reader = np.lib.format.read_array_header_2_0 if version == (2, 0) else np.lib.format.read_array_header_1_0
+        shape, fortran_order, dtype = header_reader(f)
+        header_length = f.tell()
+        at = shape[0] if at is None else min(at, shape[0])
+        if len(shape) == 1 and not fortran_order and dtype == values.dtype:
+            header = io.BytesIO()
+            header_writer = np.lib.format.write_array_header_2_0 if version == (2, 0) else np.lib.format.write_array_header_1_0
+            header_writer(header, {"descr": np.lib.format.dtype_to_descr(dtype), "fortran_order": False,
+                                   "shape": (at + len(values),)})
+            # np.save pads the header so the length can grow without moving the data
+            if header.tell() == header_length:
+                f.seek(header_length + at * dtype.itemsize)
+                f.write(np.ascontiguousarray(values).tobytes())
+                f.truncate()
+                f.seek(0)
+                f.write(header.getvalue())
+                return
+
+    # header grew or dtypes differ: write a new file and swap it in, so readers of the old one are unaffected
+    combined = np.concatenate([np.load(path, allow_pickle=False)[:at], values])
+    tmp_path = path.with_suffix(".tmp.npy")
+    np.save(tmp_path, combined, allow_pickle=False)
+    os.replace(tmp_path, path)
+
+
+def append_message_columns(msg_data: MessageColumns, manifest_path: str, at: Optional[int] = None) -> Dict[str, Any]:
+    """Append new samples of a message type to its exported columns; returns the updated manifest.
+
+    msg_data must have the same exported fields as the manifest. With at,
+    the samples replace any stored from that row on (see append_npy).
+    """
+    manifest = read_manifest(manifest_path)
+    msg_dir = Path(manifest_path).parent
+    exported = {field_name for field_name, column in msg_data.columns.items() if column.dtype.kind != "O"}
+    if exported != set(manifest["columns"]):
+        raise ValueError(f"{msg_data.msg_type} fields changed; expected {sorted(manifest['columns'])}")
+
+    for field_name, info in manifest["columns"].items():
+        column = np.ascontiguousarray(msg_data[field_name])
+        append_npy(msg_dir / info["file"], column, at)
+        info["dtype"] = np.load(msg_dir / info["file"], mmap_mode="r", allow_pickle=False).dtype.str
+    manifest["length"] = (manifest["length"] if at is None else min(at, manifest["length"])) + len(msg_data)
+
+    tmp_path = Path(manifest_path).with_name(f".tmp-{MANIFEST_NAME}")
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, manifest_path)
+    return manifest
+
+
+def read_manifest(manifest_path: str) -> Dict[str, Any]:
+    """Read a message type manifest."""
+    with open(manifest_path, 'r') as f:
+        return json.load(f)
+
+
+def load_column(manifest_path: str, field_name: str, mmap_mode: Optional[str] = "r") -> np.ndarray:
+    """Load a single column, memory-mapped by default."""
+    manifest = read_manifest(manifest_path)
+    if field_name not in manifest["columns"]:
+        raise KeyError(f"{manifest['message_type']} has no column {field_name}")
+    column_file = Path(manifest_path).parent / manifest["columns"][field_name]["file"]
+    return np.load(column_file, mmap_mode=mmap_mode, allow_pickle=False)
+
+
+def load_message_columns(
+    manifest_path: str,
+    field_names: Optional[Iterable[str]] = None,
+    mmap_mode: Optional[str] = "r",
+) -> MessageColumns:
+    """Load a message type (or a subset of its columns) from its manifest."""
+    manifest = read_manifest(manifest_path)
+    msg_dir = Path(manifest_path).parent
+
+    wanted = set(field_names) if field_names is not None else set(manifest["columns"])
+    wanted.add(manifest["time_field"])
+
+    columns = {
+        field_name: np.load(msg_dir / info["file"], mmap_mode=mmap_mode, allow_pickle=False)
+        for field_name, info in manifest["columns"].items()
+        if field_name in wanted
+    }
+    return MessageColumns(manifest["message_type"], columns)
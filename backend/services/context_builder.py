@@ -0,0 +1,230 @@
+import logging
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from ..utils.downsample import decimate
+from .alignment import FieldRef
+from .data_processor import TIME_FIELD
+from .field_catalog import DEFAULT_VEHICLE, base_message_type, get_field_catalog
+
+logger = logging.getLogger(__name__)
+
+CHARS_PER_TOKEN = 4
+DEFAULT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", 4000))
+MAX_COLUMNS = 6
+MAX_CACHED_CONTEXTS = 64
+# used when nothing in the query matches a field; message types without instance suffixes,
+# so GPS matches GPS[0], GPS[1], ...
+DEFAULT_COLUMNS: Tuple[FieldRef, ...] = (
+    ("ATT", "Roll"), ("ATT", "Pitch"), ("ATT", "Yaw"),
+    ("AHR2", "Alt"), ("GPS", "Alt"), ("GPS", "Spd"),
+)
+STOPWORDS = {
+    "the", "and", "for", "was", "were", "what", "when", "where", "why", "how", "did",
+    "does", "this", "that", "with", "any", "flight", "data", "during", "from", "value",
+}
+EVENT_Z_THRESHOLD = 6.0
+EVENT_PADDING_MS = 2000.0
+MAX_EVENTS_PER_COLUMN = 3
+# share of each column's budget spent on event windows when it has any
+EVENT_BUDGET_SHARE = 0.4
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count; about four characters per token for numeric text."""
+    return -(-len(text) // CHARS_PER_TOKEN)
+
+
+def _words(text: str) -> set:
+    return {word for word in re.findall(r"[a-z0-9]+", text.lower()) if len(word) > 2 and word not in STOPWORDS}
+
+
+def select_columns(session: Any, query: str, vehicle: Optional[str] = None,
+                   max_columns: int = MAX_COLUMNS) -> List[FieldRef]:
+    """Pick the numeric fields whose names or catalog descriptions best match the query."""
+    terms = _words(query)
+    try:
+        catalog = get_field_catalog(vehicle)
+    except ValueError:
+        catalog = None
+
+    scored = []
+    for msg_type in session.message_types:
+        msg_words = _words(base_message_type(msg_type))
+        if catalog is not None:
+            msg_words |= _words(catalog.message_description(msg_type) or "")
+        msg_score = 2 * len(terms & _words(base_message_type(msg_type))) + len(terms & msg_words)
+        for field_name in session.get_columns(msg_type).numeric_fields:
+            if field_name == TIME_FIELD:
+                continue
+            score = 3 * (field_name.lower() in terms) + msg_score
+            if catalog is not None:
+                score += len(terms & _words(catalog.field_description(field_name, msg_type) or ""))
+            if score > 0:
+                scored.append((score, msg_type, field_name))
+
+    if not scored:
+        defaults = [
+            (msg_type, field_name)
+            for base_type, field_name in DEFAULT_COLUMNS
+            for msg_type in session.message_types
+            if base_message_type(msg_type) == base_type and field_name in session.get_columns(msg_type)
+        ]
+        return defaults[:max_columns]
+    scored.sort(key=lambda item: -item[0])
+    return [(msg_type, field_name) for _, msg_type, field_name in scored[:max_columns]]
+
+
+def find_event_windows(
+    time_data: np.ndarray,
+    values: np.ndarray,
+    z_threshold: float = EVENT_Z_THRESHOLD,
+    padding_ms: float = EVENT_PADDING_MS,
+    max_events: int = MAX_EVENTS_PER_COLUMN,
+) -> List[Tuple[float, float, float]]:
+    """(start_ms, end_ms, peak z-score) windows around sample-to-sample jumps, strongest first."""
+    values = np.asarray(values, dtype=np.float64)
+    if len(values) < 3:
+        return []
+    changes = np.diff(values)
+    median = np.nanmedian(changes)
+    # robust spread: median absolute deviation scaled to a standard deviation
+    spread = np.nanmedian(np.abs(changes - median)) * 1.4826
+    if not np.isfinite(spread) or spread == 0:
+        return []
+
+    z_scores = np.abs(changes - median) / spread
+    spikes = np.flatnonzero(z_scores > z_threshold)
+    if len(spikes) == 0:
+        return []
+
+    spike_time = np.asarray(time_data, dtype=np.float64)[spikes + 1]
+    starts, ends = spike_time - padding_ms, spike_time + padding_ms
+    # merge overlapping windows: a new window starts where it clears every earlier end
+    new_window = np.concatenate([[True], starts[1:] > np.maximum.accumulate(ends)[:-1]])
+    first = np.flatnonzero(new_window)
+    window_ends = np.maximum.reduceat(ends, first)
+    peaks = np.maximum.reduceat(z_scores[spikes], first)
+
+    order = np.argsort(-peaks)[:max_events]
+    return [(float(starts[first[i]]), float(window_ends[i]), float(peaks[i])) for i in sorted(order)]
+
+
+def _render_rows(time_data: np.ndarray, values: np.ndarray) -> List[str]:
+    return [f"{t / 1000.0:.2f},{v:.5g}" for t, v in zip(time_data.tolist(), values.tolist())]
+
+
+def _render_column(session: Any, msg_type: str, field_name: str, points: int, description: Optional[str]) -> str:
+    time_data, values = session.query(msg_type, field_name)
+    values = np.asarray(values, dtype=np.float64)
+    title = f"## {msg_type}.{field_name}" + (f": {description}" if description else "")
+    if len(values) == 0:
+        return f"{title}\nno samples"
+
+    events = find_event_windows(time_data, values)
+    event_points = int(points * EVENT_BUDGET_SHARE) // len(events) if events else 0
+    overview_points = points - event_points * len(events)
+
+    overview_time, overview_values = decimate(time_data, values, overview_points, "lttb")
+    lines = [title, f"overview, {len(overview_values)} of {len(values)} samples (time_s,value):"]
+    lines += _render_rows(overview_time, overview_values)
+
+    for start_ms, end_ms, peak in events:
+        window = session.time_slice(msg_type, start_ms, end_ms)
+        # min/max keeps the spike itself however few points the window gets
+        event_time, event_values = decimate(time_data[window], values[window], event_points, "minmax")
+        lines.append(f"event {start_ms / 1000.0:.2f}-{end_ms / 1000.0:.2f}s, jump of {peak:.1f} sigma:")
+        lines += _render_rows(event_time, event_values)
+    return "\n".join(lines)
+
+
+def render_context(
+    session: Any,
+    columns: Sequence[FieldRef],
+    token_budget: int = DEFAULT_TOKEN_BUDGET,
+    vehicle: Optional[str] = None,
+) -> str:
+    """Render the selected columns as downsampled time series that fit the token budget."""
+    header = (f"Flight {session.flight_id} time series, downsampled with LTTB to fit the context; "
+              f"event windows show detail around sudden jumps.")
+    if not columns:
+        return header + "\nNo matching numeric fields."
+    try:
+        catalog = get_field_catalog(vehicle)
+    except ValueError:
+        catalog = None
+
+    # "123.45,-12.345\n" is about four tokens
+    tokens_per_row = estimate_tokens("123.45,-12.345\n")
+    available = token_budget - estimate_tokens(header) - 40 * len(columns)
+    points = max(3, available // (tokens_per_row * len(columns)))
+
+    # titles and event headers are hard to predict exactly, so shrink until it fits
+    for _ in range(4):
+        blocks = [
+            _render_column(session, msg_type, field_name, points,
+                           catalog.field_description(field_name, msg_type) if catalog else None)
+            for msg_type, field_name in columns
+        ]
+        text = "\n\n".join([header] + blocks)
+        used = estimate_tokens(text)
+        if used <= token_budget or points <= 3:
+            break
+        points = max(3, int(points * token_budget / used * 0.95))
+    return text
+
+
+class ContextBuilder:
+    """Builds query-specific timeseries context, cached per (flight, vehicle, columns, budget)."""
+
+    def __init__(self, max_cached: int = MAX_CACHED_CONTEXTS):
+        self.max_cached = max_cached
+        self._contexts: "OrderedDict[tuple, str]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def build(
+        self,
+        session: Any,
+        query: str,
+        token_budget: Optional[int] = None,
+        vehicle: Optional[str] = None,
+    ) -> str:
+        token_budget = token_budget or DEFAULT_TOKEN_BUDGET
+        columns = select_columns(session, query, vehicle)
+        # the vehicle's field catalog supplies the column descriptions, so it is part of the key
+        key = (session.flight_id, session.revision, (vehicle or DEFAULT_VEHICLE).lower(), tuple(columns), token_budget)
+        with self._lock:
+            if key in self._contexts:
+                self._contexts.move_to_end(key)
+                return self._contexts[key]
+
+        text = render_context(session, columns, token_budget, vehicle)
+        logger.info(f"Built {estimate_tokens(text)} token context for flight {session.flight_id} from {len(columns)} columns")
+        with self._lock:
+            self._contexts[key] = text
+            while len(self._contexts) > self.max_cached:
+                self._contexts.popitem(last=False)
+        return text
+
+
+_context_builder: Optional[ContextBuilder] = None
+_lock = threading.Lock()
+
+
+def get_context_builder() -> ContextBuilder:
+    """Process-wide context builder."""
+    global _context_builder
+    with _lock:
+        if _context_builder is None:
+            _context_builder = ContextBuilder()
+        return _context_builder
+
+
+def build_context(session: Any, query: str, token_budget: Optional[int] = None, vehicle: Optional[str] = None) -> str:
+    """Token-budgeted timeseries context for a query over a FlightSession."""
+    return get_context_builder().build(session, query, token_budget, vehicle)
@@ -0,0 +1,270 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTL_SECONDS = 24 * 60 * 60
+DEFAULT_HISTORY_WINDOW = 50
+
+
+class ConversationStore:
+    """Interface for conversation backends.
+
+    Messages are append-only; reads return a bounded window of the most
+    recent messages along with the total message count. Each conversation
+    also keeps a rolling summary of its first `covered` messages (see
+    history_manager). Conversations idle for longer than ttl_seconds are
+    evicted.
+    """
+
+    def __init__(self, ttl_seconds: Optional[float] = DEFAULT_TTL_SECONDS, history_window: int = DEFAULT_HISTORY_WINDOW):
+        self.ttl_seconds = ttl_seconds
+        self.history_window = history_window
+
+    def get_or_create(self, conversation_id: str) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    def append_message(self, conversation_id: str, role: str, content: str) -> None:
+        raise NotImplementedError
+
+    def get_messages(self, conversation_id: str, limit: Optional[int] = None) -> List[Dict[str, str]]:
+        raise NotImplementedError
+
+    def get_summary(self, conversation_id: str) -> Tuple[str, int]:
+        """The rolling summary and how many of the oldest messages it covers."""
+        raise NotImplementedError
+
+    def set_summary(self, conversation_id: str, summary: str, covered: int) -> None:
+        """Replace the summary, unless a concurrent request already stored one covering more messages."""
+        raise NotImplementedError
+
+    def evict_expired(self) -> int:
+        raise NotImplementedError
+
+
+class InMemoryConversationStore(ConversationStore):
+    """Process-local store; history is lost on restart."""
+
+    def __init__(self, ttl_seconds: Optional[float] = DEFAULT_TTL_SECONDS, history_window: int = DEFAULT_HISTORY_WINDOW):
+        super().__init__(ttl_seconds, history_window)
+        self._conversations: Dict[str, Dict[str, Any]] = {}
+        self._last_access: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def _touch(self, conversation_id: str) -> Dict[str, Any]:
+        conversation = self._conversations.get(conversation_id)
+        if conversation is None:
+            now = datetime.now().isoformat()
+            conversation = {"messages": [], "summary": "", "summary_covered": 0, "created_at": now, "updated_at": now}
+            self._conversations[conversation_id] = conversation
+        self._last_access[conversation_id] = time.monotonic()
+        return conversation
+
+    def get_or_create(self, conversation_id: str) -> Dict[str, Any]:
+        self.evict_expired()
+        with self._lock:
+            conversation = self._touch(conversation_id)
+            return {
+                "id": conversation_id,
+                "messages": list(conversation["messages"][-self.history_window:]),
+                "message_count": len(conversation["messages"]),
+                "created_at": conversation["created_at"],
+                "updated_at": conversation["updated_at"],
+            }
+
+    def append_message(self, conversation_id: str, role: str, content: str) -> None:
+        with self._lock:
+            conversation = self._touch(conversation_id)
+            conversation["messages"].append({"role": role, "content": content})
+            conversation["updated_at"] = datetime.now().isoformat()
+
+    def get_messages(self, conversation_id: str, limit: Optional[int] = None) -> List[Dict[str, str]]:
+        limit = limit or self.history_window
+        with self._lock:
+            conversation = self._conversations.get(conversation_id)
+            if conversation is None:
+                return []
+            return list(conversation["messages"][-limit:])
+
+    def get_summary(self, conversation_id: str) -> Tuple[str, int]:
+        with self._lock:
+            conversation = self._conversations.get(conversation_id)
+            if conversation is None:
+                return "", 0
+            return conversation["summary"], conversation["summary_covered"]
+
+    def set_summary(self, conversation_id: str, summary: str, covered: int) -> None:
+        with self._lock:
+            conversation = self._touch(conversation_id)
+            if covered > conversation["summary_covered"]:
+                conversation["summary"], conversation["summary_covered"] = summary, covered
+
+    def evict_expired(self) -> int:
+        if self.ttl_seconds is None:
+            return 0
+        cutoff = time.monotonic() - self.ttl_seconds
+        with self._lock:
+            expired = [cid for cid, last_access in self._last_access.items() if last_access < cutoff]
+            for conversation_id in expired:
+                del self._conversations[conversation_id]
+                del self._last_access[conversation_id]
+        return len(expired)
+
+
+class SQLiteConversationStore(ConversationStore):
+    """SQLite store in WAL mode, shareable across worker processes."""
+
+    def __init__(
+        self,
+        db_path: str,
+        ttl_seconds: Optional[float] = DEFAULT_TTL_SECONDS,
+        history_window: int = DEFAULT_HISTORY_WINDOW,
+    ):
+        super().__init__(ttl_seconds, history_window)
+        self.db_path = db_path
+        # sqlite connections can't be shared across threads
+        self._local = threading.local()
+        self._init_schema()
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute("PRAGMA foreign_keys=ON")
+            self._local.connection = connection
+        return connection
+
+    def _init_schema(self) -> None:
+        connection = self._connection()
+        connection.executescript("""
+            CREATE TABLE IF NOT EXISTS conversations (
+                id TEXT PRIMARY KEY,
+                created_at TEXT NOT NULL,
+                updated_at TEXT NOT NULL,
+                last_access REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS messages (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                conversation_id TEXT NOT NULL REFERENCES conversations(id) ON DELETE CASCADE,
+                role TEXT NOT NULL,
+                content TEXT NOT NULL,
+                created_at TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS summaries (
+                conversation_id TEXT PRIMARY KEY REFERENCES conversations(id) ON DELETE CASCADE,
+                summary TEXT NOT NULL,
+                covered INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_messages_conversation ON messages (conversation_id, id);
+            CREATE INDEX IF NOT EXISTS idx_conversations_last_access ON conversations (last_access);
+        """)
+
+    def _touch(self, connection: sqlite3.Connection, conversation_id: str, updated: bool = False) -> None:
+        now = datetime.now().isoformat()
+        connection.execute(
+            "INSERT INTO conversations (id, created_at, updated_at, last_access) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(id) DO UPDATE SET last_access = excluded.last_access"
+            + (", updated_at = excluded.updated_at" if updated else ""),
+            (conversation_id, now, now, time.time()),
+        )
+
+    def get_or_create(self, conversation_id: str) -> Dict[str, Any]:
+        self.evict_expired()
+        connection = self._connection()
+        self._touch(connection, conversation_id)
+        created_at, updated_at = connection.execute(
+            "SELECT created_at, updated_at FROM conversations WHERE id = ?", (conversation_id,)
+        ).fetchone()
+        (message_count,) = connection.execute(
+            "SELECT COUNT(*) FROM messages WHERE conversation_id = ?", (conversation_id,)
+        ).fetchone()
+        return {
+            "id": conversation_id,
+            "messages": self.get_messages(conversation_id),
+            "message_count": message_count,
+            "created_at": created_at,
+            "updated_at": updated_at,
+        }
+
+    def append_message(self, conversation_id: str, role: str, content: str) -> None:
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            self._touch(connection, conversation_id, updated=True)
+            connection.execute(
+                "INSERT INTO messages (conversation_id, role, content, created_at) VALUES (?, ?, ?, ?)",
+                (conversation_id, role, content, datetime.now().isoformat()),
+            )
+            connection.execute("COMMIT")
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+
+    def get_messages(self, conversation_id: str, limit: Optional[int] = None) -> List[Dict[str, str]]:
+        limit = limit or self.history_window
+        rows = self._connection().execute(
+            "SELECT role, content FROM messages WHERE conversation_id = ? ORDER BY id DESC LIMIT ?",
+            (conversation_id, limit),
+        ).fetchall()
+        return [{"role": role, "content": content} for role, content in reversed(rows)]
+
+    def get_summary(self, conversation_id: str) -> Tuple[str, int]:
+        row = self._connection().execute(
+            "SELECT summary, covered FROM summaries WHERE conversation_id = ?", (conversation_id,)
+        ).fetchone()
+        return (row[0], row[1]) if row is not None else ("", 0)
+
+    def set_summary(self, conversation_id: str, summary: str, covered: int) -> None:
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            self._touch(connection, conversation_id)
+            connection.execute(
+                "INSERT INTO summaries (conversation_id, summary, covered) VALUES (?, ?, ?) "
+                "ON CONFLICT(conversation_id) DO UPDATE SET summary = excluded.summary, covered = excluded.covered "
+                "WHERE excluded.covered > summaries.covered",
+                (conversation_id, summary, covered),
+            )
+            connection.execute("COMMIT")
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+
+    def evict_expired(self) -> int:
+        if self.ttl_seconds is None:
+            return 0
+        cursor = self._connection().execute(
+            "DELETE FROM conversations WHERE last_access < ?", (time.time() - self.ttl_seconds,)
+        )
+        return cursor.rowcount
+
+
+_conversation_store: Optional[ConversationStore] = None
+
+
+def get_conversation_store() -> ConversationStore:
+    """Process-wide conversation store, configured from the environment.
+
+    CONVERSATION_STORE=sqlite selects the SQLite backend at CONVERSATION_DB_PATH.
+    """
+    global _conversation_store
+    if _conversation_store is None:
+        ttl_seconds = float(os.getenv("CONVERSATION_TTL_SECONDS", DEFAULT_TTL_SECONDS))
+        history_window = int(os.getenv("CONVERSATION_HISTORY_WINDOW", DEFAULT_HISTORY_WINDOW))
+        backend = os.getenv("CONVERSATION_STORE", "memory").lower()
+        if backend == "sqlite":
+            db_path = os.getenv("CONVERSATION_DB_PATH", "conversations.db")
+            _conversation_store = SQLiteConversationStore(db_path, ttl_seconds, history_window)
+        elif backend == "memory":
+            _conversation_store = InMemoryConversationStore(ttl_seconds, history_window)
+        else:
+            raise ValueError(f"Unknown conversation store backend: {backend}")
+        logger.info(f"Using {backend} conversation store")
+    return _conversation_store
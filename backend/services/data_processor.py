@@ -1 +1,356 @@
+import itertools
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
 
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+TIME_FIELD = "time_boot_ms"
+
+# dtype kinds we treat as numeric (bool, signed int, unsigned int, float)
+NUMERIC_KINDS = "biuf"
+# bytes of streamed chunks held in memory before they are spilled to disk
+DEFAULT_BUFFER_BYTES = int(os.getenv("INGEST_BUFFER_MB", 64)) * 1024 * 1024
+# samples converted at a time when a spilled column changes dtype
+PROMOTE_BLOCK = 1 << 20
+
+
+def to_column(values: Any) -> np.ndarray:
+    """Convert a list of samples to a typed 1-D array, detecting the type once."""
+    if isinstance(values, np.ndarray) and values.ndim == 1:
+        return values
+
+    try:
+        column = np.asarray(values)
+    except ValueError:
+        # ragged nested lists, e.g. [[a, b], [c]] - keep them as objects
+        column = None
+
+    if column is None or column.ndim != 1:
+        # nested samples (arrays per row) are kept as an object column
+        column = np.empty(len(values), dtype=object)
+        for i, value in enumerate(values):
+            column[i] = value
+        return column
+
+    if column.dtype.kind == "O":
+        # mixed ints/floats/None come through as objects; None becomes NaN
+        try:
+            column = np.array(
+                [np.nan if value is None else value for value in values],
+                dtype=np.float64,
+            )
+        except (TypeError, ValueError):
+            pass
+
+    return column
+
+
+def is_numeric_column(column: np.ndarray) -> bool:
+    """Check if a column holds numeric samples."""
+    return column.ndim == 1 and column.dtype.kind in NUMERIC_KINDS
+
+
+class MessageColumns:
+    """Column store for a single message type, keyed by time_boot_ms."""
+
+    def __init__(self, msg_type: str, columns: Dict[str, np.ndarray]):
+        self.msg_type = msg_type
+        self.columns = columns
+        self.time = columns[TIME_FIELD]
+
+    def __len__(self) -> int:
+        return len(self.time)
+
+    def __contains__(self, field_name: str) -> bool:
+        return field_name in self.columns
+
+    def __getitem__(self, field_name: str) -> np.ndarray:
+        return self.columns[field_name]
+
+    @property
+    def field_names(self) -> List[str]:
+        return list(self.columns.keys())
+
+    @property
+    def numeric_fields(self) -> List[str]:
+        return [
+            field_name for field_name, column in self.columns.items()
+            if is_numeric_column(column)
+        ]
+
+    @property
+    def is_time_sorted(self) -> bool:
+        return bool(np.all(self.time[1:] >= self.time[:-1]))
+
+    def sorted_by_time(self) -> "MessageColumns":
+        """Return the columns ordered by time, so time ranges can be binary searched."""
+        if self.is_time_sorted:
+            return self
+        order = np.argsort(self.time, kind="stable")
+        return MessageColumns(
+            self.msg_type,
+            {field_name: column[order] for field_name, column in self.columns.items()},
+        )
+
+    def slice_rows(self, start: int, stop: Optional[int] = None) -> "MessageColumns":
+        """Samples [start, stop) of every column, as views (memory maps stay memory maps)."""
+        return MessageColumns(
+            self.msg_type,
+            {field_name: column[start:stop] for field_name, column in self.columns.items()},
+        )
+
+    def numeric_matrix(self, field_names: Optional[Iterable[str]] = None) -> np.ndarray:
+        """Stack numeric fields into a (samples, fields) float64 array."""
+        if field_names is None:
+            field_names = self.numeric_fields
+        field_names = list(field_names)
+        if not field_names:
+            return np.empty((len(self), 0), dtype=np.float64)
+        return np.column_stack(
+            [self.columns[field_name].astype(np.float64, copy=False) for field_name in field_names]
+        )
+
+
+def build_message_columns(msg_type: str, msg_data: Dict[str, Any]) -> Optional[MessageColumns]:
+    """Build the column store for one message type, dropping misaligned fields."""
+    time_column = to_column(msg_data[TIME_FIELD])
+    if not is_numeric_column(time_column) or len(time_column) == 0:
+        logger.warning(f"Message type {msg_type} has no numeric {TIME_FIELD} column")
+        return None
+    time_column = time_column.astype(np.float64, copy=False)
+    time_length = len(time_column)
+
+    columns = {TIME_FIELD: time_column}
+    for field_name, field_data in msg_data.items():
+        if field_name == TIME_FIELD:
+            continue
+        if not isinstance(field_data, (list, np.ndarray)) or len(field_data) != time_length:
+            continue
+        columns[field_name] = to_column(field_data)
+
+    return MessageColumns(msg_type, columns)
+
+
+def ingest_messages(messages: Dict[str, Any]) -> Dict[str, MessageColumns]:
+    """Turn raw message dicts of lists into per-message-type column stores."""
+    store = {}
+    for msg_type, msg_data in messages.items():
+        columns = build_message_columns(msg_type, msg_data)
+        if columns is not None:
+            store[msg_type] = columns
+    return store
+
+
+def promote_dtype(current: np.dtype, new: np.dtype) -> np.dtype:
+    """Common dtype of two chunks of a column, e.g. int and float chunks give float; object if there is none."""
+    if current == new:
+        return current
+    if (current.kind in NUMERIC_KINDS and new.kind in NUMERIC_KINDS) or (current.kind == new.kind and current.kind in "SU"):
+        return np.result_type(current, new)
+    return np.dtype(object)
+
+
+class ColumnBuffer:
+    """One column being built from chunks: recent chunks in memory, older ones spilled to a raw file.
+
+    Chunks whose dtypes differ are promoted to a common dtype. Object
+    columns can't be written as raw bytes, so they always stay in memory.
+    """
+
+    def __init__(self, path: Optional[Path] = None):
+        self.path = path
+        self.dtype: Optional[np.dtype] = None
+        self.chunks: List[np.ndarray] = []
+        self.length = 0
+        self.buffered_bytes = 0
+        self.spilled = 0
+
+    def append(self, column: np.ndarray) -> None:
+        dtype = column.dtype if self.dtype is None else promote_dtype(self.dtype, column.dtype)
+        if self.dtype is not None and dtype != self.dtype:
+            self._promote_spilled(dtype)
+        self.dtype = dtype
+        self.chunks.append(column)
+        self.length += len(column)
+        self.buffered_bytes += column.nbytes
+
+    def _spilled_values(self) -> np.ndarray:
+        return np.memmap(self.path, dtype=self.dtype, mode="r", shape=(self.spilled,))
+
+    def _promote_spilled(self, dtype: np.dtype) -> None:
+        """Rewrite the spilled samples in the new dtype, a block at a time."""
+        if not self.spilled:
+            return
+        spilled = self._spilled_values()
+        if dtype.kind == "O":
+            # nowhere to spill objects; bring the samples back into memory
+            self.chunks.insert(0, np.array(spilled, dtype=object))
+            self.buffered_bytes += self.chunks[0].nbytes
+            self.spilled = 0
+            del spilled
+            os.remove(self.path)
+            return
+        tmp_path = self.path.with_suffix(".tmp")
+        with open(tmp_path, 'wb') as f:
+            for start in range(0, self.spilled, PROMOTE_BLOCK):
+                f.write(spilled[start:start + PROMOTE_BLOCK].astype(dtype).tobytes())
+        del spilled
+        os.replace(tmp_path, self.path)
+
+    def flush(self) -> None:
+        """Write the in-memory chunks to the spill file."""
+        if not self.chunks or self.path is None or self.dtype.kind == "O":
+            return
+        with open(self.path, 'ab') as f:
+            for chunk in self.chunks:
+                f.write(np.ascontiguousarray(chunk, dtype=self.dtype).tobytes())
+        self.spilled += sum(len(chunk) for chunk in self.chunks)
+        self.chunks = []
+        self.buffered_bytes = 0
+
+    def build(self) -> np.ndarray:
+        """The whole column; memory-mapped from the spill file if anything was spilled."""
+        if self.spilled:
+            self.flush()
+            return self._spilled_values()
+        if not self.chunks:
+            return np.empty(0, dtype=self.dtype)
+        return np.concatenate([chunk.astype(self.dtype, copy=False) for chunk in self.chunks])
+
+
+class MessageColumnsBuilder:
+    """Accumulates chunks of one message type as typed arrays, optionally spilling them under spill_dir."""
+
+    def __init__(self, msg_type: str, spill_dir: Optional[Path] = None):
+        self.msg_type = msg_type
+        self.spill_dir = spill_dir
+        self.buffers: Dict[str, ColumnBuffer] = {}
+        self.length = 0
+
+    def append(self, msg_data: Dict[str, Any]) -> int:
+        """Append one chunk of samples, returning the number of samples added."""
+        chunk = build_message_columns(self.msg_type, msg_data)
+        if chunk is None:
+            return 0
+
+        for field_name, column in chunk.columns.items():
+            if field_name not in self.buffers:
+                if self.length > 0:
+                    # field appeared late; it can't be aligned with earlier samples
+                    continue
+                self.buffers[field_name] = ColumnBuffer(self._spill_path())
+            self.buffers[field_name].append(column)
+
+        self.length += len(chunk)
+        return len(chunk)
+
+    def _spill_path(self) -> Optional[Path]:
+        # numbered rather than named, since message types and fields aren't safe file names
+        return self.spill_dir / f"column_{next(_spill_ids)}.bin" if self.spill_dir is not None else None
+
+    @property
+    def buffered_bytes(self) -> int:
+        return sum(buffer.buffered_bytes for buffer in self.buffers.values())
+
+    def flush(self) -> None:
+        for buffer in self.buffers.values():
+            buffer.flush()
+
+    def build(self) -> Optional[MessageColumns]:
+        """Concatenate the chunks, dropping fields missing from any chunk."""
+        if self.length == 0:
+            return None
+        columns = {
+            field_name: buffer.build()
+            for field_name, buffer in self.buffers.items()
+            if buffer.length == self.length
+        }
+        return MessageColumns(self.msg_type, columns)
+
+
+_spill_ids = itertools.count()
+
+
+class ColumnStoreBuilder:
+    """Incrementally builds a column store from NDJSON chunks.
+
+    Each line is one chunk of a message type:
+    {"type": "AHR2", "fields": {"time_boot_ms": [...], "Roll": [...]}}
+
+    With a spill_dir, chunks are written to disk whenever more than
+    max_buffer_bytes are held in memory, and the built columns are memory
+    maps of those files, so memory stays bounded whatever the upload size.
+    spill_dir must outlive the built store.
+    """
+
+    def __init__(
+        self,
+        allowed_types: Optional[Iterable[str]] = None,
+        spill_dir: Optional[Path] = None,
+        max_buffer_bytes: int = DEFAULT_BUFFER_BYTES,
+    ):
+        self.allowed_types = set(allowed_types) if allowed_types is not None else None
+        self.spill_dir = Path(spill_dir) if spill_dir is not None else None
+        self.max_buffer_bytes = max_buffer_bytes
+        self.builders: Dict[str, MessageColumnsBuilder] = {}
+        self.skipped_types = set()
+        # pieces of the current, not yet terminated line
+        self._pending: List[bytes] = []
+
+    def add_chunk(self, msg_type: str, msg_data: Dict[str, Any]) -> int:
+        """Feed one chunk of a message type into the store."""
+        if self.allowed_types is not None and msg_type not in self.allowed_types:
+            self.skipped_types.add(msg_type)
+            return 0
+        if not isinstance(msg_data, dict) or TIME_FIELD not in msg_data:
+            raise ValueError(f"Chunk for {msg_type} is missing {TIME_FIELD}")
+        if msg_type not in self.builders:
+            self.builders[msg_type] = MessageColumnsBuilder(msg_type, self.spill_dir)
+        samples = self.builders[msg_type].append(msg_data)
+        if self.spill_dir is not None and sum(builder.buffered_bytes for builder in self.builders.values()) > self.max_buffer_bytes:
+            for builder in self.builders.values():
+                builder.flush()
+        return samples
+
+    def add_line(self, line: bytes) -> int:
+        """Parse and feed a single NDJSON record."""
+        line = line.strip()
+        if not line:
+            return 0
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Invalid NDJSON record: {e}") from e
+        if not isinstance(record, dict) or "type" not in record or "fields" not in record:
+            raise ValueError("NDJSON records must have 'type' and 'fields' keys")
+        return self.add_chunk(record["type"], record["fields"])
+
+    def feed(self, data: bytes) -> int:
+        """Feed raw bytes from the upload stream, parsing every complete line."""
+        if b"\n" not in data:
+            self._pending.append(data)
+            return 0
+        *lines, tail = data.split(b"\n")
+        lines[0] = b"".join(self._pending + [lines[0]])
+        self._pending = [tail]
+        return sum(self.add_line(line) for line in lines)
+
+    def close(self) -> int:
+        """Parse any trailing record left in the buffer."""
+        samples = self.add_line(b"".join(self._pending))
+        self._pending = []
+        return samples
+
+    def build(self) -> Dict[str, MessageColumns]:
+        """Return the finished column store."""
+        store = {}
+        for msg_type, builder in self.builders.items():
+            columns = builder.build()
+            if columns is not None:
+                store[msg_type] = columns
+        return store
@@ -0,0 +1,256 @@
+import logging
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from .data_processor import MessageColumns, TIME_FIELD
+
+logger = logging.getLogger(__name__)
+
+HEAD1 = 0xA3
+HEAD2 = 0x95
+HEADER_LENGTH = 3
+FMT_TYPE = 128
+FMT_LENGTH = 89
+# bytes scanned for record headers at a time, bounding the temporary masks
+SCAN_BLOCK_SIZE = 64 * 1024 * 1024
+
+# DataFlash format characters -> (little-endian numpy dtype, scale applied on decode)
+FORMAT_TYPES: Dict[str, Tuple[str, Optional[float]]] = {
+    "a": ("<i2", None),  # int16_t[32], expanded below
+    "b": ("i1", None),
+    "B": ("u1", None),
+    "h": ("<i2", None),
+    "H": ("<u2", None),
+    "i": ("<i4", None),
+    "I": ("<u4", None),
+    "f": ("<f4", None),
+    "d": ("<f8", None),
+    "n": ("S4", None),
+    "N": ("S16", None),
+    "Z": ("S64", None),
+    "c": ("<i2", 0.01),
+    "C": ("<u2", 0.01),
+    "e": ("<i4", 0.01),
+    "E": ("<u4", 0.01),
+    "L": ("<i4", 1.0e-7),
+    "M": ("i1", None),
+    "q": ("<i8", None),
+    "Q": ("<u8", None),
+}
+
+# the message types the web worker and process-bin-file.js request from the JS parser
+DEFAULT_MESSAGE_TYPES = (
+    "CMD", "MSG", "FILE", "MODE", "AHR2", "ATT", "GPS", "POS", "XKQ1", "XKQ", "NKQ1",
+    "NKQ2", "XKQ2", "PARM", "STAT", "EV", "XKF4", "FNCE",
+)
+
+_FMT_DTYPE = np.dtype([("type", "u1"), ("length", "u1"), ("name", "S4"), ("format", "S16"), ("columns", "S64")])
+
+
+class MessageFormat:
+    """A FMT record: how to decode one message id."""
+
+    def __init__(self, msg_id: int, length: int, name: str, format_chars: str, columns: List[str]):
+        self.msg_id = msg_id
+        self.length = length
+        self.name = name
+        self.format_chars = format_chars
+        self.columns = columns
+        self.instance_field: Optional[str] = None
+
+    @property
+    def dtype(self) -> np.dtype:
+        fields = []
+        for column, char in zip(self.columns, self.format_chars):
+            base, _ = FORMAT_TYPES[char]
+            fields.append((column, base, (32,)) if char == "a" else (column, base))
+        return np.dtype(fields)
+
+
+def _header_candidates(buf: np.ndarray) -> np.ndarray:
+    """Offsets of every HEAD1 HEAD2 byte pair, scanned in blocks."""
+    offsets = []
+    for start in range(0, max(len(buf) - 2, 0), SCAN_BLOCK_SIZE):
+        # one byte of overlap so pairs straddling a block edge are found
+        block = buf[start:start + SCAN_BLOCK_SIZE + 1]
+        offsets.append(np.flatnonzero((block[:-1] == HEAD1) & (block[1:] == HEAD2)) + start)
+    if not offsets:
+        return np.empty(0, dtype=np.int64)
+    candidates = np.concatenate(offsets).astype(np.int64)
+    return candidates[candidates + HEADER_LENGTH <= len(buf)]
+
+
+def _decode_strings(values: np.ndarray) -> np.ndarray:
+    return np.char.decode(values, "ascii", errors="replace")
+
+
+def _parse_formats(buf: np.ndarray, candidates: np.ndarray) -> Dict[int, MessageFormat]:
+    """Decode FMT records; the first valid definition of each message id wins."""
+    positions = candidates[(buf[candidates + 2] == FMT_TYPE) & (candidates + FMT_LENGTH <= len(buf))]
+    formats: Dict[int, MessageFormat] = {}
+    if len(positions) == 0:
+        return formats
+    records = np.frombuffer(_gather(buf, positions, FMT_LENGTH), dtype=_FMT_DTYPE)
+    for record in records:
+        msg_id, length = int(record["type"]), int(record["length"])
+        if msg_id in formats or length < HEADER_LENGTH:
+            continue
+        try:
+            name = record["name"].decode("ascii")
+            format_chars = record["format"].decode("ascii")
+            columns = record["columns"].decode("ascii").split(",") if format_chars else []
+        except UnicodeDecodeError:
+            # a header pattern inside another record's payload
+            continue
+        if any(char not in FORMAT_TYPES for char in format_chars) or len(columns) != len(format_chars):
+            continue
+        formats[msg_id] = MessageFormat(msg_id, length, name, format_chars, columns)
+    return formats
+
+
+def _record_starts(buf: np.ndarray, candidates: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+    """Keep the candidates that are real record starts.
+
+    Consecutive records normally end exactly where the next header starts, so
+    whole runs are accepted at once; only breaks (a header pattern inside a
+    payload, or corrupt data) are walked one at a time. Every record must fit
+    in the buffer, and the last record of a run must end at a header pattern
+    or exactly at the end of the buffer, so header patterns in corrupt data
+    or a truncated tail are skipped.
+    """
+    headers = candidates
+    record_lengths = lengths[buf[candidates + 2]]
+    valid = (record_lengths > 0) & (candidates + record_lengths <= len(buf))
+    candidates, record_lengths = candidates[valid], record_lengths[valid]
+    if len(candidates) == 0:
+        return candidates
+
+    ends = candidates + record_lengths
+    breaks = np.flatnonzero(ends[:-1] != candidates[1:])
+
+    # whether the records that can end a run end at a header (even one of a truncated
+    # or unknown record) or at the end of the buffer
+    run_ends = np.append(breaks, len(candidates) - 1)
+    next_header = headers[np.minimum(np.searchsorted(headers, ends[run_ends]), len(headers) - 1)]
+    chained = np.zeros(len(candidates), dtype=bool)
+    chained[run_ends] = (next_header == ends[run_ends]) | (ends[run_ends] == len(buf))
+
+    runs = []
+    i = 0
+    while i < len(candidates):
+        next_break = np.searchsorted(breaks, i)
+        last = int(breaks[next_break]) if next_break < len(breaks) else len(candidates) - 1
+        if chained[last]:
+            runs.append(candidates[i:last + 1])
+            # resync on the first header at or after the end of the run
+            i = int(np.searchsorted(candidates, ends[last], side="left"))
+        else:
+            # the last record is a header pattern in corrupt data or a truncated tail (a lone one
+            # is dropped entirely); a real record may start inside it
+            if last > i:
+                runs.append(candidates[i:last])
+            i = last + 1
+    return np.concatenate(runs) if runs else candidates[:0]
+
+
+def _gather(buf: np.ndarray, positions: np.ndarray, length: int) -> np.ndarray:
+    """Copy the payloads of fixed-length records into one contiguous (records, length - 3) array."""
+    payload = np.empty((len(positions), length - HEADER_LENGTH), dtype=np.uint8)
+    # one vectorized gather per byte column keeps the index arrays small
+    for offset in range(length - HEADER_LENGTH):
+        payload[:, offset] = buf[positions + HEADER_LENGTH + offset]
+    return payload
+
+
+def _decode_columns(records: np.ndarray, fmt: MessageFormat) -> Dict[str, np.ndarray]:
+    columns = {}
+    for column, char in zip(fmt.columns, fmt.format_chars):
+        if char == "a":
+            # fixed int16 arrays don't fit a one-value-per-sample column
+            continue
+        values = records[column]
+        _, scale = FORMAT_TYPES[char]
+        if scale is not None:
+            values = values.astype(np.float64) * scale
+        elif values.dtype.kind == "S":
+            values = _decode_strings(values)
+        columns[column] = np.ascontiguousarray(values)
+
+    if "TimeUS" in columns:
+        columns[TIME_FIELD] = columns["TimeUS"].astype(np.float64) / 1000.0
+    elif "TimeMS" in columns:
+        columns[TIME_FIELD] = columns["TimeMS"].astype(np.float64)
+    return columns
+
+
+def _apply_units(buf: np.ndarray, starts: np.ndarray, formats: Dict[int, MessageFormat]) -> None:
+    """Mark instance fields ('#' in FMTU UnitIds) so multi-instance messages can be split."""
+    fmtu = next((fmt for fmt in formats.values() if fmt.name == "FMTU"), None)
+    if fmtu is None:
+        return
+    positions = starts[buf[starts + 2] == fmtu.msg_id]
+    if len(positions) == 0:
+        return
+    records = np.frombuffer(_gather(buf, positions, fmtu.length), dtype=fmtu.dtype)
+    for record in records:
+        fmt = formats.get(int(record["FmtType"]))
+        unit_ids = record["UnitIds"].decode("ascii", errors="replace")
+        if fmt is not None and "#" in unit_ids:
+            index = unit_ids.index("#")
+            if index < len(fmt.columns):
+                fmt.instance_field = fmt.columns[index]
+
+
+def read_dataflash_buffer(buf: np.ndarray, message_types: Optional[Iterable[str]] = None) -> Dict[str, MessageColumns]:
+    """Decode a DataFlash log held in a uint8 array into a column store."""
+    wanted = set(message_types) if message_types is not None else None
+    candidates = _header_candidates(buf)
+    formats = _parse_formats(buf, candidates)
+
+    lengths = np.zeros(256, dtype=np.int64)
+    lengths[FMT_TYPE] = FMT_LENGTH
+    for fmt in formats.values():
+        lengths[fmt.msg_id] = fmt.length
+    starts = _record_starts(buf, candidates, lengths)
+    _apply_units(buf, starts, formats)
+
+    msg_ids = buf[starts + 2]
+    store: Dict[str, MessageColumns] = {}
+    for fmt in formats.values():
+        if wanted is not None and fmt.name not in wanted:
+            continue
+        positions = starts[msg_ids == fmt.msg_id]
+        if len(positions) == 0:
+            continue
+        if fmt.dtype.itemsize != fmt.length - HEADER_LENGTH:
+            logger.warning(f"Skipping {fmt.name}: format {fmt.format_chars} does not match length {fmt.length}")
+            continue
+
+        records = np.frombuffer(_gather(buf, positions, fmt.length), dtype=fmt.dtype)
+        columns = _decode_columns(records, fmt)
+        if TIME_FIELD not in columns:
+            logger.debug(f"Skipping {fmt.name}: no TimeUS field")
+            continue
+
+        if fmt.instance_field is None:
+            store[fmt.name] = MessageColumns(fmt.name, columns)
+            continue
+        instances = columns[fmt.instance_field]
+        for instance in np.unique(instances).tolist():
+            mask = instances == instance
+            name = f"{fmt.name}[{instance}]"
+            store[name] = MessageColumns(name, {column: values[mask] for column, values in columns.items()})
+    return store
+
+
+def read_dataflash(path: Path, message_types: Optional[Iterable[str]] = None) -> Dict[str, MessageColumns]:
+    """Decode a DataFlash .bin file, memory-mapped, into a column store keyed like the JS parser (GPS[0])."""
+    if Path(path).stat().st_size < HEADER_LENGTH:
+        return {}
+    buf = np.memmap(path, dtype=np.uint8, mode="r")
+    try:
+        return read_dataflash_buffer(buf, message_types)
+    finally:
+        del buf
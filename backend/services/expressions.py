@@ -0,0 +1,311 @@
+import ast
+import logging
+import re
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Mapping, Optional, Tuple
+
+import numpy as np
+
+from ..utils import mavextra
+from .alignment import resample
+from .data_processor import MessageColumns
+
+logger = logging.getLogger(__name__)
+
+Evaluator = Callable[["EvaluationContext"], Any]
+
+
+class ExpressionError(ValueError):
+    """Raised when an expression can't be parsed or evaluated."""
+
+
+def _altitude(context: "EvaluationContext", SCALED_PRESSURE, groundPressure=None, groundTemp=None):
+    # the JS version reads ground pressure/temperature from the log parameters
+    if groundPressure is None:
+        groundPressure = context.param("GND_ABS_PRESS")
+    if groundTemp is None:
+        groundTemp = context.param("GND_TEMP", 0.0)
+    return mavextra.altitude(SCALED_PRESSURE, groundPressure, groundTemp)
+
+
+def _with_declination(function: Callable) -> Callable:
+    def wrapper(context: "EvaluationContext", *args):
+        if len(args) < 3:
+            args = args + (mavextra.degrees(context.param("COMPASS_DEC", 0.0)),)
+        return function(*args)
+    return wrapper
+
+
+# Functions callable from expressions; each receives the evaluation context first
+FUNCTIONS: Dict[str, Callable] = {
+    "degrees": lambda context, a: mavextra.degrees(a),
+    "radians": lambda context, a: mavextra.radians(a),
+    "kmh": lambda context, a: mavextra.kmh(a),
+    "sqrt": lambda context, a: mavextra.sqrt(a),
+    "abs": lambda context, a: np.abs(a),
+    "min": lambda context, a, b: np.minimum(a, b),
+    "max": lambda context, a, b: np.maximum(a, b),
+    "angle_diff": lambda context, a, b: mavextra.angle_diff(a, b),
+    "lowpass": lambda context, *args: mavextra.lowpass(*args),
+    "delta": lambda context, *args: mavextra.delta(*args),
+    "altitude": _altitude,
+    "mag_heading": _with_declination(mavextra.mag_heading),
+    "mag_heading_df": _with_declination(mavextra.mag_heading_df),
+    "mag_field": lambda context, RAW_IMU, *args: mavextra.mag_field(RAW_IMU),
+    "mag_field_df": lambda context, MAG, *args: mavextra.mag_field_df(MAG),
+    "expected_mag": lambda context, *args: mavextra.expected_mag(*args),
+    "expected_mag_yaw": lambda context, *args: mavextra.expected_mag_yaw(*args),
+    "earth_field_error": lambda context, GPS, NKF2: mavextra.earth_field_error(GPS, NKF2),
+    "sim_body_rates": lambda context, SIM: mavextra.sim_body_rates(SIM),
+    "gravity": lambda context, RAW_IMU, *args: mavextra.gravity(RAW_IMU),
+    "distance_two": lambda context, *args: mavextra.distance_two(*args),
+    "atan2": lambda context, y, x: mavextra.atan2(y, x),
+    "wrap_180": lambda context, a: mavextra.wrap_180(a),
+    "wrap_360": lambda context, a: mavextra.wrap_360(a),
+}
+
+# argument positions that may be a string constant, e.g. the key of lowpass(IMU.GyrX,"gx",0.9)
+KEY_ARGUMENTS = {"lowpass": 1, "delta": 1}
+
+BINARY_OPERATORS = {
+    ast.Add: np.add,
+    ast.Sub: np.subtract,
+    ast.Mult: np.multiply,
+    ast.Div: np.true_divide,
+    ast.Pow: np.power,
+    ast.Mod: np.mod,
+}
+
+UNARY_OPERATORS = {
+    ast.USub: np.negative,
+    ast.UAdd: np.positive,
+    ast.Not: np.logical_not,
+}
+
+COMPARE_OPERATORS = {
+    ast.Eq: np.equal,
+    ast.NotEq: np.not_equal,
+    ast.Lt: np.less,
+    ast.LtE: np.less_equal,
+    ast.Gt: np.greater,
+    ast.GtE: np.greater_equal,
+}
+
+# the only attributes of computed values, e.g. expected_mag(GPS,ATT).x
+VECTOR_ATTRIBUTES = ("x", "y", "z")
+
+
+class MessageView:
+    """Attribute access to a message's fields on the evaluation clock, e.g. ATT.Roll."""
+
+    def __init__(self, context: "EvaluationContext", msg_type: str):
+        self._context = context
+        self._msg_type = msg_type
+
+    def __getattr__(self, field_name: str) -> np.ndarray:
+        if field_name.startswith("_"):
+            raise AttributeError(field_name)
+        try:
+            return self._context.field(self._msg_type, field_name)
+        except ExpressionError:
+            raise AttributeError(field_name) from None
+
+
+class EvaluationContext:
+    """Resolves message fields onto the time base of the expression's first message."""
+
+    def __init__(self, source: Any, base_msg_type: str, params: Optional[Mapping[str, float]] = None):
+        self.source = source
+        self.params = params or {}
+        self.base_msg_type = base_msg_type
+        self.time = self.columns(base_msg_type).time
+        self._fields: Dict[Tuple[str, str], np.ndarray] = {}
+
+    def columns(self, msg_type: str) -> MessageColumns:
+        try:
+            if hasattr(self.source, "get_columns"):
+                return self.source.get_columns(msg_type)
+            return self.source[msg_type]
+        except KeyError:
+            raise ExpressionError(f"Message type {msg_type} is not available") from None
+
+    def field(self, msg_type: str, field_name: str) -> np.ndarray:
+        key = (msg_type, field_name)
+        if key not in self._fields:
+            columns = self.columns(msg_type)
+            if field_name not in columns:
+                raise ExpressionError(f"{msg_type} has no field {field_name}")
+            values = np.asarray(columns[field_name], dtype=np.float64)
+            if msg_type != self.base_msg_type:
+                # other messages are linearly interpolated onto the base clock
+                values = resample(self.time, columns.time, values, "linear")
+            self._fields[key] = values
+        return self._fields[key]
+
+    def param(self, name: str, default: Optional[float] = None) -> float:
+        if name in self.params:
+            return self.params[name]
+        if default is None:
+            raise ExpressionError(f"Parameter {name} is required")
+        return default
+
+
+class CompiledExpression:
+    """A parsed expression, reusable across flights."""
+
+    def __init__(self, text: str, evaluate: Evaluator, messages: List[str], condition: Optional[Evaluator]):
+        self.text = text
+        self._evaluate = evaluate
+        self.messages = messages
+        self._condition = condition
+
+    def evaluate(self, source: Any, params: Optional[Mapping[str, float]] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Evaluate over a column store or flight session, returning (time, values)."""
+        context = EvaluationContext(source, self.messages[0], params)
+        try:
+            values = self._evaluate(context)
+            if isinstance(values, mavextra.Vector3Array):
+                raise ExpressionError(f"{self.text} is a vector; select .x, .y or .z")
+            values = np.broadcast_to(np.asarray(values, dtype=np.float64), context.time.shape)
+            time_data = context.time
+            if self._condition is not None:
+                mask = np.broadcast_to(np.asarray(self._condition(context), dtype=bool), time_data.shape)
+                time_data, values = time_data[mask], values[mask]
+        except ExpressionError:
+            raise
+        except Exception as e:
+            # wrong argument types or counts, shape mismatches and the like
+            raise ExpressionError(f"Can't evaluate {self.text}: {e}") from None
+        return time_data, values
+
+
+def _message_name(node: ast.AST) -> Optional[str]:
+    """Message type referenced by a Name (ATT) or instance Subscript (XKF4[0]) node."""
+    if isinstance(node, ast.Name) and node.id not in FUNCTIONS:
+        return node.id
+    if (isinstance(node, ast.Subscript) and isinstance(node.value, ast.Name)
+            and isinstance(node.slice, ast.Constant) and isinstance(node.slice.value, int)):
+        return f"{node.value.id}[{node.slice.value}]"
+    return None
+
+
+def _is_string(node: ast.AST) -> bool:
+    return isinstance(node, ast.Constant) and isinstance(node.value, str)
+
+
+def _compile_key(node: ast.Constant) -> Evaluator:
+    key = node.value
+    return lambda context: key
+
+
+def _compile_node(node: ast.AST, messages: List[str], allow_message: bool = False) -> Evaluator:
+    """Compile node to an evaluator of arrays; whole messages (e.g. mag_field(RAW_IMU)) only if allow_message."""
+    if isinstance(node, ast.Expression):
+        return _compile_node(node.body, messages)
+
+    if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)) and not isinstance(node.value, bool):
+        value = node.value
+        return lambda context: value
+
+    if isinstance(node, ast.Attribute):
+        msg_type = _message_name(node.value)
+        field_name = node.attr
+        if msg_type is not None:
+            if msg_type not in messages:
+                messages.append(msg_type)
+            return lambda context: context.field(msg_type, field_name)
+        # attribute of a computed value, e.g. expected_mag(GPS,ATT).x
+        if field_name not in VECTOR_ATTRIBUTES:
+            raise ExpressionError(f"Unsupported attribute .{field_name}; only {', '.join(VECTOR_ATTRIBUTES)} of vectors")
+        value = _compile_node(node.value, messages)
+
+        def evaluate_component(context):
+            vector = value(context)
+            if not isinstance(vector, mavextra.Vector3Array):
+                raise ExpressionError(f"Can't select .{field_name} of a value that isn't a vector")
+            return getattr(vector, field_name)
+        return evaluate_component
+
+    msg_type = _message_name(node)
+    if msg_type is not None:
+        if not allow_message:
+            raise ExpressionError(f"{msg_type} is a message; select a field, e.g. {msg_type}.<field>")
+        if msg_type not in messages:
+            messages.append(msg_type)
+        return lambda context: MessageView(context, msg_type)
+
+    if isinstance(node, ast.BinOp) and type(node.op) in BINARY_OPERATORS:
+        operator = BINARY_OPERATORS[type(node.op)]
+        left, right = _compile_node(node.left, messages), _compile_node(node.right, messages)
+        return lambda context: operator(left(context), right(context))
+
+    if isinstance(node, ast.UnaryOp) and type(node.op) in UNARY_OPERATORS:
+        operator = UNARY_OPERATORS[type(node.op)]
+        operand = _compile_node(node.operand, messages)
+        return lambda context: operator(operand(context))
+
+    if isinstance(node, ast.Compare) and len(node.ops) == 1 and type(node.ops[0]) in COMPARE_OPERATORS:
+        operator = COMPARE_OPERATORS[type(node.ops[0])]
+        left, right = _compile_node(node.left, messages), _compile_node(node.comparators[0], messages)
+        return lambda context: operator(left(context), right(context))
+
+    if isinstance(node, ast.BoolOp):
+        operator = np.logical_and if isinstance(node.op, ast.And) else np.logical_or
+        operands = [_compile_node(value, messages) for value in node.values]
+
+        def evaluate_bool(context):
+            result = operands[0](context)
+            for operand in operands[1:]:
+                result = operator(result, operand(context))
+            return result
+        return evaluate_bool
+
+    if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id in FUNCTIONS and not node.keywords:
+        function = FUNCTIONS[node.func.id]
+        args = [
+            _compile_key(arg) if position == KEY_ARGUMENTS.get(node.func.id) and _is_string(arg)
+            else _compile_node(arg, messages, allow_message=True)
+            for position, arg in enumerate(node.args)
+        ]
+        return lambda context: function(context, *(arg(context) for arg in args))
+
+    if isinstance(node, ast.Call) and isinstance(node.func, ast.Name):
+        raise ExpressionError(f"Unsupported function {node.func.id}")
+    raise ExpressionError(f"Unsupported expression element {type(node).__name__}")
+
+
+def _parse(text: str) -> ast.Expression:
+    try:
+        return ast.parse(text, mode="eval")
+    except SyntaxError as e:
+        raise ExpressionError(f"Invalid expression {text!r}: {e.msg}") from None
+
+
+@lru_cache(maxsize=512)
+def compile_expression(expression: str) -> CompiledExpression:
+    """Parse a mavgraphs.xml style expression, e.g. degrees(ATT.Roll) or CTUN.As*CTUN.E2T{CTUN.As>5}.
+
+    A trailing :N axis marker is ignored and a trailing {condition} filters samples.
+    """
+    text = " ".join(expression.split())
+    condition_text = None
+    match = re.fullmatch(r"(.*?)\{(.*)\}", text)
+    if match:
+        text, condition_text = match.group(1), match.group(2)
+    text = re.sub(r":\d+$", "", text)
+
+    messages: List[str] = []
+    evaluate = _compile_node(_parse(text), messages)
+    condition = _compile_node(_parse(condition_text), messages) if condition_text else None
+    if not messages:
+        raise ExpressionError(f"Expression {expression!r} references no message fields")
+    return CompiledExpression(expression, evaluate, messages, condition)
+
+
+def evaluate_expression(
+    expression: str,
+    source: Any,
+    params: Optional[Mapping[str, float]] = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Evaluate an expression over a column store or FlightSession, returning (time, values)."""
+    return compile_expression(expression).evaluate(source, params)
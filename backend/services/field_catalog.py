@@ -0,0 +1,112 @@
+import logging
+import os
+import pickle
+import threading
+import xml.etree.ElementTree as ET
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+LOGMETADATA_DIR = Path(__file__).resolve().parents[2] / "src" / "assets" / "logmetadata"
+CATALOG_CACHE_DIR = Path(os.getenv("CATALOG_CACHE_DIR", "flight_data_exports/catalog"))
+VEHICLES = ("copter", "plane", "rover", "tracker")
+DEFAULT_VEHICLE = "copter"
+CATALOG_VERSION = 1
+
+
+def base_message_type(msg_type: str) -> str:
+    """Strip the instance suffix, e.g. GPS[0] -> GPS."""
+    return msg_type.split("[", 1)[0]
+
+
+class FieldCatalog:
+    """ArduPilot message and field documentation for one vehicle type."""
+
+    def __init__(
+        self,
+        vehicle: str,
+        messages: Dict[str, str],
+        fields: Dict[Tuple[str, str], str],
+        field_names: Dict[str, str],
+    ):
+        self.vehicle = vehicle
+        self.messages = messages
+        self.fields = fields
+        # first description seen for a field name, for lookups without a message type
+        self.field_names = field_names
+
+    def message_description(self, msg_type: str) -> Optional[str]:
+        return self.messages.get(base_message_type(msg_type))
+
+    def field_description(self, field_name: str, msg_type: Optional[str] = None) -> Optional[str]:
+        if msg_type is not None:
+            description = self.fields.get((base_message_type(msg_type), field_name))
+            if description is not None:
+                return description
+        return self.field_names.get(field_name)
+
+
+def _text(element: Optional[ET.Element]) -> str:
+    return " ".join((element.text or "").split()) if element is not None else ""
+
+
+def parse_logmetadata(xml_path: Path, vehicle: str) -> FieldCatalog:
+    """Compile a logmetadata XML file into a catalog."""
+    messages = {}
+    fields = {}
+    field_names = {}
+    for logformat in ET.parse(xml_path).getroot().iter("logformat"):
+        msg_name = logformat.get("name")
+        messages[msg_name] = _text(logformat.find("description"))
+        for field in logformat.iterfind("fields/field"):
+            field_name = field.get("name")
+            description = _text(field.find("description"))
+            fields[(msg_name, field_name)] = description
+            field_names.setdefault(field_name, description)
+    return FieldCatalog(vehicle, messages, fields, field_names)
+
+
+def _cache_path(xml_path: Path, vehicle: str) -> Path:
+    stat = xml_path.stat()
+    return CATALOG_CACHE_DIR / f"{vehicle}_v{CATALOG_VERSION}_{stat.st_size}_{int(stat.st_mtime)}.pickle"
+
+
+def build_catalog(vehicle: str) -> FieldCatalog:
+    """Load the compiled catalog for a vehicle, compiling the XML on first use."""
+    if vehicle not in VEHICLES:
+        raise ValueError(f"Unknown vehicle type: {vehicle}")
+    xml_path = LOGMETADATA_DIR / f"{vehicle}.xml"
+    cache_path = _cache_path(xml_path, vehicle)
+
+    if cache_path.exists():
+        try:
+            with open(cache_path, 'rb') as f:
+                return pickle.load(f)
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable catalog cache {cache_path}: {e}")
+
+    catalog = parse_logmetadata(xml_path, vehicle)
+    try:
+        CATALOG_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        # write then rename so concurrent workers never read a partial file
+        tmp_path = cache_path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(catalog, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, cache_path)
+    except OSError as e:
+        logger.warning(f"Could not write catalog cache {cache_path}: {e}")
+    return catalog
+
+
+_catalogs: Dict[str, FieldCatalog] = {}
+_lock = threading.Lock()
+
+
+def get_field_catalog(vehicle: Optional[str] = None) -> FieldCatalog:
+    """Lazily loaded, process-wide catalog for a vehicle type."""
+    vehicle = (vehicle or DEFAULT_VEHICLE).lower()
+    with _lock:
+        if vehicle not in _catalogs:
+            _catalogs[vehicle] = build_catalog(vehicle)
+        return _catalogs[vehicle]
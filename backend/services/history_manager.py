@@ -0,0 +1,197 @@
+import asyncio
+import hashlib
+import logging
+import os
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .context_builder import estimate_tokens
+from .conversation_store import ConversationStore, get_conversation_store
+from .llm_clients import acomplete, complete, get_async_openai_client, get_openai_client
+
+logger = logging.getLogger(__name__)
+
+# tokens of conversation (summary plus verbatim turns) sent with each prompt
+DEFAULT_HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", 3000))
+# once over budget, fold old turns until the verbatim part is under this fraction of the budget,
+# so summarization runs every few turns rather than on every one
+COMPACT_TO_FRACTION = 0.5
+# the latest turns are always sent verbatim
+MIN_RECENT_MESSAGES = 4
+SUMMARY_MAX_TOKENS = 400
+SUMMARY_MODEL = os.getenv("HISTORY_SUMMARY_MODEL", "gpt-4.1-mini")
+# per-message fallback excerpt when the summarizer is unavailable
+FALLBACK_EXCERPT_CHARS = 200
+
+SUMMARY_SYSTEM_PROMPT = """You maintain a running summary of a conversation between a user and a flight data analyst.
+Update the summary with the new messages. Keep every flight, message type, field, time and number that was
+asked about or reported, and any conclusions reached. Drop pleasantries. Reply with the summary only."""
+
+Message = Dict[str, str]
+
+
+def message_tokens(message: Message) -> int:
+    return estimate_tokens(message.get("content") or "") + 4
+
+
+def build_summary_messages(summary: str, messages: List[Message]) -> List[Message]:
+    transcript = "\n".join(f"{message['role']}: {message['content']}" for message in messages)
+    return [
+        {"role": "system", "content": SUMMARY_SYSTEM_PROMPT},
+        {"role": "user", "content": f"Summary so far:\n{summary or '(none)'}\n\nNew messages:\n{transcript}"},
+    ]
+
+
+def fallback_summary(summary: str, messages: List[Message]) -> str:
+    """Extractive summary used when the LLM summary fails: the start of each folded message."""
+    excerpts = [f"{message['role']}: {message['content'][:FALLBACK_EXCERPT_CHARS]}" for message in messages]
+    return "\n".join(([summary] if summary else []) + excerpts)
+
+
+def summarize(summary: str, messages: List[Message]) -> str:
+    """Fold messages into the running summary with one LLM call."""
+    try:
+        response = complete(
+            get_openai_client(),
+            build_summary_messages(summary, messages),
+            model=SUMMARY_MODEL,
+            temperature=0,
+            max_tokens=SUMMARY_MAX_TOKENS
+        )
+        return response.choices[0].message.content or fallback_summary(summary, messages)
+    except Exception as e:
+        logger.error(f"Error summarizing conversation history: {e}")
+        return fallback_summary(summary, messages)
+
+
+async def asummarize(summary: str, messages: List[Message]) -> str:
+    try:
+        response = await acomplete(
+            get_async_openai_client(),
+            build_summary_messages(summary, messages),
+            model=SUMMARY_MODEL,
+            temperature=0,
+            max_tokens=SUMMARY_MAX_TOKENS
+        )
+        return response.choices[0].message.content or fallback_summary(summary, messages)
+    except Exception as e:
+        logger.error(f"Error summarizing conversation history: {e}")
+        return fallback_summary(summary, messages)
+
+
+class HistoryManager:
+    """Keeps the conversation part of each prompt within a token budget.
+
+    Old turns are folded into a rolling summary stored with the conversation,
+    a few at a time, so each turn costs O(new messages) rather than
+    re-summarizing or resending the whole history. Prompts are laid out as a
+    stable prefix (system prompt, flight context), then the summary, then the
+    verbatim recent turns, so provider-side prompt caching can reuse the
+    prefix across turns.
+    """
+
+    def __init__(
+        self,
+        store: Optional[ConversationStore] = None,
+        token_budget: int = DEFAULT_HISTORY_TOKEN_BUDGET,
+        min_recent: int = MIN_RECENT_MESSAGES,
+        summarize_fn: Callable[[str, List[Message]], str] = summarize,
+        asummarize_fn: Callable[..., Any] = asummarize,
+    ):
+        self.store = store
+        self.token_budget = token_budget
+        self.min_recent = min_recent
+        self.summarize_fn = summarize_fn
+        self.asummarize_fn = asummarize_fn
+
+    def _store(self) -> ConversationStore:
+        return self.store or get_conversation_store()
+
+    def _unsummarized(self, conversation: Dict[str, Any]) -> Tuple[str, int, List[Message]]:
+        """The stored summary, the absolute index of the first window message, and the messages it doesn't cover."""
+        messages = conversation["messages"]
+        summary, covered = self._store().get_summary(conversation["id"])
+        window_start = conversation.get("message_count", len(messages)) - len(messages)
+        # messages older than the store's window and never summarized are gone; start from the window
+        return summary, window_start, messages[max(covered - window_start, 0):]
+
+    def _to_fold(self, summary: str, recent: List[Message]) -> int:
+        """How many of the oldest unsummarized messages to fold into the summary (0 if within budget)."""
+        tokens = [message_tokens(message) for message in recent]
+        if estimate_tokens(summary) + sum(tokens) <= self.token_budget:
+            return 0
+        target = self.token_budget * COMPACT_TO_FRACTION
+        fold, remaining = 0, sum(tokens)
+        while len(recent) - fold > self.min_recent and remaining > target:
+            remaining -= tokens[fold]
+            fold += 1
+        return fold
+
+    def compact(self, conversation: Dict[str, Any]) -> Tuple[str, List[Message]]:
+        """The conversation's summary and the recent messages to send verbatim, folding old turns if over budget."""
+        if "id" not in conversation:
+            return "", list(conversation["messages"])
+        summary, window_start, recent = self._unsummarized(conversation)
+        fold = self._to_fold(summary, recent)
+        if fold:
+            summary = self.summarize_fn(summary, recent[:fold])
+            covered = window_start + len(conversation["messages"]) - len(recent) + fold
+            self._store().set_summary(conversation["id"], summary, covered)
+            recent = recent[fold:]
+        return summary, recent
+
+    async def acompact(self, conversation: Dict[str, Any]) -> Tuple[str, List[Message]]:
+        """Async compact(); store access runs in a worker thread."""
+        if "id" not in conversation:
+            return "", list(conversation["messages"])
+        summary, window_start, recent = await asyncio.to_thread(self._unsummarized, conversation)
+        fold = self._to_fold(summary, recent)
+        if fold:
+            summary = await self.asummarize_fn(summary, recent[:fold])
+            covered = window_start + len(conversation["messages"]) - len(recent) + fold
+            await asyncio.to_thread(self._store().set_summary, conversation["id"], summary, covered)
+            recent = recent[fold:]
+        return summary, recent
+
+
+def history_key(summary: str, recent: List[Message]) -> str:
+    """Hash of the conversation before the latest message, for caching answers that depend on it.
+
+    Empty for the first question of a conversation, so those are shared
+    across conversations.
+    """
+    earlier = recent[:-1]
+    if not summary and not earlier:
+        return ""
+    digest = hashlib.sha1(summary.encode("utf-8"))
+    for message in earlier:
+        digest.update(f"\0{message['role']}\0{message['content']}".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def build_prompt(
+    system_prompt: str,
+    summary: str,
+    recent: List[Message],
+    flight_context: Optional[str] = None,
+) -> List[Message]:
+    """Prompt messages with the stable parts first: system prompt, flight context, summary, then recent turns."""
+    messages = [{"role": "system", "content": system_prompt}]
+    if flight_context:
+        messages.append({"role": "system", "content": f"Flight data available:\n{flight_context}"})
+    if summary:
+        messages.append({"role": "system", "content": f"Summary of the earlier conversation:\n{summary}"})
+    return messages + [{"role": message["role"], "content": message["content"]} for message in recent]
+
+
+_history_manager: Optional[HistoryManager] = None
+_lock = threading.Lock()
+
+
+def get_history_manager() -> HistoryManager:
+    """Process-wide history manager over the configured conversation store."""
+    global _history_manager
+    with _lock:
+        if _history_manager is None:
+            _history_manager = HistoryManager()
+        return _history_manager
@@ -0,0 +1,252 @@
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+JOBS_DIR = Path("flight_data_exports") / "jobs"
+DEFAULT_WORKERS = 2
+DEFAULT_MAX_PENDING = 8
+MAX_FINISHED_JOBS = 256
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+
+class QueueFullError(RuntimeError):
+    """Raised when a job is submitted while the queue is at capacity."""
+
+
+class Job:
+    """One background processing run and its per-message-type progress.
+
+    With a status_path, every change is also written there, so any worker
+    process sharing the directory can report the job.
+    """
+
+    def __init__(self, job_id: str, content_hash: str, status_path: Optional[Path] = None):
+        self.id = job_id
+        self.content_hash = content_hash
+        self.status = QUEUED
+        self.stage: Optional[str] = None
+        self.progress: Dict[str, str] = {}
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.status_path = status_path
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+
+    @classmethod
+    def from_dict(cls, state: Dict[str, Any]) -> "Job":
+        """Snapshot of a job from its to_dict() state, e.g. one run by another worker process."""
+        job = cls(state["job_id"], state["content_hash"])
+        job.status, job.stage, job.progress = state["status"], state["stage"], state["progress"]
+        job.result, job.error = state["result"], state["error"]
+        job.created_at, job.started_at, job.finished_at = state["created_at"], state["started_at"], state["finished_at"]
+        return job
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (SUCCEEDED, FAILED)
+
+    def set_stage(self, stage: str) -> None:
+        with self._lock:
+            self.stage = stage
+        self.save()
+
+    def update_progress(self, msg_type: str, state: str) -> None:
+        with self._lock:
+            self.progress[msg_type] = state
+        self.save()
+
+    def save(self) -> None:
+        if self.status_path is None:
+            return
+        with self._save_lock:
+            tmp_path = self.status_path.with_name(f".tmp-{self.status_path.name}")
+            try:
+                self.status_path.parent.mkdir(parents=True, exist_ok=True)
+                with open(tmp_path, 'w') as f:
+                    json.dump(self.to_dict(), f)
+                os.replace(tmp_path, self.status_path)
+            except OSError as e:
+                logger.warning(f"Could not persist status of job {self.id}: {e}")
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            done = sum(1 for state in self.progress.values() if state == "done")
+            return {
+                "job_id": self.id,
+                "status": self.status,
+                "stage": self.stage,
+                "content_hash": self.content_hash,
+                "progress": dict(self.progress),
+                "message_types_done": done,
+                "message_types_total": len(self.progress),
+                "result": self.result,
+                "error": self.error,
+                "created_at": self.created_at,
+                "started_at": self.started_at,
+                "finished_at": self.finished_at,
+            }
+
+
+class JobQueue:
+    """Bounded background executor for flight processing, deduplicated by content hash.
+
+    Successful results are also written to results_dir, so re-uploading a
+    log after a restart still returns the earlier flight. Job status is
+    written to results_dir/status, so with several server workers a job can
+    be polled from any of them. Backpressure and deduplication of jobs that
+    are still running are per worker process.
+    """
+
+    def __init__(
+        self,
+        max_workers: int = DEFAULT_WORKERS,
+        max_pending: int = DEFAULT_MAX_PENDING,
+        results_dir: Path = JOBS_DIR,
+    ):
+        self.max_pending = max_pending
+        self.results_dir = Path(results_dir)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._by_hash: Dict[str, str] = {}
+        self._active = 0
+        self._lock = threading.Lock()
+
+    def _result_path(self, content_hash: str) -> Path:
+        return self.results_dir / f"{content_hash}.json"
+
+    def _status_path(self, job_id: str) -> Path:
+        return self.results_dir / "status" / f"{job_id}.json"
+
+    def _new_job(self, content_hash: str) -> Job:
+        job_id = uuid.uuid4().hex[:12]
+        return Job(job_id, content_hash, self._status_path(job_id))
+
+    def _load_result(self, content_hash: str) -> Optional[Dict[str, Any]]:
+        path = self._result_path(content_hash)
+        if not path.exists():
+            return None
+        with open(path, 'r') as f:
+            return json.load(f)
+
+    def _save_result(self, content_hash: str, result: Dict[str, Any]) -> None:
+        try:
+            self.results_dir.mkdir(parents=True, exist_ok=True)
+            with open(self._result_path(content_hash), 'w') as f:
+                json.dump(result, f)
+        except OSError as e:
+            logger.warning(f"Could not persist job result for {content_hash}: {e}")
+
+    def _add(self, job: Job) -> None:
+        self._jobs[job.id] = job
+        self._by_hash[job.content_hash] = job.id
+        # forget the oldest finished jobs; their results stay on disk
+        finished = [job_id for job_id, other in self._jobs.items() if other.finished]
+        for job_id in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            old = self._jobs.pop(job_id)
+            if self._by_hash.get(old.content_hash) == job_id:
+                del self._by_hash[old.content_hash]
+            self._status_path(job_id).unlink(missing_ok=True)
+
+    def _find(self, content_hash: str) -> Optional[Job]:
+        job_id = self._by_hash.get(content_hash)
+        if job_id is not None and self._jobs[job_id].status != FAILED:
+            return self._jobs[job_id]
+
+        result = self._load_result(content_hash)
+        if result is None:
+            return None
+        job = self._new_job(content_hash)
+        job.status, job.result, job.stage = SUCCEEDED, result, "done"
+        job.started_at = job.finished_at = job.created_at
+        self._add(job)
+        job.save()
+        return job
+
+    def find(self, content_hash: str) -> Optional[Job]:
+        """Existing queued, running or successful job for the same content."""
+        with self._lock:
+            return self._find(content_hash)
+
+    def _check_capacity(self) -> None:
+        if self._active >= self.max_pending:
+            raise QueueFullError(f"{self._active} jobs are already queued or running")
+
+    def check_capacity(self) -> None:
+        """Raise QueueFullError if a new job would be rejected, e.g. before accepting an upload."""
+        with self._lock:
+            self._check_capacity()
+
+    def submit(self, content_hash: str, func: Callable[[Job], Dict[str, Any]]) -> Tuple[Job, bool]:
+        """Queue func(job) unless the same content is already known; returns (job, created)."""
+        with self._lock:
+            existing = self._find(content_hash)
+            if existing is not None:
+                return existing, False
+            self._check_capacity()
+            job = self._new_job(content_hash)
+            self._add(job)
+            self._active += 1
+        job.save()
+
+        self._executor.submit(self._run, job, func)
+        return job, True
+
+    def _run(self, job: Job, func: Callable[[Job], Dict[str, Any]]) -> None:
+        job.status, job.started_at = RUNNING, time.time()
+        job.save()
+        try:
+            job.result = func(job)
+            job.status = SUCCEEDED
+            self._save_result(job.content_hash, job.result)
+        except Exception as e:
+            logger.error(f"Job {job.id} failed: {e}")
+            job.error, job.status = str(e), FAILED
+        finally:
+            job.finished_at = time.time()
+            job.set_stage("done" if job.status == SUCCEEDED else "failed")
+            with self._lock:
+                self._active -= 1
+
+    def get(self, job_id: str) -> Job:
+        """Job of this process, or the last saved status of one run by another worker process."""
+        with self._lock:
+            if job_id in self._jobs:
+                return self._jobs[job_id]
+        status_path = self._status_path(job_id)
+        # job IDs are hex, so a request can't name a path outside the status directory
+        if not job_id.isalnum() or not status_path.exists():
+            raise KeyError(f"Unknown job {job_id}")
+        with open(status_path, 'r') as f:
+            return Job.from_dict(json.load(f))
+
+
+_job_queue: Optional[JobQueue] = None
+_lock = threading.Lock()
+
+
+def get_job_queue() -> JobQueue:
+    """Process-wide job queue; JOB_WORKERS and JOB_MAX_PENDING bound its concurrency and backlog."""
+    global _job_queue
+    with _lock:
+        if _job_queue is None:
+            _job_queue = JobQueue(
+                max_workers=int(os.getenv("JOB_WORKERS", DEFAULT_WORKERS)),
+                max_pending=int(os.getenv("JOB_MAX_PENDING", DEFAULT_MAX_PENDING)),
+            )
+        return _job_queue
@@ -0,0 +1,161 @@
+import asyncio
+import json
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import dotenv
+from langchain_core.callbacks import adispatch_custom_event
+from openai import AsyncOpenAI, OpenAI
+
+from .llm_stub import AsyncStubOpenAI, StubOpenAI
+from .metrics import record_llm_usage, span
+
+dotenv.load_dotenv()
+
+# LLM_PROVIDER -> (sync client class, async client class); every provider
+# implements the OpenAI client interface the nodes call
+PROVIDERS: Dict[str, Tuple[Callable[[], Any], Callable[[], Any]]] = {
+    "openai": (OpenAI, AsyncOpenAI),
+    "stub": (StubOpenAI, AsyncStubOpenAI),
+}
+
+_openai_client: Optional[OpenAI] = None
+_async_openai_client: Optional[AsyncOpenAI] = None
+_lock = threading.Lock()
+
+
+def get_llm_provider() -> Tuple[Callable[[], Any], Callable[[], Any]]:
+    """Client classes of the LLM_PROVIDER environment variable (default openai)."""
+    name = os.getenv("LLM_PROVIDER", "openai")
+    if name not in PROVIDERS:
+        raise ValueError(f"Unknown LLM_PROVIDER {name!r}; expected one of {', '.join(PROVIDERS)}")
+    return PROVIDERS[name]
+
+
+def get_openai_client() -> OpenAI:
+    """Process-wide OpenAI client, so its HTTP connection pool is reused across requests."""
+    global _openai_client
+    with _lock:
+        if _openai_client is None:
+            _openai_client = get_llm_provider()[0]()
+        return _openai_client
+
+
+def get_async_openai_client() -> AsyncOpenAI:
+    """Process-wide AsyncOpenAI client for the async graph path."""
+    global _async_openai_client
+    with _lock:
+        if _async_openai_client is None:
+            _async_openai_client = get_llm_provider()[1]()
+        return _async_openai_client
+
+
+async def astream_chat_completion(node: str, messages: List[Dict[str, str]], **kwargs: Any) -> str:
+    """Stream a chat completion, emitting each token as a graph "token" event.
+
+    Must be called from inside a graph node so the event reaches astream_events.
+    """
+    client = get_async_openai_client()
+    start = time.perf_counter()
+    with span("llm", "chat_stream", node=node, model=kwargs.get("model")) as attributes:
+        # the final chunk carries token usage and no choices
+        stream = await client.chat.completions.create(
+            messages=messages, stream=True, stream_options={"include_usage": True}, **kwargs
+        )
+
+        tokens = []
+        async for chunk in stream:
+            if chunk.usage is not None:
+                record_llm_usage(attributes, kwargs.get("model"), chunk.usage)
+            if not chunk.choices:
+                continue
+            token = chunk.choices[0].delta.content
+            if token:
+                if not tokens:
+                    attributes["first_token_ms"] = round((time.perf_counter() - start) * 1000, 3)
+                tokens.append(token)
+                await adispatch_custom_event("token", {"node": node, "token": token})
+        return "".join(tokens)
+
+
+MAX_TOOL_ROUNDS = 6
+
+
+def _tool_span_name(tools: List[Dict[str, Any]], name: str) -> str:
+    """Span name of a requested tool call; names come from the model, so ones not in tools share "unknown"."""
+    return name if any(tool["function"]["name"] == name for tool in tools) else "unknown"
+
+
+def _tool_call_message(message: Any) -> Dict[str, Any]:
+    return {
+        "role": "assistant",
+        "content": message.content,
+        "tool_calls": [
+            {"id": call.id, "type": "function",
+             "function": {"name": call.function.name, "arguments": call.function.arguments}}
+            for call in message.tool_calls
+        ],
+    }
+
+
+def complete(client: OpenAI, messages: List[Dict[str, Any]], **kwargs: Any) -> Any:
+    """One traced chat completion; the span records latency and token usage."""
+    with span("llm", "chat", model=kwargs.get("model"), tools=bool(kwargs.get("tools"))) as attributes:
+        response = client.chat.completions.create(messages=messages, **kwargs)
+        record_llm_usage(attributes, kwargs.get("model"), response.usage)
+        return response
+
+
+async def acomplete(client: AsyncOpenAI, messages: List[Dict[str, Any]], **kwargs: Any) -> Any:
+    """Async complete()."""
+    with span("llm", "chat", model=kwargs.get("model"), tools=bool(kwargs.get("tools"))) as attributes:
+        response = await client.chat.completions.create(messages=messages, **kwargs)
+        record_llm_usage(attributes, kwargs.get("model"), response.usage)
+        return response
+
+
+def complete_with_tools(
+    messages: List[Dict[str, Any]],
+    tools: List[Dict[str, Any]],
+    call_tool: Callable[[str, str], Dict[str, Any]],
+    **kwargs: Any,
+) -> str:
+    """Run a chat completion, executing requested tool calls until the model answers."""
+    client = get_openai_client()
+    messages = list(messages)
+    for _ in range(MAX_TOOL_ROUNDS):
+        message = complete(client, messages, tools=tools, **kwargs).choices[0].message
+        if not message.tool_calls:
+            return message.content or ""
+        messages.append(_tool_call_message(message))
+        for call in message.tool_calls:
+            with span("tool", _tool_span_name(tools, call.function.name)):
+                result = call_tool(call.function.name, call.function.arguments)
+            messages.append({"role": "tool", "tool_call_id": call.id, "content": json.dumps(result, default=str)})
+    # out of rounds: ask for an answer from what the tools returned so far
+    return complete(client, messages, **kwargs).choices[0].message.content or ""
+
+
+async def acomplete_with_tools(
+    messages: List[Dict[str, Any]],
+    tools: List[Dict[str, Any]],
+    call_tool: Callable[[str, str], Dict[str, Any]],
+    **kwargs: Any,
+) -> str:
+    """Async complete_with_tools; tools run in a worker thread since they read memory-mapped columns."""
+    client = get_async_openai_client()
+    messages = list(messages)
+    for _ in range(MAX_TOOL_ROUNDS):
+        response = await acomplete(client, messages, tools=tools, **kwargs)
+        message = response.choices[0].message
+        if not message.tool_calls:
+            return message.content or ""
+        messages.append(_tool_call_message(message))
+        for call in message.tool_calls:
+            with span("tool", _tool_span_name(tools, call.function.name)):
+                result = await asyncio.to_thread(call_tool, call.function.name, call.function.arguments)
+            messages.append({"role": "tool", "tool_call_id": call.id, "content": json.dumps(result, default=str)})
+    response = await acomplete(client, messages, **kwargs)
+    return response.choices[0].message.content or ""
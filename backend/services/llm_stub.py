@@ -0,0 +1,210 @@
+import asyncio
+import hashlib
+import json
+import os
+import time
+from types import SimpleNamespace
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import numpy as np
+
+# words the stub draws its completions from
+VOCABULARY = (
+    "roll pitch yaw altitude throttle gps ekf variance attitude error peak mean flight log "
+    "sample interval segment climb descent hover heading speed vibration estimate"
+).split()
+EMBEDDING_DIMENSIONS = 256
+CHARS_PER_TOKEN = 4
+
+
+class StubConfig:
+    """Latency and output size of the stub, from LLM_STUB_* environment variables."""
+
+    def __init__(
+        self,
+        latency_ms: Optional[float] = None,
+        token_latency_ms: Optional[float] = None,
+        completion_tokens: Optional[int] = None,
+        answerable_ratio: Optional[float] = None,
+    ):
+        # time to the first token, then the time per further token
+        self.latency_ms = latency_ms if latency_ms is not None else float(os.getenv("LLM_STUB_LATENCY_MS", 200))
+        self.token_latency_ms = (token_latency_ms if token_latency_ms is not None
+                                 else float(os.getenv("LLM_STUB_TOKEN_LATENCY_MS", 10)))
+        self.completion_tokens = (completion_tokens if completion_tokens is not None
+                                  else int(os.getenv("LLM_STUB_TOKENS", 60)))
+        # fraction of questions a boolean (validation) prompt answers "true" for
+        self.answerable_ratio = (answerable_ratio if answerable_ratio is not None
+                                 else float(os.getenv("LLM_STUB_ANSWERABLE_RATIO", 0.8)))
+
+    def total_seconds(self, tokens: int) -> float:
+        return (self.latency_ms + self.token_latency_ms * max(tokens - 1, 0)) / 1000.0
+
+
+def _digest(payload: Any) -> bytes:
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode("utf-8")).digest()
+
+
+def _count_tokens(payload: Any) -> int:
+    return max(1, len(json.dumps(payload, default=str)) // CHARS_PER_TOKEN)
+
+
+def _wants_boolean(messages: List[Dict[str, Any]]) -> bool:
+    return any(message.get("role") == "system" and "boolean" in str(message.get("content", "")).lower()
+               for message in messages)
+
+
+def _tool_call(messages: List[Dict[str, Any]], tools: Optional[List[Dict[str, Any]]]) -> Optional[Dict[str, Any]]:
+    """The first round of a tool conversation calls the first tool that needs no arguments."""
+    if not tools or any(message.get("role") == "tool" for message in messages):
+        return None
+    for tool in tools:
+        function = tool["function"]
+        if not function.get("parameters", {}).get("required"):
+            return {"id": "call_stub_0", "name": function["name"], "arguments": "{}"}
+    return None
+
+
+def stub_reply(config: StubConfig, messages: List[Dict[str, Any]], tools: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+    """The deterministic reply to a chat request: text tokens or a tool call, and token usage."""
+    digest = _digest(messages)
+    prompt_tokens = _count_tokens(messages) + (_count_tokens(tools) if tools else 0)
+
+    tool_call = _tool_call(messages, tools)
+    if tool_call is not None:
+        return {"tokens": [], "tool_call": tool_call, "prompt_tokens": prompt_tokens, "completion_tokens": 8}
+
+    if _wants_boolean(messages):
+        answer = "true" if digest[0] / 256.0 < config.answerable_ratio else "false"
+        tokens = [answer]
+    else:
+        rng = np.random.default_rng(int.from_bytes(digest[:8], "little"))
+        words = rng.choice(VOCABULARY, size=max(config.completion_tokens, 1))
+        tokens = [words[0]] + [f" {word}" for word in words[1:]]
+    return {"tokens": tokens, "tool_call": None, "prompt_tokens": prompt_tokens, "completion_tokens": len(tokens)}
+
+
+def _usage(reply: Dict[str, Any]) -> SimpleNamespace:
+    return SimpleNamespace(
+        prompt_tokens=reply["prompt_tokens"],
+        completion_tokens=reply["completion_tokens"],
+        total_tokens=reply["prompt_tokens"] + reply["completion_tokens"],
+    )
+
+
+def _completion(reply: Dict[str, Any], model: Optional[str]) -> SimpleNamespace:
+    tool_calls = None
+    if reply["tool_call"] is not None:
+        call = reply["tool_call"]
+        tool_calls = [SimpleNamespace(id=call["id"], type="function",
+                                      function=SimpleNamespace(name=call["name"], arguments=call["arguments"]))]
+    message = SimpleNamespace(role="assistant", content="".join(reply["tokens"]) or None, tool_calls=tool_calls)
+    return SimpleNamespace(
+        model=model,
+        choices=[SimpleNamespace(index=0, message=message, finish_reason="tool_calls" if tool_calls else "stop")],
+        usage=_usage(reply),
+    )
+
+
+def _chunk(token: Optional[str] = None, usage: Optional[SimpleNamespace] = None) -> SimpleNamespace:
+    choices = [] if token is None else [SimpleNamespace(index=0, delta=SimpleNamespace(content=token))]
+    return SimpleNamespace(choices=choices, usage=usage)
+
+
+def _embedding(text: Any) -> List[float]:
+    rng = np.random.default_rng(int.from_bytes(_digest(text)[:8], "little"))
+    vector = rng.normal(size=EMBEDDING_DIMENSIONS)
+    return (vector / np.linalg.norm(vector)).tolist()
+
+
+def _embeddings(input: Any) -> SimpleNamespace:
+    texts = input if isinstance(input, list) else [input]
+    return SimpleNamespace(data=[SimpleNamespace(index=i, embedding=_embedding(text)) for i, text in enumerate(texts)])
+
+
+def _responses_messages(instructions: Optional[str], input: Any) -> List[Dict[str, Any]]:
+    messages = [{"role": "system", "content": instructions}] if instructions else []
+    return messages + (input if isinstance(input, list) else [{"role": "user", "content": input}])
+
+
+class _Completions:
+    def __init__(self, config: StubConfig):
+        self.config = config
+
+    def create(self, messages: List[Dict[str, Any]], model: Optional[str] = None, stream: bool = False,
+               tools: Optional[List[Dict[str, Any]]] = None, **kwargs: Any) -> Any:
+        reply = stub_reply(self.config, messages, tools)
+        if stream:
+            return self._stream(reply)
+        time.sleep(self.config.total_seconds(len(reply["tokens"])))
+        return _completion(reply, model)
+
+    def _stream(self, reply: Dict[str, Any]):
+        for i, token in enumerate(reply["tokens"]):
+            time.sleep((self.config.latency_ms if i == 0 else self.config.token_latency_ms) / 1000.0)
+            yield _chunk(token)
+        yield _chunk(usage=_usage(reply))
+
+
+class _AsyncCompletions:
+    def __init__(self, config: StubConfig):
+        self.config = config
+
+    async def create(self, messages: List[Dict[str, Any]], model: Optional[str] = None, stream: bool = False,
+                     tools: Optional[List[Dict[str, Any]]] = None, **kwargs: Any) -> Any:
+        reply = stub_reply(self.config, messages, tools)
+        if stream:
+            return self._stream(reply)
+        await asyncio.sleep(self.config.total_seconds(len(reply["tokens"])))
+        return _completion(reply, model)
+
+    async def _stream(self, reply: Dict[str, Any]) -> AsyncIterator[SimpleNamespace]:
+        for i, token in enumerate(reply["tokens"]):
+            await asyncio.sleep((self.config.latency_ms if i == 0 else self.config.token_latency_ms) / 1000.0)
+            yield _chunk(token)
+        yield _chunk(usage=_usage(reply))
+
+
+class _Embeddings:
+    def create(self, input: Any, model: Optional[str] = None, **kwargs: Any) -> SimpleNamespace:
+        return _embeddings(input)
+
+
+class _AsyncEmbeddings:
+    async def create(self, input: Any, model: Optional[str] = None, **kwargs: Any) -> SimpleNamespace:
+        return _embeddings(input)
+
+
+class _Responses:
+    def __init__(self, config: StubConfig):
+        self.config = config
+
+    def create(self, input: Any, model: Optional[str] = None, instructions: Optional[str] = None,
+               **kwargs: Any) -> SimpleNamespace:
+        reply = stub_reply(self.config, _responses_messages(instructions, input))
+        time.sleep(self.config.total_seconds(len(reply["tokens"])))
+        return SimpleNamespace(model=model, output_text="".join(reply["tokens"]), usage=_usage(reply))
+
+
+class StubOpenAI:
+    """Offline stand-in for the OpenAI client (chat completions, embeddings, responses).
+
+    Replies are a deterministic function of the request, so repeated load
+    tests see the same routing and token counts; latency is simulated with
+    sleeps sized by StubConfig.
+    """
+
+    def __init__(self, config: Optional[StubConfig] = None):
+        self.config = config or StubConfig()
+        self.chat = SimpleNamespace(completions=_Completions(self.config))
+        self.embeddings = _Embeddings()
+        self.responses = _Responses(self.config)
+
+
+class AsyncStubOpenAI:
+    """Async StubOpenAI, for the AsyncOpenAI call sites."""
+
+    def __init__(self, config: Optional[StubConfig] = None):
+        self.config = config or StubConfig()
+        self.chat = SimpleNamespace(completions=_AsyncCompletions(self.config))
+        self.embeddings = _AsyncEmbeddings()
@@ -0,0 +1,261 @@
+import functools
+import inspect
+import logging
+import math
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# seconds; chat requests are dominated by multi-second LLM calls, ingest stages by sub-second numpy work
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+LabelValues = Tuple[str, ...]
+# (kind, name, status, duration in seconds) of a span finished in a worker process
+SpanRecord = Tuple[str, str, str, float]
+
+
+def _format_labels(names: Tuple[str, ...], values: LabelValues, extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf"
+    return repr(float(value))
+
+
+class Counter:
+    """A monotonically increasing count per label set."""
+
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = labelnames
+        self._values: Dict[LabelValues, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    """Cumulative-bucket latency histogram per label set, in the Prometheus text format."""
+
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        labelnames: Tuple[str, ...] = (),
+        buckets: Tuple[float, ...] = DEFAULT_BUCKETS,
+    ):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = labelnames
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        # label values -> (per-bucket counts, sum, count)
+        self._series: Dict[LabelValues, Tuple[List[int], float, int]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            counts, total, count = self._series.get(key, ([0] * len(self.buckets), 0.0, 0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            self._series[key] = (counts, total + value, count + 1)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    le = _format_labels(self.labelnames, key, f'le="{_format_value(bound)}"')
+                    lines.append(f"{self.name}_bucket{le} {cumulative}")
+                labels = _format_labels(self.labelnames, key)
+                lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+                lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """The metrics exposed at /api/metrics."""
+
+    def __init__(self):
+        self._metrics: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric: Any) -> Any:
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, help_text: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+        return self._register(Counter(name, help_text, labelnames))
+
+    def histogram(self, name: str, help_text: str, labelnames: Tuple[str, ...] = (),
+                  buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help_text, labelnames, buckets))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "\n".join(line for metric in metrics for line in metric.render()) + "\n"
+
+
+_registry = MetricsRegistry()
+
+
+def get_metrics_registry() -> MetricsRegistry:
+    return _registry
+
+
+SPAN_SECONDS = _registry.histogram(
+    "flight_span_duration_seconds", "Duration of traced spans: graph nodes, ingest stages and LLM calls.",
+    ("kind", "name", "status"))
+LLM_TOKENS = _registry.counter(
+    "flight_llm_tokens_total", "Tokens reported by the LLM API, by model and prompt/completion.", ("model", "type"))
+HTTP_SECONDS = _registry.histogram(
+    "flight_http_request_duration_seconds", "HTTP request latency until the response headers are sent.",
+    ("method", "endpoint", "status"))
+
+# per-request trace: trace ID, the innermost open span and the finished spans for Server-Timing
+_trace_id: ContextVar[Optional[str]] = ContextVar("trace_id", default=None)
+_current_span: ContextVar[Optional[str]] = ContextVar("current_span", default=None)
+_request_spans: ContextVar[Optional[List[Tuple[str, float]]]] = ContextVar("request_spans", default=None)
+# set in worker processes, whose spans are sent back to the parent with the task result
+_worker_spans: ContextVar[Optional[List[SpanRecord]]] = ContextVar("worker_spans", default=None)
+
+
+def start_trace() -> List[Tuple[str, float]]:
+    """Begin a request trace; returns the list its finished spans are collected into."""
+    spans: List[Tuple[str, float]] = []
+    _trace_id.set(uuid.uuid4().hex[:16])
+    _request_spans.set(spans)
+    return spans
+
+
+@contextmanager
+def span(kind: str, name: str, **attributes: Any) -> Iterator[Dict[str, Any]]:
+    """Time a block as a trace span; yields its attribute dict so callers can add results such as token counts.
+
+    Each finished span is observed in flight_span_duration_seconds and logged
+    as a structured record (extra={"span": ...}) with its trace and parent IDs.
+    """
+    span_id = uuid.uuid4().hex[:8]
+    parent_id = _current_span.get()
+    token = _current_span.set(span_id)
+    status = "ok"
+    start = time.perf_counter()
+    try:
+        yield attributes
+    except BaseException:
+        status = "error"
+        raise
+    finally:
+        duration = time.perf_counter() - start
+        _current_span.reset(token)
+        _record_span(kind, name, status, duration)
+        worker_spans = _worker_spans.get()
+        if worker_spans is not None:
+            worker_spans.append((kind, name, status, duration))
+        record = {
+            "trace_id": _trace_id.get(), "span_id": span_id, "parent_id": parent_id,
+            "kind": kind, "name": name, "status": status, "duration_ms": round(duration * 1000, 3),
+            **attributes,
+        }
+        logger.info(f"span {kind}.{name} {record['duration_ms']}ms {status}", extra={"span": record})
+
+
+def _record_span(kind: str, name: str, status: str, duration: float) -> None:
+    SPAN_SECONDS.observe(duration, kind=kind, name=name, status=status)
+    spans = _request_spans.get()
+    if spans is not None:
+        spans.append((f"{kind}.{name}", duration))
+
+
+def trace_context() -> Tuple[Optional[str], Optional[str]]:
+    """(trace ID, innermost span ID) of the caller, to continue its trace in a worker process."""
+    return _trace_id.get(), _current_span.get()
+
+
+def run_traced(trace: Tuple[Optional[str], Optional[str]], func: Callable[[Any], Any], item: Any) -> Tuple[Any, List[SpanRecord]]:
+    """Run func(item) in a worker process as part of trace; returns the result and the spans it finished.
+
+    Metrics observed in a worker process stay there, so the parent passes
+    the records to record_worker_spans().
+    """
+    finished: List[SpanRecord] = []
+    tokens = [(_trace_id, _trace_id.set(trace[0])), (_current_span, _current_span.set(trace[1])),
+              (_request_spans, _request_spans.set(None)), (_worker_spans, _worker_spans.set(finished))]
+    try:
+        return func(item), finished
+    finally:
+        for var, token in reversed(tokens):
+            var.reset(token)
+
+
+def record_worker_spans(records: List[SpanRecord]) -> None:
+    """Observe spans returned by run_traced() as if they had finished in this process and request."""
+    for kind, name, status, duration in records:
+        _record_span(kind, name, status, duration)
+
+
+def traced(kind: str, name: str) -> Callable[[Callable], Callable]:
+    """Decorator form of span() for sync and async functions."""
+    def decorate(func: Callable) -> Callable:
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args: Any, **kwargs: Any) -> Any:
+                with span(kind, name):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            with span(kind, name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def record_llm_usage(attributes: Dict[str, Any], model: Optional[str], usage: Any) -> None:
+    """Add an OpenAI usage object's token counts to a span and the token counter."""
+    if usage is None:
+        return
+    model = model or "unknown"
+    prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+    completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+    attributes["prompt_tokens"] = attributes.get("prompt_tokens", 0) + prompt_tokens
+    attributes["completion_tokens"] = attributes.get("completion_tokens", 0) + completion_tokens
+    LLM_TOKENS.inc(prompt_tokens, model=model, type="prompt")
+    LLM_TOKENS.inc(completion_tokens, model=model, type="completion")
+
+
+def server_timing(spans: List[Tuple[str, float]], total: float) -> str:
+    """Server-Timing header value: the request total, then the time spent per span name."""
+    durations: Dict[str, float] = {}
+    for name, duration in spans:
+        durations[name] = durations.get(name, 0.0) + duration
+    entries = [f"total;dur={total * 1000:.1f}"]
+    entries += [f"{name.replace(' ', '_')};dur={duration * 1000:.1f}" for name, duration in durations.items()]
+    return ", ".join(entries)
@@ -0,0 +1,78 @@
+import contextvars
+import logging
+import os
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple, TypeVar
+
+from .metrics import SpanRecord, record_worker_spans, run_traced, trace_context
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+EXECUTOR_KINDS = ("thread", "process")
+# per-message-type ingest work; 1 keeps the old sequential behaviour
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", min(4, os.cpu_count() or 1)))
+INGEST_EXECUTOR = os.getenv("INGEST_EXECUTOR", "thread")
+
+_executors: Dict[str, Executor] = {}
+_lock = threading.Lock()
+
+
+def get_executor(kind: str = INGEST_EXECUTOR, workers: int = INGEST_WORKERS) -> Executor:
+    """Process-wide pool of the given kind, created on first use and reused across requests."""
+    if kind not in EXECUTOR_KINDS:
+        raise ValueError(f"Unknown executor kind {kind!r}; expected one of {', '.join(EXECUTOR_KINDS)}")
+    with _lock:
+        if kind not in _executors:
+            logger.info(f"Starting {kind} pool with {workers} workers")
+            if kind == "process":
+                _executors[kind] = ProcessPoolExecutor(max_workers=workers)
+            else:
+                _executors[kind] = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ingest")
+        return _executors[kind]
+
+
+def parallel_imap(
+    func: Callable[[T], R],
+    items: Iterable[T],
+    kind: Optional[str] = None,
+    workers: int = INGEST_WORKERS,
+) -> Iterator[R]:
+    """Lazy map() over a worker pool, yielding results in input order as they become available.
+
+    With a process pool, func and items must be picklable, so pass keys
+    (flight ID, message type) and let workers memory-map the columns
+    rather than shipping arrays. Spans opened by func belong to the
+    caller's trace either way: thread workers run in a copy of the caller's
+    context, and process workers send their spans back with each result.
+    """
+    items = list(items)
+    if workers <= 1 or len(items) <= 1:
+        return (func(item) for item in items)
+    kind = kind or INGEST_EXECUTOR
+    executor = get_executor(kind, workers)
+    if kind == "process":
+        trace = trace_context()
+        return _with_worker_spans(executor.map(run_traced, [trace] * len(items), [func] * len(items), items))
+    # a context can only be entered by one thread at a time, so each item gets its own copy
+    contexts = [contextvars.copy_context() for _ in items]
+    return executor.map(lambda context, item: context.run(func, item), contexts, items)
+
+
+def _with_worker_spans(results: Iterator[Tuple[R, List[SpanRecord]]]) -> Iterator[R]:
+    for result, spans in results:
+        record_worker_spans(spans)
+        yield result
+
+
+def parallel_map(
+    func: Callable[[T], R],
+    items: Iterable[T],
+    kind: Optional[str] = None,
+    workers: int = INGEST_WORKERS,
+) -> List[R]:
+    """map() over a worker pool, results in input order."""
+    return list(parallel_imap(func, items, kind, workers))
@@ -0,0 +1,161 @@
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, List, Optional, Tuple
+
+import numpy as np
+
+from .llm_clients import get_openai_client
+
+logger = logging.getLogger(__name__)
+
+# (flight ID, flight revision, conversation context, normalized query, prompt version)
+CacheKey = Tuple[Optional[str], int, str, str, str]
+
+DEFAULT_MAX_ENTRIES = 1024
+DEFAULT_TTL_SECONDS = 60 * 60
+DEFAULT_SIMILARITY_THRESHOLD = 0.95
+
+
+def normalize_query(query: str) -> str:
+    """Lowercase, drop punctuation and collapse whitespace."""
+    return " ".join(re.sub(r"[^\w\s]", " ", query.lower()).split())
+
+
+def openai_embedding(text: str) -> np.ndarray:
+    """Embed text with the shared OpenAI client."""
+    response = get_openai_client().embeddings.create(model="text-embedding-3-small", input=text)
+    return np.asarray(response.data[0].embedding, dtype=np.float32)
+
+
+class ResponseCache:
+    """LRU + TTL cache of LLM results keyed by (flight ID, revision, context, normalized query, prompt version).
+
+    The revision is the flight session's, so answers about a flight are not
+    reused once samples are appended to it. Prompts that include the
+    conversation pass a hash of it as the context, so the same question only
+    hits with the same history before it. If embed_fn is given, a miss on the
+    exact key falls back to the most similar cached query with the same other
+    key parts.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        ttl_seconds: float = DEFAULT_TTL_SECONDS,
+        embed_fn: Optional[Callable[[str], np.ndarray]] = None,
+        similarity_threshold: float = DEFAULT_SIMILARITY_THRESHOLD,
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.embed_fn = embed_fn
+        self.similarity_threshold = similarity_threshold
+        # key -> (expires_at, value, unit embedding or None)
+        self._entries: "OrderedDict[CacheKey, Tuple[float, Any, Optional[np.ndarray]]]" = OrderedDict()
+        # the last few query embeddings, so a miss followed by set embeds once
+        self._embedding_memo: "OrderedDict[str, Optional[np.ndarray]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(flight_id: Optional[str], query: str, prompt_version: str, revision: int = 0,
+                 context: str = "") -> CacheKey:
+        return (flight_id, revision, context, normalize_query(query), prompt_version)
+
+    def _embed(self, normalized_query: str) -> Optional[np.ndarray]:
+        if self.embed_fn is None:
+            return None
+        with self._lock:
+            if normalized_query in self._embedding_memo:
+                return self._embedding_memo[normalized_query]
+        try:
+            embedding = np.asarray(self.embed_fn(normalized_query), dtype=np.float32)
+        except Exception as e:
+            logger.error(f"Error embedding query for response cache: {e}")
+            return None
+        norm = np.linalg.norm(embedding)
+        embedding = embedding / norm if norm > 0 else None
+        with self._lock:
+            self._embedding_memo[normalized_query] = embedding
+            while len(self._embedding_memo) > 64:
+                self._embedding_memo.popitem(last=False)
+        return embedding
+
+    def _evict_expired(self, now: float) -> None:
+        expired = [key for key, (expires_at, _, _) in self._entries.items() if expires_at <= now]
+        for key in expired:
+            del self._entries[key]
+
+    def _similar_key(self, key: CacheKey, embedding: np.ndarray) -> Optional[CacheKey]:
+        candidates: List[CacheKey] = []
+        vectors = []
+        for other_key, (_, _, other_embedding) in self._entries.items():
+            if other_embedding is not None and other_key[:3] + other_key[4:] == key[:3] + key[4:]:
+                candidates.append(other_key)
+                vectors.append(other_embedding)
+        if not candidates:
+            return None
+        similarities = np.stack(vectors) @ embedding
+        best = int(np.argmax(similarities))
+        return candidates[best] if similarities[best] >= self.similarity_threshold else None
+
+    def get(self, flight_id: Optional[str], query: str, prompt_version: str, revision: int = 0,
+            context: str = "") -> Optional[Any]:
+        """Return the cached value, or None on a miss."""
+        key = self.make_key(flight_id, query, prompt_version, revision, context)
+        now = time.monotonic()
+        with self._lock:
+            self._evict_expired(now)
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key][1]
+
+        embedding = self._embed(key[3])
+        if embedding is not None:
+            with self._lock:
+                similar_key = self._similar_key(key, embedding)
+                if similar_key is not None:
+                    self._entries.move_to_end(similar_key)
+                    self.hits += 1
+                    return self._entries[similar_key][1]
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, flight_id: Optional[str], query: str, prompt_version: str, value: Any, revision: int = 0,
+            context: str = "") -> None:
+        key = self.make_key(flight_id, query, prompt_version, revision, context)
+        embedding = self._embed(key[3])
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value, embedding)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+_response_cache: Optional[ResponseCache] = None
+_lock = threading.Lock()
+
+
+def get_response_cache() -> ResponseCache:
+    """Process-wide response cache; RESPONSE_CACHE_EMBEDDINGS=1 enables similarity lookup."""
+    global _response_cache
+    with _lock:
+        if _response_cache is None:
+            use_embeddings = os.getenv("RESPONSE_CACHE_EMBEDDINGS", "0") == "1"
+            _response_cache = ResponseCache(
+                max_entries=int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", DEFAULT_MAX_ENTRIES)),
+                ttl_seconds=float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", DEFAULT_TTL_SECONDS)),
+                embed_fn=openai_embedding if use_embeddings else None,
+            )
+        return _response_cache
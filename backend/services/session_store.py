@@ -0,0 +1,522 @@
+import copy
+import hashlib
+import json
+import logging
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .column_export import (
+    MANIFEST_NAME,
+    append_message_columns,
+    export_message_columns,
+    load_message_columns,
+    message_file_name,
+)
+from .data_processor import MessageColumns, TIME_FIELD
+from .parallel import parallel_map
+from .summary_pyramid import PYRAMID_FILE, SummaryPyramid, build_pyramid, extend_pyramid, load_pyramid, save_pyramid
+from ..utils.stats_calculator import StatsAccumulator
+
+logger = logging.getLogger(__name__)
+
+SESSIONS_DIR = Path("flight_data_exports") / "sessions"
+SESSION_FILE = "session.json"
+METADATA_FILE = "metadata.json"
+STATS_FILE = "stats.npz"
+# prefix hash -> flight IDs, so re-uploads are matched without reading every session
+PREFIX_INDEX_FILE = "prefix_index.json"
+# leading samples hashed per message type to recognise a re-upload of the same log
+PREFIX_SAMPLES = 16
+# samples compared when checking that an upload repeats the stored prefix
+OVERLAP_CHECKS = 64
+
+
+class AppendConflictError(ValueError):
+    """An upload for an existing flight that doesn't extend what is stored."""
+
+
+def prefix_hash(msg_data: MessageColumns) -> str:
+    """Hash of the first samples of every exported column, identifying the log a message type came from."""
+    digest = hashlib.sha1()
+    for field_name in sorted(msg_data.columns):
+        column = msg_data[field_name]
+        if column.dtype.kind != "O":
+            digest.update(field_name.encode("utf-8"))
+            digest.update(np.ascontiguousarray(column[:PREFIX_SAMPLES]).tobytes())
+    return digest.hexdigest()
+
+
+def stat_fields(msg_data: MessageColumns) -> List[str]:
+    return [field_name for field_name in msg_data.numeric_fields if field_name != TIME_FIELD]
+
+
+def build_stats(msg_data: MessageColumns) -> StatsAccumulator:
+    fields = stat_fields(msg_data)
+    return StatsAccumulator.from_values(msg_data.time, msg_data.numeric_matrix(fields), fields)
+
+
+def new_samples(stored: MessageColumns, upload: MessageColumns) -> MessageColumns:
+    """The samples of upload that come after those already stored.
+
+    The upload is either just the appended samples (all later than the stored
+    ones) or the whole log again, in which case its first len(stored) samples
+    must repeat the stored ones. Only the boundary and a fixed number of
+    sampled rows are compared, so this costs O(1) rather than O(stored).
+    """
+    exported = {field_name for field_name, column in upload.columns.items() if column.dtype.kind != "O"}
+    if exported != set(stored.columns):
+        raise AppendConflictError(f"{stored.msg_type}: fields differ from the stored flight")
+    if len(upload) == 0 or upload.time[0] > stored.time[-1]:
+        return upload
+    n = len(stored)
+    if len(upload) < n:
+        raise AppendConflictError(f"{stored.msg_type}: upload has {len(upload)} samples but {n} are already stored")
+
+    rows = np.unique(np.concatenate([np.linspace(0, n - 1, OVERLAP_CHECKS).astype(np.int64), [n - 1]]))
+    for field_name, column in stored.columns.items():
+        if column.dtype.kind == "O":
+            continue
+        if not np.array_equal(np.asarray(column[rows]), np.asarray(upload[field_name][rows]), equal_nan=column.dtype.kind == "f"):
+            raise AppendConflictError(f"{stored.msg_type}: upload does not extend the stored flight ({field_name} differs)")
+    if n < len(upload) and upload.time[n] < stored.time[-1]:
+        raise AppendConflictError(f"{stored.msg_type}: upload inserts samples before the end of the stored flight")
+    return upload.slice_rows(n)
+
+
+def revision_file_name(name: str, revision: int) -> str:
+    """Name of a file rewritten by an append, e.g. pyramid.npz -> pyramid.r2.npz for revision 2."""
+    stem, suffix = name.rsplit(".", 1)
+    return f"{stem}.r{revision}.{suffix}"
+
+
+def file_stamp(path: Path) -> Tuple[int, int]:
+    """(inode, mtime) of a file; write_atomic replaces the inode, so this changes on every write."""
+    stat = os.stat(path)
+    return stat.st_ino, stat.st_mtime_ns
+
+
+def write_atomic(path: Path, save: Callable[[Path], Any]) -> None:
+    """Write through a temporary file so concurrent readers never see a partial file."""
+    # numpy appends .npz to names without it, so the suffix is kept
+    tmp_path = path.with_name(f".tmp-{path.name}")
+    save(tmp_path)
+    os.replace(tmp_path, path)
+
+
+class FlightSession:
+    """A processed flight whose columns live on disk and are memory-mapped on demand."""
+
+    def __init__(self, flight_id: str, session_dir: Path):
+        self.flight_id = flight_id
+        self.session_dir = Path(session_dir)
+        # taken before reading, so a session.json replaced in between only causes a reload
+        self.stamp = file_stamp(self.session_dir / SESSION_FILE)
+        with open(self.session_dir / SESSION_FILE, 'r') as f:
+            self.index = json.load(f)
+        self._columns: Dict[str, MessageColumns] = {}
+        self._pyramids: Dict[str, SummaryPyramid] = {}
+        self._stats: Dict[str, StatsAccumulator] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def message_types(self) -> List[str]:
+        return list(self.index["message_types"].keys())
+
+    @property
+    def created_at(self) -> str:
+        return self.index["created_at"]
+
+    @property
+    def revision(self) -> int:
+        """Number of appends to this flight; part of every derived cache key."""
+        return self.index.get("revision", 0)
+
+    def manifest_path(self, msg_type: str) -> Path:
+        if msg_type not in self.index["message_types"]:
+            raise KeyError(f"Flight {self.flight_id} has no message type {msg_type}")
+        return self.session_dir / self.index["message_types"][msg_type]["manifest"]
+
+    def get_columns(self, msg_type: str) -> MessageColumns:
+        """Memory-map all columns of a message type, cached per session."""
+        with self._lock:
+            if msg_type not in self._columns:
+                columns = load_message_columns(str(self.manifest_path(msg_type)))
+                # the column files may already hold samples of an append that isn't committed yet
+                length = self.index["message_types"][msg_type]["length"]
+                self._columns[msg_type] = columns.slice_rows(0, length) if len(columns) > length else columns
+            return self._columns[msg_type]
+
+    def _entry_path(self, msg_type: str, key: str, default_name: str) -> Path:
+        """File named in the message type's index entry, else default_name next to its manifest."""
+        manifest_path = self.manifest_path(msg_type)
+        entry = self.index["message_types"][msg_type]
+        return self.session_dir / entry[key] if key in entry else manifest_path.parent / default_name
+
+    def is_current(self) -> bool:
+        """Whether session.json is still the one this session was loaded from."""
+        try:
+            return file_stamp(self.session_dir / SESSION_FILE) == self.stamp
+        except FileNotFoundError:
+            return False
+
+    def _save_if_current(self, path: Path, save: Callable[[Path], Any]) -> None:
+        """Write a rebuilt file of this revision, unless an append has already replaced it.
+
+        The files of a superseded revision are unlinked by the append, so
+        writing one back would leave a file no index entry refers to.
+        """
+        if not self.is_current():
+            return
+        write_atomic(path, save)
+        if not self.is_current():
+            # an append committed while the file was written and has already unlinked it
+            path.unlink(missing_ok=True)
+
+    def pyramid_path(self, msg_type: str) -> Path:
+        return self._entry_path(msg_type, "pyramid", PYRAMID_FILE)
+
+    def get_pyramid(self, msg_type: str) -> SummaryPyramid:
+        """Summary pyramid of a message type, built on first use for sessions that predate it."""
+        columns = self.get_columns(msg_type)
+        with self._lock:
+            if msg_type not in self._pyramids:
+                path = self.pyramid_path(msg_type)
+                if path.exists():
+                    self._pyramids[msg_type] = SummaryPyramid.load(path, columns)
+                else:
+                    arrays = build_pyramid(columns)
+                    self._save_if_current(path, lambda tmp_path: save_pyramid(arrays, tmp_path))
+                    self._pyramids[msg_type] = SummaryPyramid(arrays, columns)
+            return self._pyramids[msg_type]
+
+    def stats_path(self, msg_type: str) -> Path:
+        return self._entry_path(msg_type, "stats", STATS_FILE)
+
+    def get_stats(self, msg_type: str) -> StatsAccumulator:
+        """Running statistics of a message type, built on first use for sessions that predate them."""
+        columns = self.get_columns(msg_type)
+        with self._lock:
+            if msg_type not in self._stats:
+                path = self.stats_path(msg_type)
+                if path.exists():
+                    self._stats[msg_type] = StatsAccumulator.load(path)
+                else:
+                    stats = build_stats(columns)
+                    self._save_if_current(path, stats.save)
+                    self._stats[msg_type] = stats
+            return self._stats[msg_type]
+
+    def range_stats(
+        self,
+        msg_type: str,
+        field_name: str,
+        start_ms: Optional[float] = None,
+        end_ms: Optional[float] = None,
+    ) -> Dict[str, Any]:
+        """Min/max/mean/count of one field between start_ms and end_ms, from the summary pyramid."""
+        return self.get_pyramid(msg_type).range_stats(field_name, start_ms, end_ms)
+
+    def time_slice(self, msg_type: str, start_ms: Optional[float] = None, end_ms: Optional[float] = None) -> slice:
+        """Binary search the time index for samples in [start_ms, end_ms]."""
+        time_column = self.get_columns(msg_type).time
+        start = 0 if start_ms is None else int(np.searchsorted(time_column, start_ms, side="left"))
+        end = len(time_column) if end_ms is None else int(np.searchsorted(time_column, end_ms, side="right"))
+        return slice(start, max(start, end))
+
+    def query(
+        self,
+        msg_type: str,
+        field_name: str,
+        start_ms: Optional[float] = None,
+        end_ms: Optional[float] = None,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Return (time, values) of one field between start_ms and end_ms."""
+        columns = self.get_columns(msg_type)
+        if field_name not in columns:
+            raise KeyError(f"{msg_type} has no field {field_name}")
+        window = self.time_slice(msg_type, start_ms, end_ms)
+        return columns.time[window], columns[field_name][window]
+
+    def write_metadata(self, metadata: Dict[str, Any]) -> str:
+        """Store the processed metadata alongside the session columns."""
+        filename = self.session_dir / METADATA_FILE
+        write_atomic(filename, lambda path: path.write_text(json.dumps(metadata, indent=2, ensure_ascii=False)))
+        return str(filename)
+
+    def read_metadata(self) -> Dict[str, Any]:
+        with open(self.session_dir / METADATA_FILE, 'r') as f:
+            return json.load(f)
+
+
+class SessionStore:
+    """File-based store of processed flights, keyed by flight ID.
+
+    Recently used sessions stay resident so several flights can be queried
+    without reloading their manifests.
+    """
+
+    def __init__(self, root: Path = SESSIONS_DIR, max_resident: int = 8):
+        self.root = Path(root)
+        self.max_resident = max_resident
+        self._resident: "OrderedDict[str, FlightSession]" = OrderedDict()
+        self._lock = threading.Lock()
+        # appends rewrite session files, so they run one at a time
+        self._append_lock = threading.Lock()
+        self._prefix_index_lock = threading.Lock()
+
+    def session_dir(self, flight_id: str) -> Path:
+        # flight IDs are hex, so one from a request can't name a path outside the store
+        if not (flight_id.isascii() and flight_id.isalnum()):
+            raise KeyError(f"Unknown flight {flight_id}")
+        return self.root / flight_id
+
+    def create_session(self, store: Dict[str, MessageColumns], flight_id: Optional[str] = None) -> FlightSession:
+        """Write a column store to disk as a new flight session."""
+        flight_id = flight_id or uuid.uuid4().hex[:12]
+        session_dir = self.session_dir(flight_id)
+        session_dir.mkdir(parents=True, exist_ok=True)
+
+        # the store is already in memory, so message types are exported on threads
+        msg_types = list(store.keys())
+        message_types = dict(zip(msg_types, parallel_map(
+            lambda msg_type: self._export(store[msg_type], session_dir), msg_types, kind="thread"
+        )))
+
+        index = {
+            "flight_id": flight_id,
+            "created_at": datetime.now().isoformat(),
+            "message_types": message_types,
+        }
+        write_atomic(session_dir / SESSION_FILE, lambda path: path.write_text(json.dumps(index, indent=2)))
+        self._index_prefixes(flight_id, message_types)
+
+        return self.get(flight_id)
+
+    @staticmethod
+    def _export(msg_data: MessageColumns, session_dir: Path) -> Dict[str, Any]:
+        """Write one message type of a new session and return its index entry."""
+        # sorted time columns are what make the searchsorted index valid
+        msg_data = msg_data.sorted_by_time()
+        export_message_columns(msg_data, session_dir)
+        # aggregates are computed once here so range statistics never rescan the columns
+        msg_dir = session_dir / message_file_name(msg_data.msg_type)
+        save_pyramid(build_pyramid(msg_data), msg_dir / PYRAMID_FILE)
+        build_stats(msg_data).save(msg_dir / STATS_FILE)
+        return {
+            "manifest": f"{message_file_name(msg_data.msg_type)}/{MANIFEST_NAME}",
+            "length": len(msg_data),
+            "start_ms": float(msg_data.time[0]),
+            "end_ms": float(msg_data.time[-1]),
+            "prefix_hash": prefix_hash(msg_data),
+        }
+
+    def append_to_session(self, flight_id: str, store: Dict[str, MessageColumns]) -> Tuple[FlightSession, Dict[str, int]]:
+        """Add the samples of store that a stored flight doesn't have yet.
+
+        store may be the whole log again or only its new samples. Existing
+        message types get their new samples appended to the column files,
+        the summary pyramid's last buckets recomputed and the running
+        statistics merged, so the work is O(new samples); message types the
+        flight doesn't have yet are exported in full. Returns the refreshed
+        session and each message type's length before the append (0 for
+        new types). Raises AppendConflictError if the upload doesn't extend
+        the flight, before anything is written.
+
+        Rewritten pyramids and statistics go to new per-revision files and
+        appended column samples past the committed length, and session.json
+        (with the bumped revision) is written last. Until then, and if the
+        append is interrupted, readers see the previous revision.
+        """
+        with self._append_lock:
+            session = self.get(flight_id)
+            index = copy.deepcopy(session.index)
+
+            # check every message type before writing anything
+            tails = {}
+            for msg_type, msg_data in store.items():
+                if msg_type in index["message_types"]:
+                    tails[msg_type] = new_samples(session.get_columns(msg_type), msg_data.sorted_by_time())
+
+            revision = session.revision + 1
+            replaced: List[Path] = []
+            previous_lengths = {}
+            for msg_type, msg_data in store.items():
+                if msg_type not in index["message_types"]:
+                    previous_lengths[msg_type] = 0
+                    index["message_types"][msg_type] = self._export(msg_data, session.session_dir)
+                    continue
+
+                entry = index["message_types"][msg_type]
+                previous_lengths[msg_type] = entry["length"]
+                tail = tails[msg_type]
+                if len(tail) == 0:
+                    continue
+                # samples past the committed length are left over from an interrupted append
+                manifest_path = str(session.manifest_path(msg_type))
+                append_message_columns(tail, manifest_path, at=entry["length"])
+                columns = load_message_columns(manifest_path)
+                msg_dir = message_file_name(msg_type)
+
+                pyramid_path = session.pyramid_path(msg_type)
+                pyramid = extend_pyramid(load_pyramid(pyramid_path), columns) if pyramid_path.exists() else build_pyramid(columns)
+                entry["pyramid"] = f"{msg_dir}/{revision_file_name(PYRAMID_FILE, revision)}"
+                write_atomic(session.session_dir / entry["pyramid"], lambda path: save_pyramid(pyramid, path))
+
+                stats = session.get_stats(msg_type)
+                if stats.field_names == stat_fields(tail):
+                    stats = stats.merge(build_stats(tail))
+                else:
+                    # a column changed type (e.g. became numeric); start over from the full columns
+                    stats = build_stats(columns)
+                entry["stats"] = f"{msg_dir}/{revision_file_name(STATS_FILE, revision)}"
+                write_atomic(session.session_dir / entry["stats"], stats.save)
+
+                replaced += [pyramid_path, session.stats_path(msg_type)]
+                entry["length"] = len(columns)
+                entry["end_ms"] = float(columns.time[-1])
+
+            if not any(len(tail) for tail in tails.values()) and len(tails) == len(store):
+                # a re-upload with nothing new
+                return session, previous_lengths
+            # the commit point: until session.json is replaced, readers see the previous revision
+            index["revision"] = revision
+            index["updated_at"] = datetime.now().isoformat()
+            write_atomic(session.session_dir / SESSION_FILE, lambda path: path.write_text(json.dumps(index, indent=2)))
+            self._index_prefixes(flight_id, index["message_types"])
+            for path in replaced:
+                path.unlink(missing_ok=True)
+
+            # requests holding the old session keep its (shorter) memory maps; new ones see the appended flight
+            with self._lock:
+                self._resident.pop(flight_id, None)
+            return self.get(flight_id), previous_lengths
+
+    def _load_prefix_index(self) -> Dict[str, List[str]]:
+        path = self.root / PREFIX_INDEX_FILE
+        if path.exists():
+            with open(path, 'r') as f:
+                return json.load(f)
+        # stores written before the index existed are indexed once, from their sessions
+        prefix_index: Dict[str, List[str]] = {}
+        for session_file in self.root.glob(f"*/{SESSION_FILE}"):
+            with open(session_file, 'r') as f:
+                index = json.load(f)
+            for entry in index["message_types"].values():
+                if entry.get("prefix_hash"):
+                    prefix_index.setdefault(entry["prefix_hash"], []).append(index["flight_id"])
+        return prefix_index
+
+    def _index_prefixes(self, flight_id: str, message_types: Dict[str, Dict[str, Any]]) -> None:
+        """Record the prefix hashes of a flight's message types in the prefix index."""
+        with self._prefix_index_lock:
+            prefix_index = self._load_prefix_index()
+            for entry in message_types.values():
+                flight_ids = prefix_index.setdefault(entry["prefix_hash"], [])
+                if flight_id not in flight_ids:
+                    flight_ids.append(flight_id)
+            write_atomic(self.root / PREFIX_INDEX_FILE, lambda path: path.write_text(json.dumps(prefix_index)))
+
+    def find_session_for(self, store: Dict[str, MessageColumns]) -> Optional[str]:
+        """Flight ID of a stored flight that store is a re-upload of, judged by its first samples."""
+        if not self.root.exists() or not store:
+            return None
+        hashes = {msg_type: prefix_hash(msg_data.sorted_by_time()) for msg_type, msg_data in store.items()}
+        with self._prefix_index_lock:
+            prefix_index = self._load_prefix_index()
+        # only flights sharing at least one prefix hash are read and checked
+        candidates = dict.fromkeys(flight_id for digest in hashes.values() for flight_id in prefix_index.get(digest, []))
+        for flight_id in candidates:
+            session_file = self.session_dir(flight_id) / SESSION_FILE
+            if not session_file.exists():
+                continue
+            with open(session_file, 'r') as f:
+                index = json.load(f)
+            stored = {msg_type: entry.get("prefix_hash") for msg_type, entry in index["message_types"].items()}
+            shared = [msg_type for msg_type in hashes if msg_type in stored]
+            if shared and all(hashes[msg_type] == stored[msg_type] for msg_type in shared):
+                return index["flight_id"]
+        return None
+
+    def ingest(
+        self,
+        store: Dict[str, MessageColumns],
+        flight_id: Optional[str] = None,
+    ) -> Tuple[FlightSession, Optional[Dict[str, int]]]:
+        """Store an uploaded log: appended to flight_id (or to the flight it re-uploads), else as a new session.
+
+        An upload matched by its first samples that doesn't extend the
+        matched flight (e.g. a shorter copy of the log) is stored as a new
+        flight; only an explicit flight_id raises AppendConflictError.
+        Returns the session and, when appended, the per-message-type lengths before the append.
+        """
+        if flight_id is not None:
+            return self.append_to_session(flight_id, store)
+        matched = self.find_session_for(store)
+        if matched is not None:
+            try:
+                return self.append_to_session(matched, store)
+            except AppendConflictError as e:
+                logger.info(f"Upload starts like flight {matched} but doesn't extend it ({e}); storing it as a new flight")
+        return self.create_session(store), None
+
+    def get(self, flight_id: str) -> FlightSession:
+        """Return a resident session, loading it from disk if needed.
+
+        A resident session is reloaded when session.json has been replaced
+        since it was loaded, e.g. by an append in another process.
+        """
+        with self._lock:
+            session_dir = self.session_dir(flight_id)
+            try:
+                stamp = file_stamp(session_dir / SESSION_FILE)
+            except FileNotFoundError:
+                self._resident.pop(flight_id, None)
+                raise KeyError(f"Unknown flight {flight_id}")
+            if flight_id in self._resident and self._resident[flight_id].stamp == stamp:
+                self._resident.move_to_end(flight_id)
+                return self._resident[flight_id]
+
+            session = FlightSession(flight_id, session_dir)
+            self._resident[flight_id] = session
+            while len(self._resident) > self.max_resident:
+                self._resident.popitem(last=False)
+            return session
+
+    def exists(self, flight_id: str) -> bool:
+        try:
+            return (self.session_dir(flight_id) / SESSION_FILE).exists()
+        except KeyError:
+            return False
+
+    def list_sessions(self) -> List[Dict[str, Any]]:
+        """List stored flights, newest first."""
+        sessions = []
+        if not self.root.exists():
+            return sessions
+        for session_file in self.root.glob(f"*/{SESSION_FILE}"):
+            with open(session_file, 'r') as f:
+                index = json.load(f)
+            sessions.append({
+                "flight_id": index["flight_id"],
+                "created_at": index["created_at"],
+                "message_types": list(index["message_types"].keys()),
+            })
+        return sorted(sessions, key=lambda session: session["created_at"], reverse=True)
+
+
+_session_store: Optional[SessionStore] = None
+
+
+def get_session_store() -> SessionStore:
+    """Process-wide session store."""
+    global _session_store
+    if _session_store is None:
+        _session_store = SessionStore()
+    return _session_store
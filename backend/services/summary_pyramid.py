@@ -0,0 +1,202 @@
+import logging
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .data_processor import MessageColumns, TIME_FIELD
+
+logger = logging.getLogger(__name__)
+
+PYRAMID_FILE = "pyramid.npz"
+# bucket widths, finest first
+LEVELS_MS = (1000, 10000, 60000)
+
+# (min, max, sum, count) of one field over some samples
+Aggregate = Tuple[float, float, float, int]
+EMPTY_AGGREGATE: Aggregate = (np.nan, np.nan, 0.0, 0)
+
+
+def _combine(*aggregates: Aggregate) -> Aggregate:
+    minimum, maximum, total, count = EMPTY_AGGREGATE
+    for other_min, other_max, other_total, other_count in aggregates:
+        if other_count == 0:
+            continue
+        minimum = float(np.fmin(minimum, other_min))
+        maximum = float(np.fmax(maximum, other_max))
+        total += other_total
+        count += other_count
+    return minimum, maximum, total, count
+
+
+def _aggregate_values(values: np.ndarray) -> Aggregate:
+    values = np.asarray(values, dtype=np.float64)
+    values = values[~np.isnan(values)]
+    if len(values) == 0:
+        return EMPTY_AGGREGATE
+    return float(values.min()), float(values.max()), float(values.sum()), len(values)
+
+
+def build_pyramid(msg_data: MessageColumns, levels_ms: Sequence[int] = LEVELS_MS) -> Dict[str, np.ndarray]:
+    """Per-bucket min/max/sum/count of every numeric field at each level, as npz-ready arrays."""
+    field_names = [field_name for field_name in msg_data.numeric_fields if field_name != TIME_FIELD]
+    values = msg_data.numeric_matrix(field_names)
+    valid = ~np.isnan(values)
+    time_data = np.asarray(msg_data.time, dtype=np.float64)
+
+    arrays = {
+        "fields": np.array(field_names, dtype=str),
+        "levels_ms": np.array(levels_ms, dtype=np.int64),
+    }
+    for level in levels_ms:
+        # time is sorted, so each bucket is a contiguous run of samples
+        bucket_ids = np.floor(time_data / level).astype(np.int64)
+        starts = np.flatnonzero(np.concatenate([[True], bucket_ids[1:] != bucket_ids[:-1]]))
+        prefix = f"L{level}_"
+        arrays[prefix + "start"] = starts
+        arrays[prefix + "time"] = bucket_ids[starts] * level
+        if len(starts) and field_names:
+            # fmin/fmax skip NaN, so all-NaN buckets stay NaN with a zero count
+            arrays[prefix + "min"] = np.fmin.reduceat(values, starts, axis=0)
+            arrays[prefix + "max"] = np.fmax.reduceat(values, starts, axis=0)
+            arrays[prefix + "sum"] = np.add.reduceat(np.where(valid, values, 0.0), starts, axis=0)
+            arrays[prefix + "count"] = np.add.reduceat(valid.astype(np.int64), starts, axis=0)
+        else:
+            empty = np.empty((len(starts), len(field_names)))
+            arrays[prefix + "min"] = arrays[prefix + "max"] = arrays[prefix + "sum"] = empty
+            arrays[prefix + "count"] = empty.astype(np.int64)
+    return arrays
+
+
+def extend_pyramid(arrays: Dict[str, np.ndarray], msg_data: MessageColumns) -> Dict[str, np.ndarray]:
+    """Update a pyramid after samples were appended to msg_data.
+
+    Only the last bucket of each level (which the new samples may extend) and
+    the buckets after it are recomputed, so the cost is O(new samples).
+    """
+    field_names = [str(field_name) for field_name in arrays["fields"]]
+    if field_names != [field_name for field_name in msg_data.numeric_fields if field_name != TIME_FIELD]:
+        # the numeric fields changed; nothing to reuse
+        return build_pyramid(msg_data, [int(level) for level in arrays["levels_ms"]])
+
+    arrays = dict(arrays)
+    for level in (int(level) for level in arrays["levels_ms"]):
+        prefix = f"L{level}_"
+        starts = arrays[prefix + "start"]
+        first = int(starts[-1]) if len(starts) else 0
+        tail = build_pyramid(msg_data.slice_rows(first), (level,))
+        arrays[prefix + "start"] = np.concatenate([starts[:-1], tail[prefix + "start"] + first])
+        for name in ("time", "min", "max", "sum", "count"):
+            kept = arrays[prefix + name][:max(len(starts) - 1, 0)]
+            arrays[prefix + name] = np.concatenate([kept, tail[prefix + name].astype(kept.dtype, copy=False)])
+    return arrays
+
+
+def save_pyramid(arrays: Dict[str, np.ndarray], path: Path) -> str:
+    np.savez(path, **arrays)
+    return str(path)
+
+
+def load_pyramid(path: Path) -> Dict[str, np.ndarray]:
+    with np.load(path, allow_pickle=False) as npz:
+        return {key: npz[key] for key in npz.files}
+
+
+class SummaryPyramid:
+    """Multi-resolution aggregates of a message type, answering range queries in O(buckets)."""
+
+    def __init__(self, arrays: Dict[str, np.ndarray], msg_data: MessageColumns):
+        self.msg_data = msg_data
+        self.fields: List[str] = [str(field_name) for field_name in arrays["fields"]]
+        self.levels_ms: List[int] = [int(level) for level in arrays["levels_ms"]]
+        self._arrays = arrays
+        self._field_index = {field_name: i for i, field_name in enumerate(self.fields)}
+
+    @classmethod
+    def load(cls, path: Path, msg_data: MessageColumns) -> "SummaryPyramid":
+        return cls(load_pyramid(path), msg_data)
+
+    def _level(self, level: int, name: str) -> np.ndarray:
+        return self._arrays[f"L{level}_{name}"]
+
+    def _aggregate(self, field_name: str, start: int, end: int, level_pos: int) -> Aggregate:
+        """Aggregate samples [start, end), using whole buckets at this level and finer levels for the edges."""
+        if start >= end:
+            return EMPTY_AGGREGATE
+        if level_pos < 0:
+            return _aggregate_values(self.msg_data[field_name][start:end])
+
+        level = self.levels_ms[level_pos]
+        starts = self._level(level, "start")
+        bounds = np.append(starts, len(self.msg_data))
+        first = int(np.searchsorted(starts, start, side="left"))
+        stop = int(np.searchsorted(bounds, end, side="right")) - 1
+        if stop <= first:
+            return self._aggregate(field_name, start, end, level_pos - 1)
+
+        column = self._field_index[field_name]
+        counts = self._level(level, "count")[first:stop, column]
+        whole = EMPTY_AGGREGATE
+        if counts.sum() > 0:
+            whole = (
+                float(np.nanmin(self._level(level, "min")[first:stop, column])),
+                float(np.nanmax(self._level(level, "max")[first:stop, column])),
+                float(self._level(level, "sum")[first:stop, column].sum()),
+                int(counts.sum()),
+            )
+        return _combine(
+            self._aggregate(field_name, start, int(starts[first]), level_pos - 1),
+            whole,
+            self._aggregate(field_name, int(bounds[stop]), end, level_pos - 1),
+        )
+
+    def _sample_range(self, start_ms: Optional[float], end_ms: Optional[float]) -> Tuple[int, int]:
+        time_data = self.msg_data.time
+        start = 0 if start_ms is None else int(np.searchsorted(time_data, start_ms, side="left"))
+        end = len(time_data) if end_ms is None else int(np.searchsorted(time_data, end_ms, side="right"))
+        return start, max(start, end)
+
+    def range_stats(self, field_name: str, start_ms: Optional[float] = None, end_ms: Optional[float] = None) -> Dict[str, Any]:
+        """Exact min/max/mean/count of a field between start_ms and end_ms."""
+        if field_name not in self._field_index:
+            raise KeyError(f"{self.msg_data.msg_type} has no numeric field {field_name}")
+        start, end = self._sample_range(start_ms, end_ms)
+        minimum, maximum, total, count = self._aggregate(field_name, start, end, len(self.levels_ms) - 1)
+        return {
+            "min": None if count == 0 else minimum,
+            "max": None if count == 0 else maximum,
+            "mean": None if count == 0 else total / count,
+            "count": count,
+        }
+
+    def buckets(
+        self,
+        field_name: str,
+        start_ms: Optional[float] = None,
+        end_ms: Optional[float] = None,
+        max_points: int = 500,
+    ) -> Dict[str, Any]:
+        """Min/max/mean per bucket at the finest level with at most max_points buckets in range."""
+        if field_name not in self._field_index:
+            raise KeyError(f"{self.msg_data.msg_type} has no numeric field {field_name}")
+        column = self._field_index[field_name]
+        start, end = self._sample_range(start_ms, end_ms)
+
+        for level in self.levels_ms:
+            starts = self._level(level, "start")
+            first = max(int(np.searchsorted(starts, start, side="right")) - 1, 0)
+            stop = int(np.searchsorted(starts, end, side="left"))
+            if stop - first <= max_points or level == self.levels_ms[-1]:
+                break
+
+        counts = self._level(level, "count")[first:stop, column]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            means = self._level(level, "sum")[first:stop, column] / counts
+        return {
+            "bucket_ms": level,
+            TIME_FIELD: self._level(level, "time")[first:stop],
+            "min": self._level(level, "min")[first:stop, column],
+            "max": self._level(level, "max")[first:stop, column],
+            "mean": means,
+            "count": counts,
+        }
@@ -0,0 +1,75 @@
+from typing import Tuple
+
+import numpy as np
+
+
+def _bucket_edges(length: int, n_buckets: int) -> np.ndarray:
+    return np.linspace(0, length, n_buckets + 1).astype(np.int64)
+
+
+def min_max_decimate(values: np.ndarray, n_out: int) -> np.ndarray:
+    """Indices of the min and max sample in each of n_out // 2 equal buckets, in time order."""
+    values = np.asarray(values, dtype=np.float64)
+    length = len(values)
+    if n_out >= length or length == 0:
+        return np.arange(length)
+    n_buckets = max(1, n_out // 2)
+    bucket_size = -(-length // n_buckets)
+
+    # pad to a (buckets, bucket_size) grid; NaN and padding never win min or max
+    padded = np.full(n_buckets * bucket_size, np.nan)
+    padded[:length] = values
+    grid = padded.reshape(n_buckets, bucket_size)
+    valid = ~np.isnan(grid)
+    offsets = np.arange(n_buckets) * bucket_size
+    lows = np.where(valid, grid, np.inf).argmin(axis=1) + offsets
+    highs = np.where(valid, grid, -np.inf).argmax(axis=1) + offsets
+
+    keep = valid.any(axis=1)
+    indices = np.unique(np.concatenate([lows[keep], highs[keep]]))
+    return indices[indices < length]
+
+
+def lttb(time_data: np.ndarray, values: np.ndarray, n_out: int) -> np.ndarray:
+    """Largest-Triangle-Three-Buckets: indices of n_out samples that preserve the visual shape."""
+    time_data = np.asarray(time_data, dtype=np.float64)
+    values = np.asarray(values, dtype=np.float64)
+    length = len(values)
+    if n_out >= length:
+        return np.arange(length)
+    if n_out < 3:
+        return np.linspace(0, length - 1, max(n_out, 0)).astype(np.int64)
+
+    # first and last samples are always kept; the rest are split into n_out - 2 buckets
+    edges = _bucket_edges(length - 2, n_out - 2) + 1
+    # average point of each bucket, used as the third triangle vertex for the previous bucket
+    bucket_time = np.add.reduceat(time_data[1:-1], edges[:-1] - 1) / np.diff(edges)
+    bucket_values = np.add.reduceat(np.nan_to_num(values[1:-1]), edges[:-1] - 1) / np.diff(edges)
+    next_time = np.append(bucket_time[1:], time_data[-1])
+    next_values = np.append(bucket_values[1:], np.nan_to_num(values[-1]))
+    filled = np.nan_to_num(values)
+
+    indices = np.empty(n_out, dtype=np.int64)
+    indices[0], indices[-1] = 0, length - 1
+    previous = 0
+    # sequential over buckets, vectorized within each bucket
+    for bucket in range(n_out - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        area = np.abs(
+            (time_data[previous] - next_time[bucket]) * (filled[start:end] - filled[previous])
+            - (time_data[previous] - time_data[start:end]) * (next_values[bucket] - filled[previous])
+        )
+        previous = start + int(np.argmax(area))
+        indices[bucket + 1] = previous
+    return indices
+
+
+def decimate(time_data: np.ndarray, values: np.ndarray, n_out: int, method: str = "lttb") -> Tuple[np.ndarray, np.ndarray]:
+    """Downsample a series to about n_out points with "lttb" or "minmax"."""
+    if method == "lttb":
+        indices = lttb(time_data, values, n_out)
+    elif method == "minmax":
+        indices = min_max_decimate(values, n_out)
+    else:
+        raise ValueError(f"Unknown decimation method {method!r}")
+    return np.asarray(time_data)[indices], np.asarray(values)[indices]
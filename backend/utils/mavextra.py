@@ -0,0 +1,344 @@
+# NumPy ports of the src/mavextra/mavextra.js graph helpers.
+# The JS versions run once per sample and keep state in globals (lowpass,
+# delta, the cached earth field); these take and return whole columns.
+# Message arguments are any object exposing fields as attributes, e.g. ATT.Roll.
+from typing import Any, Optional, Tuple
+
+import numpy as np
+
+from .mag_tables import DECLINATION_TABLE, INCLINATION_TABLE, INTENSITY_TABLE
+
+SAMPLING_RES = 10.0
+SAMPLING_MIN_LAT = -90.0
+SAMPLING_MAX_LAT = 90.0
+SAMPLING_MIN_LON = -180.0
+SAMPLING_MAX_LON = 180.0
+
+_DECLINATION = np.asarray(DECLINATION_TABLE)
+_INCLINATION = np.asarray(INCLINATION_TABLE)
+_INTENSITY = np.asarray(INTENSITY_TABLE)
+
+
+class Vector3Array:
+    """Column of 3-vectors, mirroring Vector3 with per-sample arrays."""
+
+    def __init__(self, x: np.ndarray, y: np.ndarray, z: np.ndarray):
+        self.x = x
+        self.y = y
+        self.z = z
+
+    def length(self) -> np.ndarray:
+        return np.sqrt(self.x ** 2 + self.y ** 2 + self.z ** 2)
+
+
+def _field(msg: Any, *names: str) -> np.ndarray:
+    """First of several alternative field names present on a message."""
+    for name in names:
+        value = getattr(msg, name, None)
+        if value is not None:
+            return np.asarray(value, dtype=np.float64)
+    raise AttributeError(f"none of the fields {', '.join(names)} are available")
+
+
+def degrees(a):
+    return 57.2958 * a
+
+
+def radians(a):
+    return 0.0174533 * a
+
+
+def kmh(mps):
+    """Convert m/s to km/h."""
+    return mps * 3.6
+
+
+def sqrt(a):
+    return np.sqrt(a)
+
+
+def angle_diff(angle1, angle2):
+    ret = np.asarray(angle1 - angle2, dtype=np.float64)
+    ret = np.where(ret > 180, ret - 360, ret)
+    return np.where(ret < -180, ret + 360, ret)
+
+
+def _exponential_filter(values: np.ndarray, factor: float) -> np.ndarray:
+    """y[n] = factor * y[n-1] + (1 - factor) * x[n], starting from y[0] = x[0]."""
+    values = np.asarray(values, dtype=np.float64)
+    if len(values) == 0 or factor <= 0:
+        return values.copy()
+    if factor >= 1:
+        return np.full_like(values, values[0])
+
+    # Closed form per block: y[i] = f^(i+1) * y[-1] + (1 - f) * f^i * cumsum(x[j] * f^-j).
+    # Blocks are short enough that f^-j stays below 1e6, which bounds rounding error.
+    block = max(1, int(np.log(1e6) / -np.log(factor)))
+    result = np.empty_like(values)
+    state = values[0]
+    for start in range(0, len(values), block):
+        segment = values[start:start + block]
+        steps = np.arange(len(segment))
+        decay = factor ** steps
+        filtered = factor * decay * state + (1.0 - factor) * decay * np.cumsum(segment / decay)
+        result[start:start + len(segment)] = filtered
+        state = filtered[-1]
+    return result
+
+
+def lowpass(variable, key=None, factor=None):
+    """Exponential low-pass filter; the key argument is only kept for signature compatibility."""
+    if factor is None:
+        factor = key
+    return _exponential_filter(variable, float(factor))
+
+
+def delta(variable, key=None):
+    """Sample-to-sample difference, 0 for the first sample."""
+    variable = np.asarray(variable, dtype=np.float64)
+    result = np.zeros_like(variable)
+    result[1:] = np.diff(variable)
+    return result
+
+
+def altitude(SCALED_PRESSURE, groundPressure, groundTemp):
+    """Barometric altitude from absolute pressure."""
+    scaling = groundPressure / (_field(SCALED_PRESSURE, "press_abs") * 100.0)
+    temp = groundTemp + 273.15
+    return np.log(scaling) * temp * 29271.267 * 0.001
+
+
+def dcm_from_euler(roll, pitch, yaw) -> Tuple[np.ndarray, ...]:
+    """Row-major elements of Matrix3.fromEuler for each sample."""
+    cp, sp = np.cos(pitch), np.sin(pitch)
+    cr, sr = np.cos(roll), np.sin(roll)
+    cy, sy = np.cos(yaw), np.sin(yaw)
+    return (
+        cp * cy, (sr * sp * cy) - (cr * sy), (cr * sp * cy) + (sr * sy),
+        cp * sy, (sr * sp * sy) + (cr * cy), (cr * sp * sy) - (sr * cy),
+        -sp, sr * cp, cr * cp,
+    )
+
+
+def _tilt_compensated_heading(mag_x, mag_y, mag_z, dcm) -> np.ndarray:
+    cos_pitch_sqr = 1.0 - (dcm[6] * dcm[6])
+    head_y = mag_y * dcm[8] - mag_z * dcm[7]
+    head_x = mag_x * cos_pitch_sqr - dcm[6] * (mag_y * dcm[7] + mag_z * dcm[8])
+    return degrees(np.arctan2(-head_y, head_x))
+
+
+def mag_heading(RAW_IMU, ATTITUDE, declination=0.0):
+    """Heading from raw magnetometer (MAVLink messages, attitude in radians)."""
+    mag_x = _field(RAW_IMU, "xmag", "MagX")
+    mag_y = _field(RAW_IMU, "ymag", "MagY")
+    mag_z = _field(RAW_IMU, "zmag", "MagZ")
+    dcm = dcm_from_euler(ATTITUDE.roll, ATTITUDE.pitch, ATTITUDE.yaw)
+    heading = _tilt_compensated_heading(mag_x, mag_y, mag_z, dcm) + declination
+    return np.where(heading < -180, heading + 360, heading)
+
+
+def mag_heading_df(MAG, ATT, declination=0.0):
+    """Heading from raw magnetometer (DataFlash messages, attitude in degrees)."""
+    dcm = dcm_from_euler(radians(ATT.Roll), radians(ATT.Pitch), radians(ATT.Yaw))
+    heading = _tilt_compensated_heading(
+        _field(MAG, "MagX"), _field(MAG, "MagY"), _field(MAG, "MagZ"), dcm
+    ) + declination
+    return np.where(heading < 0, heading + 360, heading)
+
+
+def mag_field(RAW_IMU):
+    """Magnetic field strength from raw magnetometer."""
+    return np.sqrt(_field(RAW_IMU, "xmag") ** 2 + _field(RAW_IMU, "ymag") ** 2 + _field(RAW_IMU, "zmag") ** 2)
+
+
+def mag_field_df(MAG):
+    """Magnetic field strength from raw magnetometer (DataFlash version)."""
+    return np.sqrt(_field(MAG, "MagX") ** 2 + _field(MAG, "MagY") ** 2 + _field(MAG, "MagZ") ** 2)
+
+
+def interpolate_table(table: np.ndarray, lat, lon):
+    """Bilinear interpolation in a 10 degree lat/lon table."""
+    min_lat = np.floor(np.floor(lat / SAMPLING_RES) * SAMPLING_RES)
+    min_lon = np.floor(np.floor(lon / SAMPLING_RES) * SAMPLING_RES)
+    lat_index = (np.floor(-SAMPLING_MIN_LAT + min_lat) // SAMPLING_RES).astype(int)
+    lon_index = (np.floor(-SAMPLING_MIN_LON + min_lon) // SAMPLING_RES).astype(int)
+
+    data_sw = table[lat_index, lon_index]
+    data_se = table[lat_index, lon_index + 1]
+    data_ne = table[lat_index + 1, lon_index + 1]
+    data_nw = table[lat_index + 1, lon_index]
+
+    data_min = ((lon - min_lon) / SAMPLING_RES) * (data_se - data_sw) + data_sw
+    data_max = ((lon - min_lon) / SAMPLING_RES) * (data_ne - data_nw) + data_nw
+    return ((lat - min_lat) / SAMPLING_RES) * (data_max - data_min) + data_min
+
+
+def get_mag_field_ef(lat: float, lon: float) -> Optional[Tuple[float, float, float]]:
+    """(declination deg, inclination deg, intensity gauss) for a location."""
+    if not (SAMPLING_MIN_LAT <= lat < SAMPLING_MAX_LAT and SAMPLING_MIN_LON <= lon < SAMPLING_MAX_LON):
+        return None
+    lat, lon = np.asarray(lat, dtype=np.float64), np.asarray(lon, dtype=np.float64)
+    return (
+        float(interpolate_table(_DECLINATION, lat, lon)),
+        float(interpolate_table(_INCLINATION, lat, lon)),
+        float(interpolate_table(_INTENSITY, lat, lon)),
+    )
+
+
+def _lat_lon(GPS) -> Tuple[np.ndarray, np.ndarray]:
+    """Latitude and longitude in degrees of a MAVLink or DataFlash GPS message."""
+    if getattr(GPS, "lat", None) is not None:
+        return _field(GPS, "lat") * 1.0e-7, _field(GPS, "lon") * 1.0e-7
+    return _field(GPS, "Lat"), _field(GPS, "Lng")
+
+
+def _first_fix_field(GPS) -> Optional[Tuple[float, float, float]]:
+    """get_mag_field_ef at the first 3D-fix GPS sample, the location the JS version caches."""
+    status = _field(GPS, "fix_type", "Status")
+    lat, lon = _lat_lon(GPS)
+    fixed = np.flatnonzero(status >= 3)
+    if len(fixed) == 0:
+        return None
+    return get_mag_field_ef(lat[fixed[0]], lon[fixed[0]])
+
+
+def expected_earth_field(GPS) -> Optional[np.ndarray]:
+    """Expected earth-frame field at the first 3D-fix GPS sample, like the cached JS value."""
+    field_var = _first_fix_field(GPS)
+    if field_var is None:
+        return None
+
+    declination, inclination, intensity = field_var
+    dcm = dcm_from_euler(0.0, -radians(inclination), radians(declination))
+    # R.times(Vector3(intensity * 1000, 0, 0)) only uses the first column
+    return np.array([dcm[0], dcm[3], dcm[6]], dtype=np.float64) * intensity * 1000.0
+
+
+def expected_mag(GPS, ATT, rollAdjust=0, pitchAdjust=0, yawAdjust=0) -> Vector3Array:
+    """Expected body-frame magnetic field for each attitude sample."""
+    if getattr(ATT, "roll", None) is not None:
+        roll = degrees(_field(ATT, "roll")) + rollAdjust
+        pitch = degrees(_field(ATT, "pitch")) + pitchAdjust
+        yaw = degrees(_field(ATT, "yaw")) + yawAdjust
+    else:
+        roll = _field(ATT, "Roll") + rollAdjust
+        pitch = _field(ATT, "Pitch") + pitchAdjust
+        yaw = _field(ATT, "Yaw") + yawAdjust
+
+    return _body_field(expected_earth_field(GPS), roll, pitch, yaw)
+
+
+def _body_field(earth_field: Optional[np.ndarray], roll, pitch, yaw) -> Vector3Array:
+    """Earth-frame field rotated into the body frame of each attitude sample (degrees)."""
+    if earth_field is None:
+        zeros = np.zeros_like(np.asarray(roll, dtype=np.float64))
+        return Vector3Array(zeros, zeros.copy(), zeros.copy())
+
+    e = dcm_from_euler(radians(roll), radians(pitch), radians(yaw))
+    ef_x, ef_y, ef_z = earth_field
+    # rot.transposed().times(earth_field)
+    return Vector3Array(
+        e[0] * ef_x + e[3] * ef_y + e[6] * ef_z,
+        e[1] * ef_x + e[4] * ef_y + e[7] * ef_z,
+        e[2] * ef_x + e[5] * ef_y + e[8] * ef_z,
+    )
+
+
+# The helpers below have no JS counterpart; they are ports of pymavlink's mavextra.
+
+def atan2(y, x):
+    return np.arctan2(y, x)
+
+
+def wrap_180(angle):
+    """Wrap once into [-180, 180]; like pymavlink, only a single turn is removed."""
+    angle = np.asarray(angle, dtype=np.float64)
+    angle = np.where(angle > 180, angle - 360.0, angle)
+    return np.where(angle < -180, angle + 360.0, angle)
+
+
+def wrap_360(angle):
+    """Wrap once into [0, 360]; like pymavlink, only a single turn is removed."""
+    angle = np.asarray(angle, dtype=np.float64)
+    angle = np.where(angle > 360, angle - 360.0, angle)
+    return np.where(angle < 0, angle + 360.0, angle)
+
+
+def _rate(values, time_s) -> np.ndarray:
+    """Per-second slope between consecutive samples, 0 for the first sample and repeated timestamps."""
+    values = np.asarray(values, dtype=np.float64)
+    result = np.zeros_like(values)
+    dt = np.diff(np.asarray(time_s, dtype=np.float64))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        result[1:] = np.where(dt != 0, np.diff(values) / dt, 0.0)
+    return result
+
+
+def gravity(RAW_IMU):
+    """Magnitude of the measured acceleration in m/s/s."""
+    if getattr(RAW_IMU, "xacc", None) is not None:
+        scale = 9.81 / 1000.0
+        return np.sqrt(sum((_field(RAW_IMU, name) * scale) ** 2 for name in ("xacc", "yacc", "zacc")))
+    return np.sqrt(_field(RAW_IMU, "AccX") ** 2 + _field(RAW_IMU, "AccY") ** 2 + _field(RAW_IMU, "AccZ") ** 2)
+
+
+def _lat_lon_alt(MSG) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Latitude and longitude in radians and altitude in metres of a position message."""
+    lat, lon = _lat_lon(MSG)
+    if getattr(MSG, "alt", None) is not None:
+        alt = _field(MSG, "alt") * 1.0e-3
+    else:
+        alt = _field(MSG, "Alt")
+    return np.radians(lat), np.radians(lon), alt
+
+
+def distance_two(MSG1, MSG2, horizontal=True):
+    """Great-circle distance in metres between two position messages (haversine, mean earth radius)."""
+    lat1, lon1, alt1 = _lat_lon_alt(MSG1)
+    lat2, lon2, alt2 = _lat_lon_alt(MSG2)
+    a = np.sin(0.5 * (lat2 - lat1)) ** 2 + np.sin(0.5 * (lon2 - lon1)) ** 2 * np.cos(lat1) * np.cos(lat2)
+    ground_dist = 6371 * 1000 * 2.0 * np.arctan2(np.sqrt(a), np.sqrt(1.0 - a))
+    if horizontal:
+        return ground_dist
+    return np.sqrt(ground_dist ** 2 + (alt2 - alt1) ** 2)
+
+
+def mag_yaw(GPS, ATT, MAG):
+    """Heading from the DataFlash magnetometer, corrected by the declination at the GPS location."""
+    field_var = _first_fix_field(GPS)
+    return mag_heading_df(MAG, ATT, field_var[0] if field_var is not None else 0.0)
+
+
+def expected_mag_yaw(GPS, ATT, MAG, roll_adjust=0, pitch_adjust=0, yaw_adjust=0) -> Vector3Array:
+    """Expected body-frame magnetic field, with the yaw taken from the magnetometer rather than ATT."""
+    roll = _field(ATT, "Roll") + roll_adjust
+    pitch = _field(ATT, "Pitch") + pitch_adjust
+    # pymavlink accepts yaw_adjust but doesn't apply it to the magnetometer yaw either
+    return _body_field(expected_earth_field(GPS), roll, pitch, mag_yaw(GPS, ATT, MAG))
+
+
+def earth_field_error(GPS, NKF2) -> Vector3Array:
+    """EKF earth-field estimate (MN, ME, MD) minus the expected field at the GPS location."""
+    earth_field = expected_earth_field(GPS)
+    if earth_field is None:
+        zeros = np.zeros_like(_field(NKF2, "MN"))
+        return Vector3Array(zeros, zeros.copy(), zeros.copy())
+    return Vector3Array(
+        _field(NKF2, "MN") - earth_field[0],
+        _field(NKF2, "ME") - earth_field[1],
+        _field(NKF2, "MD") - earth_field[2],
+    )
+
+
+def sim_body_rates(SIM) -> Vector3Array:
+    """Body-frame rates in rad/s from the simulator's Euler angles (degrees) and TimeUS."""
+    time_s = _field(SIM, "TimeUS") * 1.0e-6
+    roll_rate = radians(_rate(_field(SIM, "Roll"), time_s))
+    pitch_rate = radians(_rate(_field(SIM, "Pitch"), time_s))
+    yaw_rate = radians(_rate(_field(SIM, "Yaw"), time_s))
+    phi, theta = radians(_field(SIM, "Roll")), radians(_field(SIM, "Pitch"))
+    return Vector3Array(
+        roll_rate - yaw_rate * np.sin(theta),
+        np.cos(phi) * pitch_rate + np.sin(phi) * yaw_rate * np.cos(theta),
+        np.cos(phi) * yaw_rate * np.cos(theta) - np.sin(phi) * pitch_rate,
+    )
@@ -1 +1,265 @@
+import warnings
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
 
+import numpy as np
+
+DEFAULT_PERCENTILES = (5, 25, 50, 75, 95)
+
+
+def _to_json_values(values: np.ndarray) -> List[Optional[float]]:
+    """Convert an array of floats to JSON-safe values (NaN becomes None)."""
+    return [None if np.isnan(value) else float(value) for value in values]
+
+
+def calculate_message_stats(
+    time_ms: np.ndarray,
+    values: np.ndarray,
+    field_names: Sequence[str],
+    percentiles: Sequence[float] = DEFAULT_PERCENTILES,
+) -> Dict[str, Dict[str, Any]]:
+    """Compute statistics for every column of a (samples, fields) array in one pass."""
+    values = np.asarray(values, dtype=np.float64)
+    if values.ndim != 2 or values.shape[1] != len(field_names):
+        raise ValueError("values must be a (samples, fields) array matching field_names")
+    if values.shape[1] == 0:
+        return {}
+
+    nan_mask = np.isnan(values)
+    nan_counts = nan_mask.sum(axis=0)
+    valid_counts = values.shape[0] - nan_counts
+
+    # all-NaN columns produce RuntimeWarnings and NaN results, reported as None
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", category=RuntimeWarning)
+        minimums = np.nanmin(values, axis=0)
+        maximums = np.nanmax(values, axis=0)
+        means = np.nanmean(values, axis=0)
+        stds = np.nanstd(values, axis=0)
+        percentile_values = np.nanpercentile(values, percentiles, axis=0)
+
+        # rate of change in units per second, skipping repeated timestamps
+        dt_s = np.diff(np.asarray(time_ms, dtype=np.float64)) / 1000.0
+        step_mask = dt_s > 0
+        rates = np.abs(np.diff(values, axis=0)[step_mask] / dt_s[step_mask, None])
+        if rates.shape[0] > 0:
+            max_rates = np.nanmax(rates, axis=0)
+            mean_rates = np.nanmean(rates, axis=0)
+        else:
+            max_rates = mean_rates = np.full(values.shape[1], np.nan)
+
+    minimums, maximums, means, stds = (
+        _to_json_values(minimums), _to_json_values(maximums),
+        _to_json_values(means), _to_json_values(stds),
+    )
+    max_rates, mean_rates = _to_json_values(max_rates), _to_json_values(mean_rates)
+    percentile_rows = [_to_json_values(row) for row in np.atleast_2d(percentile_values)]
+
+    stats = {}
+    for i, field_name in enumerate(field_names):
+        stats[field_name] = {
+            "min": minimums[i],
+            "max": maximums[i],
+            "mean": means[i],
+            "std": stds[i],
+            "percentiles": {
+                f"p{p:g}": percentile_rows[j][i] for j, p in enumerate(percentiles)
+            },
+            "rate_of_change": {
+                "max_abs_per_s": max_rates[i],
+                "mean_abs_per_s": mean_rates[i],
+            },
+            "count": int(valid_counts[i]),
+            "nan_count": int(nan_counts[i]),
+            # computed from every value, unlike StatsAccumulator's reservoir percentiles
+            "percentiles_approximate": False,
+        }
+    return stats
+
+
+def calculate_field_stats(time_ms: np.ndarray, values: np.ndarray) -> Dict[str, Any]:
+    """Compute statistics for a single field."""
+    values = np.asarray(values, dtype=np.float64).reshape(-1, 1)
+    return calculate_message_stats(time_ms, values, ["value"])["value"]
+
+
+# values kept per field so percentiles stay available after merges; exact up to this many samples
+RESERVOIR_SIZE = 8192
+
+
+def _sample_rows(rng: np.random.Generator, values: np.ndarray, size: int) -> np.ndarray:
+    """Up to size values drawn uniformly without replacement, NaN-padded to RESERVOIR_SIZE."""
+    sample = np.full(RESERVOIR_SIZE, np.nan)
+    if size >= len(values):
+        sample[:len(values)] = values
+    else:
+        sample[:size] = values[rng.choice(len(values), size, replace=False)]
+    return sample
+
+
+class StatsAccumulator:
+    """Mergeable per-field statistics of a message type.
+
+    Count, mean and M2 (sum of squared deviations) combine with Chan et al.'s
+    parallel update, min/max and rate-of-change extremes combine directly,
+    and a bounded reservoir sample per field keeps approximate percentiles.
+    Merging the accumulator of newly appended samples therefore costs
+    O(new samples), and the merged min/max/mean/std/count match a full pass.
+    """
+
+    ARRAYS = ("count", "nan_count", "mean", "m2", "min", "max", "rate_count", "rate_sum", "rate_max",
+              "first_time", "first_values", "last_time", "last_values", "reservoir", "seen")
+
+    def __init__(self, field_names: Sequence[str], arrays: Dict[str, np.ndarray]):
+        self.field_names = list(field_names)
+        for name in self.ARRAYS:
+            setattr(self, name, arrays[name])
+
+    @classmethod
+    def from_values(cls, time_ms: np.ndarray, values: np.ndarray, field_names: Sequence[str]) -> "StatsAccumulator":
+        """Accumulate a (samples, fields) block in one vectorized pass."""
+        values = np.asarray(values, dtype=np.float64)
+        time_ms = np.asarray(time_ms, dtype=np.float64)
+        if values.ndim != 2 or values.shape[1] != len(field_names):
+            raise ValueError("values must be a (samples, fields) array matching field_names")
+        if len(time_ms) == 0:
+            raise ValueError("cannot accumulate an empty block")
+
+        valid = ~np.isnan(values)
+        count = valid.sum(axis=0)
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", category=RuntimeWarning)
+            mean = np.nanmean(values, axis=0)
+            m2 = np.nansum((values - mean) ** 2, axis=0)
+            minimum = np.nanmin(values, axis=0)
+            maximum = np.nanmax(values, axis=0)
+
+            dt_s = np.diff(time_ms) / 1000.0
+            step_mask = dt_s > 0
+            rates = np.abs(np.diff(values, axis=0)[step_mask] / dt_s[step_mask, None])
+            rate_valid = ~np.isnan(rates)
+            rate_max = np.nanmax(rates, axis=0) if rates.shape[0] else np.full(values.shape[1], np.nan)
+
+        rng = np.random.default_rng(len(time_ms))
+        reservoir = np.stack([
+            _sample_rows(rng, values[valid[:, i], i], RESERVOIR_SIZE) for i in range(values.shape[1])
+        ], axis=1) if values.shape[1] else np.empty((RESERVOIR_SIZE, 0))
+
+        return cls(field_names, {
+            "count": count.astype(np.int64),
+            "nan_count": (values.shape[0] - count).astype(np.int64),
+            "mean": mean,
+            "m2": m2,
+            "min": minimum,
+            "max": maximum,
+            "rate_count": rate_valid.sum(axis=0).astype(np.int64),
+            "rate_sum": np.where(rate_valid, rates, 0.0).sum(axis=0),
+            "rate_max": rate_max,
+            "first_time": np.array(time_ms[0]),
+            "first_values": values[0].copy(),
+            "last_time": np.array(time_ms[-1]),
+            "last_values": values[-1].copy(),
+            "reservoir": reservoir,
+            "seen": count.astype(np.int64),
+        })
+
+    def merge(self, other: "StatsAccumulator") -> "StatsAccumulator":
+        """Statistics of this block followed by other (samples appended after this one)."""
+        if other.field_names != self.field_names:
+            raise ValueError("cannot merge accumulators over different fields")
+        count = self.count + other.count
+        with warnings.catch_warnings(), np.errstate(invalid="ignore", divide="ignore"):
+            warnings.simplefilter("ignore", category=RuntimeWarning)
+            # Chan et al.: combine means and M2 of two disjoint blocks
+            delta = np.where(other.count > 0, other.mean, 0.0) - np.where(self.count > 0, self.mean, 0.0)
+            mean = np.where(
+                count > 0,
+                np.where(self.count > 0, self.mean, 0.0) + delta * other.count / count,
+                np.nan,
+            )
+            m2 = (np.nan_to_num(self.m2) + np.nan_to_num(other.m2)
+                  + delta ** 2 * self.count * other.count / np.maximum(count, 1))
+
+            # the one rate that spans the boundary between the blocks
+            dt_s = (float(other.first_time) - float(self.last_time)) / 1000.0
+            boundary = (np.abs(other.first_values - self.last_values) / dt_s if dt_s > 0
+                        else np.full(len(self.field_names), np.nan))
+            boundary_valid = ~np.isnan(boundary)
+            rate_max = np.fmax(np.fmax(self.rate_max, other.rate_max), boundary)
+
+        rng = np.random.default_rng(int(count.sum()))
+        reservoir = np.full_like(self.reservoir, np.nan)
+        for i in range(len(self.field_names)):
+            seen = self.seen[i] + other.seen[i]
+            ours = np.asarray(self.reservoir[:min(self.seen[i], RESERVOIR_SIZE), i])
+            theirs = np.asarray(other.reservoir[:min(other.seen[i], RESERVOIR_SIZE), i])
+            if seen <= RESERVOIR_SIZE:
+                reservoir[:seen, i] = np.concatenate([ours, theirs])
+                continue
+            # keep each block in proportion to how many values it represents
+            take = min(int(round(RESERVOIR_SIZE * self.seen[i] / seen)), len(ours))
+            take = max(take, RESERVOIR_SIZE - len(theirs))
+            reservoir[:take, i] = ours[rng.choice(len(ours), take, replace=False)]
+            reservoir[take:, i] = theirs[rng.choice(len(theirs), RESERVOIR_SIZE - take, replace=False)]
+
+        return StatsAccumulator(self.field_names, {
+            "count": count,
+            "nan_count": self.nan_count + other.nan_count,
+            "mean": mean,
+            "m2": m2,
+            "min": np.fmin(self.min, other.min),
+            "max": np.fmax(self.max, other.max),
+            "rate_count": self.rate_count + other.rate_count + boundary_valid,
+            "rate_sum": self.rate_sum + other.rate_sum + np.where(boundary_valid, boundary, 0.0),
+            "rate_max": rate_max,
+            "first_time": self.first_time,
+            "first_values": self.first_values,
+            "last_time": other.last_time,
+            "last_values": other.last_values,
+            "reservoir": reservoir,
+            "seen": self.seen + other.seen,
+        })
+
+    def to_stats(self, percentiles: Sequence[float] = DEFAULT_PERCENTILES) -> Dict[str, Dict[str, Any]]:
+        """Statistics in the calculate_message_stats format; percentiles come from the reservoir sample."""
+        with warnings.catch_warnings(), np.errstate(invalid="ignore", divide="ignore"):
+            warnings.simplefilter("ignore", category=RuntimeWarning)
+            stds = np.sqrt(self.m2 / self.count)
+            mean_rates = self.rate_sum / self.rate_count
+            percentile_values = np.atleast_2d(np.nanpercentile(self.reservoir, percentiles, axis=0))
+
+        minimums, maximums = _to_json_values(self.min), _to_json_values(self.max)
+        means, stds = _to_json_values(np.where(self.count > 0, self.mean, np.nan)), _to_json_values(stds)
+        max_rates, mean_rates = _to_json_values(self.rate_max), _to_json_values(mean_rates)
+        percentile_rows = [_to_json_values(row) for row in percentile_values]
+
+        stats = {}
+        for i, field_name in enumerate(self.field_names):
+            stats[field_name] = {
+                "min": minimums[i],
+                "max": maximums[i],
+                "mean": means[i],
+                "std": stds[i],
+                "percentiles": {
+                    f"p{p:g}": percentile_rows[j][i] for j, p in enumerate(percentiles)
+                },
+                "rate_of_change": {
+                    "max_abs_per_s": max_rates[i],
+                    "mean_abs_per_s": mean_rates[i],
+                },
+                "count": int(self.count[i]),
+                "nan_count": int(self.nan_count[i]),
+                # exact while every valid value still fits in the reservoir
+                "percentiles_approximate": bool(self.seen[i] > RESERVOIR_SIZE),
+            }
+        return stats
+
+    def save(self, path: Path) -> str:
+        np.savez_compressed(path, fields=np.array(self.field_names, dtype=str),
+                            **{name: getattr(self, name) for name in self.ARRAYS})
+        return str(path)
+
+    @classmethod
+    def load(cls, path: Path) -> "StatsAccumulator":
+        with np.load(path, allow_pickle=False) as npz:
+            return cls([str(name) for name in npz["fields"]], {name: npz[name] for name in cls.ARRAYS})
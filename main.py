@@ -1,18 +1,40 @@
 # main.py - FastAPI backend to receive flight data
+import asyncio
 import csv
+import hashlib
+import logging
+import os
+import tempfile
+import time
 from backend.graph import Graph
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from backend.models import FlightDataRequest, ChatRequest
-from typing import Dict, Any, List
+from backend.services.alignment import get_alignment_cache, parse_field_ref
+from backend.services.dataflash import DEFAULT_MESSAGE_TYPES, read_dataflash
+from backend.services.data_processor import ColumnStoreBuilder, MessageColumns, TIME_FIELD, ingest_messages
+from backend.services.column_export import message_file_name
+from backend.services.conversation_store import get_conversation_store
+from backend.services.expressions import ExpressionError, evaluate_expression
+from backend.services.field_catalog import VEHICLES, get_field_catalog
+from backend.services.job_queue import Job, QueueFullError, get_job_queue
+from backend.services.metrics import HTTP_SECONDS, get_metrics_registry, server_timing, span, start_trace
+from backend.services.parallel import parallel_imap
+from backend.services.session_store import AppendConflictError, get_session_store
+from backend.utils.stats_calculator import calculate_message_stats
+from typing import Dict, Any, List, Optional, Tuple
 from datetime import datetime
 from pathlib import Path
 import json
 
-from collections import defaultdict
-from datetime import datetime
+logger = logging.getLogger(__name__)
 
+# add a Server-Timing header (total and per-span time) to every response
+TIMING_HEADER = os.getenv("TIMING_HEADER", "").lower() in ("1", "true", "yes")
+# uploads are written to disk in blocks of this size, each on a worker thread
+SPOOL_WRITE_BYTES = 1024 * 1024
 
 app = FastAPI(title="Flight Data Processor", version="1.0.0")
 counter = 0
@@ -25,6 +47,25 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def record_request_timing(request: Request, call_next):
+    """Start a trace per request and record its latency; streamed bodies count until the headers are sent."""
+    spans = start_trace()
+    start = time.perf_counter()
+    response = await call_next(request)
+    duration = time.perf_counter() - start
+
+    endpoint = request.scope.get("endpoint")
+    HTTP_SECONDS.observe(
+        duration,
+        method=request.method,
+        endpoint=endpoint.__name__ if endpoint is not None else "unmatched",
+        status=response.status_code
+    )
+    if TIMING_HEADER:
+        response.headers["Server-Timing"] = server_timing(spans, duration)
+    return response
+
 
 MESSAGE_DESCRIPTIONS = {
     "AHR2": "Attitude and heading reference data containing roll, pitch, yaw angles, altitude, position coordinates, and quaternion values for aircraft orientation",
@@ -39,6 +80,8 @@ MESSAGE_DESCRIPTIONS = {
     "XKF4[2]": "Extended Kalman Filter state data from instance 2"
 }
 
+ALLOWED_MESSAGE_TYPES = set(MESSAGE_DESCRIPTIONS.keys())
+
 FIELD_INFO = {
     # Time field (common across all messages)
     "time_boot_ms": {"description": "Timestamp in milliseconds since system boot", "units": "ms"},
@@ -102,33 +145,36 @@ FIELD_INFO = {
     "Instance": {"description": "instance number", "units": "instance"},
 }
 
-conversations = defaultdict(lambda: {
-    "messages": [],
-    "created_at": datetime.now().isoformat(),
-    "updated_at": datetime.now().isoformat(),
-})
-
 def get_or_create_conversation(conversation_id: str):
-    # Safe fetch - returns None if doesn't exist
-    conversation = conversations.get(conversation_id)
-    if conversation is None:
-        # Create new conversation explicitly
-        conversation = conversations[conversation_id]  
-    return conversation
+    # Returns the conversation with a bounded window of recent messages
+    return get_conversation_store().get_or_create(conversation_id)
 
 def add_message_to_conversation(conversation: Dict[str, Any], user_query: str, role: str):
 
-        # Add user message
+    # Messages are append-only in the store; keep the local copy in sync
+    get_conversation_store().append_message(conversation["id"], role, user_query)
     conversation["messages"].append({
         "role": role, 
         "content": user_query
     })
+    conversation["message_count"] = conversation.get("message_count", 0) + 1
     
     conversation["updated_at"] = datetime.now().isoformat()
     return conversation
 
+async def cancel_on_disconnect(task: asyncio.Task, http_request: Request, poll_interval: float = 0.5):
+    """Await a task, cancelling it if the client goes away first."""
+    while True:
+        done, _ = await asyncio.wait({task}, timeout=poll_interval)
+        if done:
+            return task.result()
+        if await http_request.is_disconnected():
+            task.cancel()
+            logger.debug("Client disconnected, cancelled graph run")
+            raise HTTPException(status_code=499, detail="Client disconnected")
+
 @app.post("/api/chat")
-async def chat(request: ChatRequest):
+async def chat(request: ChatRequest, http_request: Request):
 
     # retriever conversation ID from request 
     conversation_id = request.conversation_id
@@ -144,14 +190,46 @@ async def chat(request: ChatRequest):
     
     graph = Graph(
         conversation = conversation,
-        data = {}
+        data = {"flight_id": request.flight_id}
     )
 
-    # run agent
-    final_state = await graph.run()
-    breakpoint()
+    # run agent without blocking the event loop
+    final_state = await cancel_on_disconnect(asyncio.create_task(graph.arun()), http_request)
+    add_message_to_conversation(conversation, get_reply(final_state), "assistant")
     return final_state
 
+def get_reply(final_state: Dict[str, Any]) -> str:
+    """The assistant's answer in a final graph state, kept in the history for follow-up questions."""
+    return final_state.get("analysis") or final_state.get("clarification_question") or ""
+
+def format_sse(event: Dict[str, Any]) -> str:
+    """Format a graph event as a Server-Sent Event."""
+    return f"event: {event['event']}\ndata: {json.dumps(event, default=str)}\n\n"
+
+@app.post("/api/chat/stream")
+async def chat_stream(request: ChatRequest, http_request: Request):
+    """Stream validator/analyzer progress and LLM tokens as Server-Sent Events."""
+
+    conversation = get_or_create_conversation(request.conversation_id)
+    conversation = add_message_to_conversation(conversation, request.user_query, "user")
+
+    graph = Graph(
+        conversation = conversation,
+        data = {"flight_id": request.flight_id}
+    )
+
+    async def event_stream():
+        async for event in graph.astream_events():
+            if await http_request.is_disconnected():
+                # closing the generator cancels the graph run
+                logger.debug("Client disconnected, stopping stream")
+                return
+            if event["event"] == "final":
+                add_message_to_conversation(conversation, get_reply(event["state"] or {}), "assistant")
+            yield format_sse(event)
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
 def is_valid_message_type(msg_type: str) -> bool:
     """Check if message type is valid."""
     return msg_type in ALLOWED_MESSAGE_TYPES
@@ -180,37 +258,35 @@ def has_gps_fields(msg_data: Dict[str, Any]) -> bool:
     gps_fields = ["SV", "HDop", "VDop"]
     return any(field in msg_data for field in gps_fields)
 
-def get_numeric_fields(msg_data: Dict[str, Any]) -> List[str]:
+def get_numeric_fields(msg_data: MessageColumns) -> List[str]:
     """Get all fields that are numeric arrays with same length as time data."""
-    time_length = len(msg_data['time_boot_ms'])
-    return [
-        field_name for field_name, field_data in msg_data.items()
-        if (isinstance(field_data, list) and 
-            len(field_data) == time_length and
-            all(isinstance(x, (int, float)) and x is not None for x in field_data))
-    ]
+    # column types are detected once at ingest, so this is just a lookup
+    return msg_data.numeric_fields
 
-def get_message_description(msg_type: str) -> str:
+def get_message_description(msg_type: str, vehicle: Optional[str] = None) -> str:
     """Get description for a message type."""
-    return MESSAGE_DESCRIPTIONS.get(msg_type, f"MAVLink message type {msg_type} telemetry data")
+    if msg_type in MESSAGE_DESCRIPTIONS:
+        return MESSAGE_DESCRIPTIONS[msg_type]
+    description = get_field_catalog(vehicle).message_description(msg_type)
+    return description or f"MAVLink message type {msg_type} telemetry data"
 
-def get_field_info(field_name: str) -> Dict[str, str]:
+def get_field_info(field_name: str, msg_type: Optional[str] = None, vehicle: Optional[str] = None) -> Dict[str, str]:
     """Get description and units for a field."""
-    return FIELD_INFO.get(field_name, {
-        "description": f"Data field {field_name}",
+    # Hand-written entries carry units, which the ArduPilot XML docs don't
+    if field_name in FIELD_INFO:
+        return FIELD_INFO[field_name]
+    description = get_field_catalog(vehicle).field_description(field_name, msg_type)
+    return {
+        "description": description or f"Data field {field_name}",
         "units": "unknown"
-    })
+    }
 
-def create_csv_for_message_type(msg_type: str, msg_data: Dict[str, Any], output_dir: Path, timestamp: str) -> str:
+def create_csv_for_message_type(msg_type: str, msg_data: MessageColumns, output_dir: Path, timestamp: str) -> str:
     """Export timeseries data for a message type to CSV."""
-    filename = output_dir / f"timeseries_{msg_type.replace('[', '_').replace(']', '')}_{timestamp}.csv"
+    filename = output_dir / f"timeseries_{message_file_name(msg_type)}_{timestamp}.csv"
     
-    # Get all fields with same length as time data
-    time_length = len(msg_data['time_boot_ms'])
-    valid_fields = [
-        field_name for field_name, field_data in msg_data.items()
-        if isinstance(field_data, list) and len(field_data) == time_length
-    ]
+    # All columns in the store share the length of the time data
+    valid_fields = msg_data.field_names
     
     with open(filename, 'w', newline='') as csvfile:
         writer = csv.writer(csvfile)
@@ -218,36 +294,47 @@ def create_csv_for_message_type(msg_type: str, msg_data: Dict[str, Any], output_
         # Write header
         writer.writerow(valid_fields)
         
-        # Write data rows
-        for i in range(time_length):
-            row = [msg_data[field][i] for field in valid_fields]
-            writer.writerow(row)
+        # Write data rows, column-wise conversion instead of per-cell indexing
+        writer.writerows(zip(*(msg_data[field].tolist() for field in valid_fields)))
     
     return str(filename)
 
-def create_message_metadata(msg_type: str, msg_data: Dict[str, Any]) -> Dict[str, Any]:
-    """Create metadata for a message type without timeseries data."""
-    time_data = msg_data['time_boot_ms']
+def append_csv_rows(filename: str, msg_data: MessageColumns, start: int) -> str:
+    """Append samples [start:] of a message type to its existing CSV export."""
+    with open(filename, 'a', newline='') as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerows(zip(*(msg_data[field][start:].tolist() for field in msg_data.field_names)))
+    return filename
+
+def create_message_metadata(
+    msg_type: str,
+    msg_data: MessageColumns,
+    vehicle: Optional[str] = None,
+    field_stats: Optional[Dict[str, Dict[str, Any]]] = None
+) -> Dict[str, Any]:
+    """Create metadata for a message type without timeseries data; field_stats skips the statistics pass."""
+    time_data = msg_data.time
     data_length = len(time_data)
     numeric_fields = get_numeric_fields(msg_data)
     
-    # Calculate field statistics
+    # Calculate statistics for all numeric fields in one pass over a 2-D array
+    stat_fields = [field_name for field_name in numeric_fields if field_name != TIME_FIELD]
+    if field_stats is None:
+        field_stats = calculate_message_stats(time_data, msg_data.numeric_matrix(stat_fields), stat_fields)
+
     fields_info = {}
-    for field_name in numeric_fields:
-        if field_name != 'time_boot_ms':  # Skip time field for stats
-            field_info = get_field_info(field_name)
-            stats = calculate_field_stats([float(x) for x in msg_data[field_name]])
-            
-            fields_info[field_name] = {
-                "description": field_info["description"],
-                "units": field_info["units"],
-                **stats
-            }
+    for field_name in stat_fields:
+        field_info = get_field_info(field_name, msg_type, vehicle)
+        fields_info[field_name] = {
+            "description": field_info["description"],
+            "units": field_info["units"],
+            **field_stats[field_name]
+        }
     
     # Base metadata structure
     metadata = {
         "message_type": msg_type,
-        "description": get_message_description(msg_type),
+        "description": get_message_description(msg_type, vehicle),
         "data_points": data_length,
         "time_range": {
             "start_ms": float(time_data[0]),
@@ -259,66 +346,425 @@ def create_message_metadata(msg_type: str, msg_data: Dict[str, Any]) -> Dict[str
     
     return metadata
             
-def process_messages(messages: Dict[str, Any]) -> Dict[str, Any]:
+def process_messages(messages: Dict[str, Any], vehicle: Optional[str] = None, flight_id: Optional[str] = None) -> Dict[str, Any]:
     """Process all valid messages and return metadata with CSV file paths."""
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    output_dir = Path("flight_data_exports")
-    output_dir.mkdir(exist_ok=True)
-    
+    valid_messages = {}
     for msg_type, msg_data in messages.items():
         if not is_valid_message_type(msg_type) or not is_valid_message_data(msg_data):
-            print(f"Skipping message type '{msg_type}")
+            logger.info(f"Skipping message type '{msg_type}'")
             continue
-        
-        # Export timeseries to CSV
-        csv_filename = create_csv_for_message_type(msg_type, msg_data, output_dir, timestamp)
+        valid_messages[msg_type] = msg_data
+
+    # Convert lists to typed column arrays once; every later stage reads these
+    with span("ingest", "ingest_messages"):
+        store = ingest_messages(valid_messages)
+    return process_columns(store, vehicle, flight_id=flight_id)
+
+def process_message_type(task: Tuple[str, str, str, str, Optional[str], Optional[Dict[str, Any]]]) -> Dict[str, Any]:
+    """Write the CSV and build the metadata of one message type of a stored flight.
+
+    Takes only keys so it can run in a worker process; the columns are
+    memory-mapped from the session rather than copied between processes.
+    With the metadata from before an append, only the new samples are
+    written and the statistics come from the session's merged accumulator.
+    """
+    flight_id, msg_type, output_dir, timestamp, vehicle, previous = task
+    session = get_session_store().get(flight_id)
+    msg_data = session.get_columns(msg_type)
+
+    if previous is not None and previous["data_points"] == len(msg_data):
+        # nothing was appended to this message type
+        return previous
+    appending = previous is not None and Path(previous["timeseries_csv"]).exists()
+
+    # Export timeseries to CSV
+    with span("ingest", "export_csv", message_type=msg_type):
+        if appending:
+            csv_filename = append_csv_rows(previous["timeseries_csv"], msg_data, previous["data_points"])
+        else:
+            csv_filename = create_csv_for_message_type(msg_type, msg_data, Path(output_dir), timestamp)
+
+    # Create metadata (without timeseries)
+    with span("ingest", "message_metadata", message_type=msg_type):
+        field_stats = session.get_stats(msg_type).to_stats() if previous is not None else None
+        metadata = create_message_metadata(msg_type, msg_data, vehicle, field_stats)
+    metadata["timeseries_csv"] = csv_filename
+    metadata["columns_manifest"] = str(session.manifest_path(msg_type))
+    metadata["summary_pyramid"] = str(session.pyramid_path(msg_type))
+
+    logger.info(f"Processed {msg_type}: {len(msg_data)} data points -> {csv_filename}")
+    return metadata
 
-        # Create metadata (without timeseries)
-        processed_data["message_types"][msg_type] = create_message_metadata(msg_type, msg_data)
-        
-        print(f"Processed {msg_type}: {len(msg_data['time_boot_ms'])} data points -> {csv_filename}")
-    
+def read_previous_metadata(session: Any) -> Dict[str, Any]:
+    """Per-message-type metadata of a flight from before an append, if it was written."""
+    try:
+        return session.read_metadata()["message_types"]
+    except FileNotFoundError:
+        return {}
+
+def process_columns(
+    store: Dict[str, MessageColumns],
+    vehicle: Optional[str] = None,
+    job: Optional[Job] = None,
+    flight_id: Optional[str] = None
+) -> Dict[str, Any]:
+    """Export and summarize an ingested column store, reporting per-message-type progress to job.
+
+    The store is appended to flight_id, or to the stored flight it is a
+    re-upload of; then only the new samples of each message type are processed.
+    """
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    output_dir = Path("flight_data_exports")
+    output_dir.mkdir(exist_ok=True)
+
+    # an unknown vehicle fails here, before anything is written
+    vehicle_name = get_field_catalog(vehicle).vehicle
+
+    # Store the timeseries as a flight session of memory-mappable .npy columns
+    if job is not None:
+        job.set_stage("exporting")
+    with span("ingest", "create_session"):
+        session, previous_lengths = get_session_store().ingest(store, flight_id)
+    previous_metadata = read_previous_metadata(session) if previous_lengths is not None else {}
+
+    processed_data = {
+        "flight_id": session.flight_id,
+        "revision": session.revision,
+        "vehicle": vehicle_name,
+        "generated_timestamp": timestamp,
+        "columns_dir": str(session.session_dir),
+        "message_types": {}
+    }
+
+    # Message types are independent; INGEST_WORKERS / INGEST_EXECUTOR pick the pool,
+    # and results come back in session order whatever finishes first
+    if job is not None:
+        job.set_stage("summarizing")
+        for msg_type in session.message_types:
+            job.update_progress(msg_type, "pending")
+    tasks = [
+        (session.flight_id, msg_type, str(output_dir), timestamp, vehicle, previous_metadata.get(msg_type))
+        for msg_type in session.message_types
+    ]
+    with span("ingest", "summarize", message_types=len(tasks)):
+        for (_, msg_type, *_), metadata in zip(tasks, parallel_imap(process_message_type, tasks)):
+            processed_data["message_types"][msg_type] = metadata
+            if job is not None:
+                job.update_progress(msg_type, "done")
+
+    session.write_metadata(processed_data)
     return processed_data
 
+def require_vehicle(vehicle: Optional[str]) -> None:
+    """400 unless vehicle is None (the default catalog) or a known vehicle type."""
+    if vehicle is not None and vehicle.lower() not in VEHICLES:
+        raise HTTPException(status_code=400, detail=f"Unknown vehicle type {vehicle}; expected one of {', '.join(VEHICLES)}")
+
+def require_flight(flight_id: Optional[str]) -> None:
+    """404 unless flight_id is None (a new flight) or a stored flight to append to."""
+    if flight_id is not None and not get_session_store().exists(flight_id):
+        raise HTTPException(status_code=404, detail=f"Unknown flight {flight_id}")
+
+async def spool_upload(request: Request, suffix: str, content_hash: Optional[Any] = None) -> str:
+    """Write the request body to a temporary file without blocking the event loop; returns its path.
+
+    Chunks are collected into SPOOL_WRITE_BYTES blocks, which are hashed
+    into content_hash (if given) and written on a worker thread.
+    """
+    def write(data: bytes) -> None:
+        if content_hash is not None:
+            content_hash.update(data)
+        f.write(data)
+
+    f = tempfile.NamedTemporaryFile(suffix=suffix, delete=False)
+    try:
+        pending: List[bytes] = []
+        pending_size = 0
+        async for chunk in request.stream():
+            pending.append(chunk)
+            pending_size += len(chunk)
+            if pending_size >= SPOOL_WRITE_BYTES:
+                await asyncio.to_thread(write, b"".join(pending))
+                pending, pending_size = [], 0
+        await asyncio.to_thread(write, b"".join(pending))
+    except BaseException:
+        # e.g. the client disconnected mid-upload
+        f.close()
+        os.remove(f.name)
+        raise
+    f.close()
+    return f.name
+
 @app.post("/api/process-flight-data")
 async def process_flight_data(data: FlightDataRequest):
-   
-    print("=" * 50)
-    print("PROCESSING FLIGHT DATA")
-    print("=" * 50)
+    logger.info("Processing flight data")
+    require_vehicle(data.vehicle)
+    require_flight(data.flight_id)
 
     try:
 
         messages = data.messages
-        message_types = messages.keys()
-        message_date = messages.values()
-
-        dicto = {
-            "timestamp": x, 
-            "data": {
-                "Roll": x,
-                "Desired Roll": y,
-            }
-        }
         
-        # Process messages
-        processed_data = process_messages(messages)
+        # Process messages in a worker thread, so other requests are served meanwhile
+        processed_data = await asyncio.to_thread(process_messages, messages, data.vehicle, data.flight_id)
         
         # Export metadata to JSON
-        json_filename = export_metadata_to_json(processed_data)
+        with span("ingest", "export_metadata"):
+            json_filename = export_metadata_to_json(processed_data)
         
         # Log results
         valid_types = list(processed_data["message_types"].keys())
 
-        return True
+        return {
+            "status": "success",
+            "flight_id": processed_data["flight_id"],
+            "metadata_file": json_filename,
+            "message_types": valid_types
+        }
         
+    except AppendConflictError as e:
+        raise HTTPException(status_code=409, detail=str(e))
     except Exception as e:
-        print(f"ERROR processing flight data: {str(e)}")
+        logger.error(f"Error processing flight data: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
     
 
+@app.post("/api/process-flight-data/stream")
+async def process_flight_data_stream(request: Request, vehicle: Optional[str] = None, flight_id: Optional[str] = None):
+    """Ingest a flight log uploaded as NDJSON chunks, one message type chunk per line; flight_id appends to a stored flight."""
+    logger.info("Streaming flight data")
+    require_vehicle(vehicle)
+    require_flight(flight_id)
+
+    # chunks beyond INGEST_BUFFER_MB are spilled here, and the built columns are memory maps of
+    # those files, so the directory lives until the session has been written
+    with tempfile.TemporaryDirectory(prefix="ingest_") as spill_dir:
+        builder = ColumnStoreBuilder(allowed_types=ALLOWED_MESSAGE_TYPES, spill_dir=Path(spill_dir))
+        try:
+            # Each chunk is parsed into typed columns as it arrives, off the event loop
+            with span("ingest", "parse_stream"):
+                async for chunk in request.stream():
+                    await asyncio.to_thread(builder.feed, chunk)
+                await asyncio.to_thread(builder.close)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+        try:
+            store = await asyncio.to_thread(builder.build)
+            processed_data = await asyncio.to_thread(process_columns, store, vehicle, flight_id=flight_id)
+            with span("ingest", "export_metadata"):
+                json_filename = export_metadata_to_json(processed_data)
+            valid_types = list(processed_data["message_types"].keys())
+
+            return {
+                "status": "success",
+                "flight_id": processed_data["flight_id"],
+                "metadata_file": json_filename,
+                "message_types": valid_types,
+                "skipped_message_types": sorted(builder.skipped_types)
+            }
+
+        except AppendConflictError as e:
+            raise HTTPException(status_code=409, detail=str(e))
+        except Exception as e:
+            logger.error(f"Error processing flight data: {e}")
+            raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/api/process-flight-data/bin")
+async def process_flight_data_bin(request: Request, vehicle: Optional[str] = None, flight_id: Optional[str] = None):
+    """Ingest a raw DataFlash .bin log sent as the request body, without the Node parser; flight_id appends to a stored flight."""
+    logger.info("Processing DataFlash log")
+    require_vehicle(vehicle)
+    require_flight(flight_id)
+
+    # spool the upload to disk so the parser can memory-map it
+    bin_path = await spool_upload(request, ".bin")
+
+    try:
+        with span("ingest", "read_dataflash"):
+            store = await asyncio.to_thread(read_dataflash, bin_path, DEFAULT_MESSAGE_TYPES)
+        skipped_types = sorted(msg_type for msg_type in store if not is_valid_message_type(msg_type))
+        store = {msg_type: msg_data for msg_type, msg_data in store.items() if is_valid_message_type(msg_type)}
+
+        processed_data = await asyncio.to_thread(process_columns, store, vehicle, flight_id=flight_id)
+        with span("ingest", "export_metadata"):
+            json_filename = export_metadata_to_json(processed_data)
+
+        return {
+            "status": "success",
+            "flight_id": processed_data["flight_id"],
+            "metadata_file": json_filename,
+            "message_types": list(processed_data["message_types"].keys()),
+            "skipped_message_types": skipped_types
+        }
+
+    except AppendConflictError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error processing DataFlash log: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        os.remove(bin_path)
+
+def run_processing_job(job: Job, upload_path: str, upload_format: str, vehicle: Optional[str],
+                       flight_id: Optional[str] = None) -> Dict[str, Any]:
+    """Background job body: parse an uploaded log and run the processing pipeline."""
+    try:
+        job.set_stage("parsing")
+        if upload_format == "bin":
+            with span("ingest", "read_dataflash"):
+                store = read_dataflash(upload_path, DEFAULT_MESSAGE_TYPES)
+            store = {msg_type: msg_data for msg_type, msg_data in store.items() if is_valid_message_type(msg_type)}
+        else:
+            with span("ingest", "ingest_messages"):
+                with open(upload_path, 'rb') as f:
+                    data = FlightDataRequest(**json.load(f))
+                vehicle = vehicle or data.vehicle
+                flight_id = flight_id or data.flight_id
+                store = ingest_messages({
+                    msg_type: msg_data for msg_type, msg_data in data.messages.items()
+                    if is_valid_message_type(msg_type) and is_valid_message_data(msg_data)
+                })
+
+        processed_data = process_columns(store, vehicle, job, flight_id)
+        return {
+            "flight_id": processed_data["flight_id"],
+            "metadata_file": export_metadata_to_json(processed_data),
+            "message_types": list(processed_data["message_types"].keys())
+        }
+    finally:
+        os.remove(upload_path)
+
+@app.post("/api/jobs", status_code=202)
+async def submit_processing_job(request: Request, format: str = "json", vehicle: Optional[str] = None,
+                                flight_id: Optional[str] = None):
+    """Queue a flight log for background processing; the body is FlightDataRequest JSON or, with format=bin, a DataFlash log."""
+    if format not in ("json", "bin"):
+        raise HTTPException(status_code=400, detail="format must be 'json' or 'bin'")
+    require_vehicle(vehicle)
+    require_flight(flight_id)
+
+    job_queue = get_job_queue()
+    try:
+        # refuse before reading the body, so a full queue doesn't still take uploads
+        job_queue.check_capacity()
+    except QueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "30"})
+
+    # spool and hash the upload in one pass
+    content_hash = hashlib.sha256()
+    upload_path = await spool_upload(request, f".{format}", content_hash)
+
+    try:
+        # the same log processed as another vehicle or appended to another flight is a different job
+        job_key = ":".join(part for part in (content_hash.hexdigest(), vehicle and vehicle.lower(), flight_id) if part)
+        job, created = job_queue.submit(
+            job_key,
+            lambda job: run_processing_job(job, upload_path, format, vehicle, flight_id)
+        )
+    except QueueFullError as e:
+        os.remove(upload_path)
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "30"})
+
+    if not created:
+        # same log as an earlier upload; the existing job already has (or will have) the result
+        os.remove(upload_path)
+    return {**job.to_dict(), "deduplicated": not created}
+
+@app.get("/api/jobs/{job_id}")
+async def get_processing_job(job_id: str):
+    """Status, per-message-type progress and, once finished, the result of a processing job."""
+    try:
+        return get_job_queue().get(job_id).to_dict()
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+# the flight endpoints read memory-mapped columns and run NumPy, so they are plain
+# functions that FastAPI runs in its thread pool rather than on the event loop
+@app.get("/api/flights")
+def list_flights():
+    return get_session_store().list_sessions()
+
+@app.get("/api/flights/{flight_id}/query")
+def query_flight(flight_id: str, message_type: str, field: str, start_ms: Optional[float] = None, end_ms: Optional[float] = None):
+    """Return one field of a stored flight between start_ms and end_ms."""
+    try:
+        session = get_session_store().get(flight_id)
+        time_data, values = session.query(message_type, field, start_ms, end_ms)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+    return {
+        "flight_id": flight_id,
+        "message_type": message_type,
+        "field": field,
+        TIME_FIELD: time_data.tolist(),
+        field: values.tolist()
+    }
+
+@app.get("/api/flights/{flight_id}/stats")
+def flight_range_stats(flight_id: str, message_type: str, field: str, start_ms: Optional[float] = None, end_ms: Optional[float] = None):
+    """Min/max/mean/count of one field between start_ms and end_ms, answered from the summary pyramid."""
+    try:
+        stats = get_session_store().get(flight_id).range_stats(message_type, field, start_ms, end_ms)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+    return {
+        "flight_id": flight_id,
+        "message_type": message_type,
+        "field": field,
+        "start_ms": start_ms,
+        "end_ms": end_ms,
+        **stats
+    }
+
+@app.get("/api/flights/{flight_id}/expression")
+def evaluate_flight_expression(flight_id: str, expression: str):
+    """Evaluate a mavgraphs.xml style expression, e.g. degrees(ATT.Roll), over a stored flight."""
+    try:
+        session = get_session_store().get(flight_id)
+        time_data, values = evaluate_expression(expression, session)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ExpressionError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return {
+        "flight_id": flight_id,
+        "expression": expression,
+        TIME_FIELD: time_data.tolist(),
+        "values": values.tolist()
+    }
+
+@app.get("/api/flights/{flight_id}/aligned")
+def align_flight_fields(flight_id: str, fields: str, rate_hz: Optional[float] = None, method: str = "linear",
+                              start_ms: Optional[float] = None, end_ms: Optional[float] = None,
+                              tolerance_ms: Optional[float] = None):
+    """Join comma-separated MSG.field columns onto one clock, e.g. fields=ATT.Roll,ATT.DesRoll,GPS[0].Spd."""
+    try:
+        field_refs = [parse_field_ref(ref.strip()) for ref in fields.split(",") if ref.strip()]
+        session = get_session_store().get(flight_id)
+        frame = get_alignment_cache().align(session, field_refs, rate_hz, method, start_ms, end_ms, tolerance_ms)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return {
+        "flight_id": flight_id,
+        "method": method,
+        "rate_hz": rate_hz,
+        **frame.to_dict()
+    }
+
+@app.get("/api/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus text exposition of request, graph node, ingest stage and LLM latency histograms and token counts."""
+    return PlainTextResponse(get_metrics_registry().render(), media_type="text/plain; version=0.0.4")
+
 @app.get("/api/health")
 async def health_check():
     return {"status": "healthy", "message": "Flight data processor is running"}
@@ -48,7 +48,11 @@ class BinFileProcessor {
             
             // Write results to output file
             console.log(`Writing results to: ${outputPath}`);
-            fs.writeFileSync(outputPath, JSON.stringify(results, null, 2));
+            if (outputPath.toLowerCase().endsWith('.ndjson')) {
+                this.writeNdjson(results.messages, outputPath);
+            } else {
+                fs.writeFileSync(outputPath, JSON.stringify(results, null, 2));
+            }
             
             console.log('Processing complete!');
             
@@ -58,6 +62,27 @@ class BinFileProcessor {
         }
     }
 
+    // One line per chunk of a message type, for /api/process-flight-data/stream
+    writeNdjson(messages, outputPath, chunkSize = 10000) {
+        const fd = fs.openSync(outputPath, 'w');
+        try {
+            for (const [type, fields] of Object.entries(messages)) {
+                const length = fields.time_boot_ms ? fields.time_boot_ms.length : 0;
+                for (let start = 0; start < length; start += chunkSize) {
+                    const chunk = {};
+                    for (const [name, values] of Object.entries(fields)) {
+                        if (values && values.length === length) {
+                            chunk[name] = Array.from(values.slice(start, start + chunkSize));
+                        }
+                    }
+                    fs.writeSync(fd, JSON.stringify({ type, fields: chunk }) + '\n');
+                }
+            }
+        } finally {
+            fs.closeSync(fd);
+        }
+    }
+
     getParserResults() {
         if (!this.parser) {
             return null;
@@ -84,6 +109,7 @@ async function main() {
         console.log('Examples:');
         console.log('  node process-bin-file.js flight.bin');
         console.log('  node process-bin-file.js flight.bin results.json');
+        console.log('  node process-bin-file.js flight.bin results.ndjson');
         process.exit(1);
     }
     
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# the backend is imported as a package from the repository root, as main.py does
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
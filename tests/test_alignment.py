@@ -0,0 +1,109 @@
+import numpy as np
+import pytest
+
+from backend.services import alignment
+from backend.services.alignment import AlignmentCache, align_columns, build_clock, parse_field_ref, resample
+from backend.services.data_processor import MessageColumns
+
+TIME = np.array([0.0, 10.0, 20.0, 50.0])
+VALUES = np.array([0.0, 1.0, 2.0, 5.0])
+
+
+def test_linear():
+    result = resample(np.array([-5.0, 5.0, 35.0, 60.0]), TIME, VALUES, "linear")
+    np.testing.assert_array_equal(result, [np.nan, 0.5, 3.5, np.nan])
+
+
+def test_linear_tolerance_skips_gaps():
+    result = resample(np.array([5.0, 35.0]), TIME, VALUES, "linear", tolerance_ms=15.0)
+    np.testing.assert_array_equal(result, [0.5, np.nan])
+
+
+def test_asof():
+    result = resample(np.array([-1.0, 10.0, 19.0, 49.0]), TIME, VALUES, "asof")
+    np.testing.assert_array_equal(result, [np.nan, 1.0, 1.0, 2.0])
+    result = resample(np.array([19.0, 49.0]), TIME, VALUES, "asof", tolerance_ms=5.0)
+    np.testing.assert_array_equal(result, [np.nan, np.nan])
+
+
+def test_nearest():
+    result = resample(np.array([4.0, 6.0, 36.0, 100.0]), TIME, VALUES, "nearest")
+    np.testing.assert_array_equal(result, [0.0, 1.0, 5.0, 5.0])
+    result = resample(np.array([100.0]), TIME, VALUES, "nearest", tolerance_ms=10.0)
+    np.testing.assert_array_equal(result, [np.nan])
+
+
+def test_unknown_method():
+    with pytest.raises(ValueError):
+        resample(TIME, TIME, VALUES, "cubic")
+
+
+def test_clock_is_the_overlap_of_the_series():
+    clock = build_clock([np.array([0.0, 10.0, 20.0, 30.0]), np.array([5.0, 25.0, 40.0])])
+    np.testing.assert_array_equal(clock, [5.0, 10.0, 20.0, 25.0, 30.0])
+    np.testing.assert_array_equal(build_clock([TIME], rate_hz=100.0), np.arange(0.0, 51.0, 10.0))
+
+
+@pytest.mark.parametrize("rate_hz", [0.0, -1.0, float("nan")])
+def test_clock_rate_must_be_positive(rate_hz):
+    with pytest.raises(ValueError):
+        build_clock([TIME], rate_hz=rate_hz)
+
+
+@pytest.mark.parametrize("rate_hz", [1e9, float("inf")])
+def test_clock_points_are_capped(monkeypatch, rate_hz):
+    monkeypatch.setattr(alignment, "MAX_CLOCK_POINTS", 1000)
+    with pytest.raises(ValueError, match="limit"):
+        build_clock([TIME], rate_hz=rate_hz)
+
+
+@pytest.fixture
+def store():
+    return {
+        "ATT": MessageColumns("ATT", {"time_boot_ms": TIME, "Roll": VALUES}),
+        "GPS[0]": MessageColumns("GPS[0]", {"time_boot_ms": np.array([0.0, 50.0]), "Spd": np.array([0.0, 10.0])}),
+    }
+
+
+def test_align_columns(store):
+    frame = align_columns(store, [parse_field_ref("ATT.Roll"), parse_field_ref("GPS[0].Spd")])
+    np.testing.assert_array_equal(frame.time, TIME)
+    np.testing.assert_array_equal(frame["GPS[0].Spd"], [0.0, 2.0, 4.0, 10.0])
+    with pytest.raises(KeyError):
+        align_columns(store, [("ATT", "Pitch")])
+
+
+class FakeSession:
+    def __init__(self, store):
+        self.flight_id, self.revision, self.store = "flight", 0, store
+
+    def get_columns(self, msg_type):
+        return self.store[msg_type]
+
+
+def test_cache_is_keyed_on_the_revision(store):
+    session, cache = FakeSession(store), AlignmentCache()
+    frame = cache.align(session, [("ATT", "Roll")])
+    assert cache.align(session, [("ATT", "Roll")]) is frame
+    session.revision += 1
+    assert cache.align(session, [("ATT", "Roll")]) is not frame
+
+
+def test_cache_is_bounded_by_bytes(store):
+    session = FakeSession(store)
+    roll = [("ATT", "Roll")]
+    frame_bytes = align_columns(session, roll).nbytes
+    cache = AlignmentCache(max_bytes=2 * frame_bytes)
+    first = cache.align(session, roll)
+    cache.align(session, roll, method="asof")
+    cache.align(session, roll, method="nearest")
+    assert cache.nbytes == 2 * frame_bytes
+    # the least recently used frame was evicted
+    assert cache.align(session, roll) is not first
+
+    # a frame larger than the whole cache is returned but not kept
+    wide = [("ATT", "Roll"), ("GPS[0]", "Spd")]
+    assert cache.align(session, wide, rate_hz=1000.0) is not cache.align(session, wide, rate_hz=1000.0)
+    assert cache.nbytes == 2 * frame_bytes
+    cache.invalidate(session.flight_id)
+    assert cache.nbytes == 0
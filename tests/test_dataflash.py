@@ -0,0 +1,111 @@
+import struct
+
+import numpy as np
+import pytest
+
+from backend.services.dataflash import FMT_TYPE, HEAD1, HEAD2, MessageFormat, read_dataflash, read_dataflash_buffer
+
+ATT = MessageFormat(1, 0, "ATT", "QccI", ["TimeUS", "Roll", "Pitch", "Flags"])
+GPS = MessageFormat(2, 0, "GPS", "QBLf", ["TimeUS", "I", "Lat", "Alt"])
+MSG = MessageFormat(3, 0, "MSG", "QZ", ["TimeUS", "Message"])
+FMTU = MessageFormat(4, 0, "FMTU", "QBNN", ["TimeUS", "FmtType", "UnitIds", "MultIds"])
+PARM = MessageFormat(5, 0, "PARM", "Nf", ["Name", "Value"])
+
+
+def fmt_record(fmt):
+    body = struct.pack("<BB4s16s64s", fmt.msg_id, fmt.dtype.itemsize + 3, fmt.name.encode(),
+                       fmt.format_chars.encode(), ",".join(fmt.columns).encode())
+    return bytes([HEAD1, HEAD2, FMT_TYPE]) + body
+
+
+def record(fmt, *values):
+    return bytes([HEAD1, HEAD2, fmt.msg_id]) + np.array([values], dtype=fmt.dtype).tobytes()
+
+
+def log(*records):
+    return np.frombuffer(b"".join(records), dtype=np.uint8)
+
+
+def att_records(n):
+    return [record(ATT, 1000 * (i + 1), 100 * i, -50, 0) for i in range(n)]
+
+
+def test_decodes_scaled_fields_and_time():
+    store = read_dataflash_buffer(log(fmt_record(ATT), *att_records(3)))
+    att = store["ATT"]
+    np.testing.assert_array_equal(att.time, [1.0, 2.0, 3.0])
+    np.testing.assert_allclose(att["Roll"], [0.0, 1.0, 2.0])
+    np.testing.assert_allclose(att["Pitch"], [-0.5, -0.5, -0.5])
+    assert att["Flags"].dtype == np.uint32
+
+
+def test_decodes_strings_and_lat_lng():
+    store = read_dataflash_buffer(log(
+        fmt_record(MSG), fmt_record(GPS),
+        record(MSG, 1000, b"ArduCopter V4.5"),
+        record(GPS, 2000, 0, -353632610, 584.5),
+    ))
+    assert list(store["MSG"]["Message"]) == ["ArduCopter V4.5"]
+    np.testing.assert_allclose(store["GPS"]["Lat"], [-35.363261])
+
+
+def test_instance_field_from_fmtu_splits_messages():
+    store = read_dataflash_buffer(log(
+        fmt_record(FMTU), fmt_record(GPS),
+        record(FMTU, 0, GPS.msg_id, b"s#DU", b"F-GG"),
+        record(GPS, 1000, 0, 0, 10.0),
+        record(GPS, 1000, 1, 0, 20.0),
+        record(GPS, 2000, 0, 0, 11.0),
+    ))
+    assert "GPS" not in store
+    np.testing.assert_array_equal(store["GPS[0]"]["Alt"], [10.0, 11.0])
+    np.testing.assert_array_equal(store["GPS[1]"]["Alt"], [20.0])
+
+
+def test_resyncs_after_garbage_and_header_bytes_in_payloads():
+    # 0x95A3 packs to A3 95 00 00, a header pattern inside the Flags field; message id 0x63 has no FMT
+    records = [record(ATT, 1000 * (i + 1), 0, 0, 0x95A3) for i in range(4)]
+    store = read_dataflash_buffer(log(
+        b"\x00\xa3\x95\x07garbage", fmt_record(ATT), records[0], records[1], b"\xa3\x95\x63\xff", records[2], records[3],
+    ))
+    np.testing.assert_array_equal(store["ATT"].time, [1.0, 2.0, 3.0, 4.0])
+    np.testing.assert_array_equal(store["ATT"]["Flags"], [0x95A3] * 4)
+
+
+def test_truncated_last_record_is_dropped():
+    data = b"".join([fmt_record(ATT), *att_records(3)])
+    store = read_dataflash_buffer(np.frombuffer(data[:-4], dtype=np.uint8))
+    assert len(store["ATT"]) == 2
+
+
+def test_header_patterns_in_a_garbage_tail_are_skipped():
+    junk_att = bytes([HEAD1, HEAD2, ATT.msg_id]) + b"\xff" * ATT.dtype.itemsize
+    # a complete-looking ATT record that doesn't end at a header or the end of the log,
+    # then one that would run past the end of the log
+    tail = junk_att + b"\x01\x02\x03" + junk_att[:10]
+    store = read_dataflash_buffer(log(fmt_record(ATT), *att_records(3), tail))
+    np.testing.assert_array_equal(store["ATT"].time, [1.0, 2.0, 3.0])
+
+
+def test_header_patterns_in_a_truncated_record_are_skipped():
+    # 0x0195A3 packs to A3 95 01 00: an ATT header inside the Flags field of the cut-off last record
+    data = b"".join([fmt_record(ATT), *att_records(3), record(ATT, 4000, 0, 0, 0x0195A3)])
+    store = read_dataflash_buffer(np.frombuffer(data[:-1], dtype=np.uint8))
+    np.testing.assert_array_equal(store["ATT"].time, [1.0, 2.0, 3.0])
+
+
+def test_message_type_filter_and_messages_without_time():
+    buf = log(fmt_record(ATT), fmt_record(MSG), fmt_record(PARM), *att_records(2),
+              record(MSG, 1000, b"hello"), record(PARM, b"SYSID", 1.0))
+    assert list(read_dataflash_buffer(buf, ["MSG"])) == ["MSG"]
+    assert sorted(read_dataflash_buffer(buf)) == ["ATT", "MSG"]
+
+
+def test_read_dataflash_file(tmp_path):
+    path = tmp_path / "flight.bin"
+    path.write_bytes(b"".join([fmt_record(ATT), *att_records(5)]))
+    assert len(read_dataflash(path)["ATT"]) == 5
+
+    empty = tmp_path / "empty.bin"
+    empty.write_bytes(b"\xa3")
+    assert read_dataflash(empty) == {}
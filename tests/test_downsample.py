@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+
+from backend.utils.downsample import decimate, lttb, min_max_decimate
+
+
+def test_lttb_keeps_endpoints_and_order():
+    time_data = np.arange(1000.0)
+    values = np.sin(time_data / 50.0)
+    indices = lttb(time_data, values, 100)
+    assert len(indices) == 100
+    assert indices[0] == 0 and indices[-1] == 999
+    assert np.all(np.diff(indices) > 0)
+
+
+def test_lttb_keeps_a_spike():
+    time_data = np.arange(1000.0)
+    values = np.zeros(1000)
+    values[437] = 100.0
+    assert 437 in lttb(time_data, values, 20)
+
+
+def test_lttb_short_series_and_small_outputs():
+    np.testing.assert_array_equal(lttb(np.arange(5.0), np.arange(5.0), 10), np.arange(5))
+    np.testing.assert_array_equal(lttb(np.arange(5.0), np.arange(5.0), 2), [0, 4])
+    assert len(lttb(np.arange(5.0), np.arange(5.0), 0)) == 0
+
+
+def test_lttb_with_nan_values():
+    values = np.arange(100.0)
+    values[10:20] = np.nan
+    indices = lttb(np.arange(100.0), values, 10)
+    assert len(indices) == 10
+
+
+def test_min_max_keeps_extremes():
+    values = np.random.default_rng(0).normal(size=10_000)
+    indices = min_max_decimate(values, 50)
+    assert values.argmin() in indices and values.argmax() in indices
+    assert len(indices) <= 50
+
+
+def test_decimate():
+    time_data, values = decimate(np.arange(100.0), np.arange(100.0) * 2, 10)
+    np.testing.assert_array_equal(values, time_data * 2)
+    with pytest.raises(ValueError):
+        decimate(np.arange(100.0), np.arange(100.0), 10, "median")
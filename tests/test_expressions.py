@@ -0,0 +1,151 @@
+import xml.etree.ElementTree as ET
+from pathlib import Path
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from backend.services.data_processor import MessageColumns
+from backend.services.expressions import ExpressionError, compile_expression, evaluate_expression
+from backend.utils import mavextra
+
+ASSETS = Path(__file__).resolve().parents[1] / "src" / "assets"
+# graph files whose every expression must compile; mavgraphs2.xml still uses helpers that aren't ported
+GRAPH_FILES = ["mavgraphs.xml", "ekfGraphs.xml", "ekf3Graphs.xml"]
+
+
+def graph_expressions():
+    for name in GRAPH_FILES:
+        for element in ET.parse(ASSETS / name).getroot().iter("expression"):
+            # an <expression> holds several space-separated expressions
+            yield from element.text.split()
+
+
+@pytest.fixture
+def store():
+    att_time = np.arange(0.0, 1000.0, 100.0)
+    gps_time = np.arange(0.0, 901.0, 180.0)
+    return {
+        "ATT": MessageColumns("ATT", {
+            "time_boot_ms": att_time,
+            "Roll": np.linspace(-0.5, 0.5, len(att_time)),
+            "Pitch": np.zeros(len(att_time)),
+            "Yaw": np.full(len(att_time), 90.0),
+        }),
+        "GPS": MessageColumns("GPS", {
+            "time_boot_ms": gps_time,
+            "Alt": gps_time / 10.0,
+            "Lat": np.full(len(gps_time), -35.36),
+            "Lng": np.full(len(gps_time), 149.16),
+            "Status": np.full(len(gps_time), 3),
+        }),
+        "XKF4[0]": MessageColumns("XKF4[0]", {"time_boot_ms": att_time, "SV": np.ones(len(att_time))}),
+    }
+
+
+def test_function_of_a_field(store):
+    time_data, values = evaluate_expression("degrees(ATT.Roll)", store)
+    np.testing.assert_array_equal(time_data, store["ATT"].time)
+    np.testing.assert_allclose(values, 57.2958 * store["ATT"]["Roll"])
+
+
+def test_other_messages_are_interpolated_onto_the_first(store):
+    time_data, values = evaluate_expression("ATT.Roll + GPS.Alt", store)
+    np.testing.assert_array_equal(time_data, store["ATT"].time)
+    np.testing.assert_allclose(values, store["ATT"]["Roll"] + store["ATT"].time / 10.0)
+
+
+def test_condition_and_axis_marker(store):
+    time_data, values = evaluate_expression("XKF4[0].SV * 2:2{ATT.Roll > 0}", store)
+    np.testing.assert_array_equal(time_data, store["ATT"].time[store["ATT"]["Roll"] > 0])
+    np.testing.assert_array_equal(values, np.full(len(time_data), 2.0))
+
+
+def test_vector_component(store):
+    time_data, values = evaluate_expression("expected_mag(GPS,ATT).z", store)
+    # GPS is referenced first, so its clock is the base
+    np.testing.assert_array_equal(time_data, store["GPS"].time)
+    assert np.all(np.isfinite(values))
+
+
+def test_string_keys_of_lowpass_and_delta(store):
+    _, values = evaluate_expression('lowpass(degrees(ATT.Roll),"r",0.9)', store)
+    _, unkeyed = evaluate_expression("lowpass(degrees(ATT.Roll),0,0.9)", store)
+    np.testing.assert_allclose(values, unkeyed)
+    _, values = evaluate_expression('delta(ATT.Roll,"r")', store)
+    np.testing.assert_allclose(values[1:], np.diff(store["ATT"]["Roll"]))
+
+
+def test_ported_pymavlink_helpers(store):
+    _, values = evaluate_expression("wrap_360(ATT.Yaw - 180)", store)
+    np.testing.assert_array_equal(values, np.full(len(values), 270.0))
+    _, values = evaluate_expression("distance_two(GPS,GPS)", store)
+    np.testing.assert_allclose(values, 0.0, atol=1e-6)
+    _, values = evaluate_expression("degrees(atan2(ATT.Yaw, 0))", store)
+    np.testing.assert_allclose(values, 90.0, atol=1e-3)
+
+
+def test_mag_yaw_matches_attitude_yaw_for_the_expected_field(store):
+    # a magnetometer reading exactly the expected field gives back the attitude's yaw
+    gps, att = (SimpleNamespace(**store[msg_type].columns) for msg_type in ("GPS", "ATT"))
+    expected = mavextra.expected_mag(gps, att)
+    mag = SimpleNamespace(MagX=expected.x, MagY=expected.y, MagZ=expected.z)
+    np.testing.assert_allclose(mavextra.mag_yaw(gps, att, mag), 90.0, atol=1e-3)
+    field = mavextra.expected_mag_yaw(gps, att, mag)
+    for component in ("x", "y", "z"):
+        np.testing.assert_allclose(getattr(field, component), getattr(expected, component), atol=1e-2)
+
+
+def test_earth_field_error_is_zero_without_a_fix(store):
+    store["GPS"]["Status"][:] = 1
+    store["NKF2"] = MessageColumns("NKF2", {"time_boot_ms": store["GPS"].time, "MN": np.ones(6),
+                                            "ME": np.ones(6), "MD": np.ones(6)})
+    _, values = evaluate_expression("earth_field_error(GPS,NKF2).x", store)
+    np.testing.assert_array_equal(values, 0.0)
+
+
+def test_sim_body_rates_of_a_steady_yaw():
+    time_us = np.arange(10) * 1.0e5
+    sim = MessageColumns("SIM", {"time_boot_ms": time_us / 1000.0, "TimeUS": time_us, "Roll": np.zeros(10),
+                                 "Pitch": np.zeros(10), "Yaw": np.arange(10) * 9.0})
+    _, values = evaluate_expression("sim_body_rates(SIM).z", {"SIM": sim})
+    np.testing.assert_allclose(values[1:], mavextra.radians(90.0))
+
+
+def test_every_graph_expression_compiles():
+    failures = []
+    for expression in sorted(set(graph_expressions())):
+        try:
+            compile_expression(expression)
+        except ExpressionError as e:
+            failures.append(str(e))
+    assert failures == []
+
+
+def test_compiled_expressions_are_reused():
+    assert compile_expression("degrees(ATT.Roll)") is compile_expression("degrees(ATT.Roll)")
+    assert compile_expression("ATT.Roll + GPS.Alt").messages == ["ATT", "GPS"]
+
+
+@pytest.mark.parametrize("expression", [
+    "ATT.Roll.__class__",
+    "ATT.Roll.real",
+    "ATT.Roll.x",
+    "ATT",
+    "ATT + 1",
+    "degrees(ATT)",
+    "degrees(ATT.Roll, ATT.Pitch)",
+    "expected_mag(GPS,ATT)",
+    "__import__('os').getcwd()",
+    "ATT.Roll if ATT.Pitch else 0",
+    "open(ATT.Roll)",
+    "degrees('ATT')",
+    "lowpass(ATT.Roll, 0.9, 'r')",
+    "1 + 2",
+    "ATT.Roll +",
+    "ATT.Nope",
+    "BARO.Alt",
+])
+def test_invalid_expressions_raise_expression_error(store, expression):
+    with pytest.raises(ExpressionError):
+        evaluate_expression(expression, store)
@@ -0,0 +1,100 @@
+import asyncio
+
+import pytest
+
+# the summarizer calls the LLM clients, which need the API packages installed
+pytest.importorskip("openai")
+pytest.importorskip("langchain_core")
+
+from backend.services.conversation_store import InMemoryConversationStore, SQLiteConversationStore
+from backend.services.history_manager import HistoryManager, build_prompt, history_key
+
+# 80 characters is 20 tokens, plus 4 per message
+CONTENT = "x" * 80
+
+
+class Summarizer:
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, summary, messages):
+        self.calls.append(len(messages))
+        return f"{summary}+{len(messages)}"
+
+    async def asummarize(self, summary, messages):
+        return self(summary, messages)
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    if request.param == "sqlite":
+        return SQLiteConversationStore(str(tmp_path / "conversations.db"))
+    return InMemoryConversationStore()
+
+
+def make_manager(store, summarizer, token_budget=100):
+    return HistoryManager(store, token_budget=token_budget, min_recent=4,
+                          summarize_fn=summarizer, asummarize_fn=summarizer.asummarize)
+
+
+def add_messages(store, count, start=0):
+    for i in range(start, start + count):
+        store.append_message("c", "user" if i % 2 == 0 else "assistant", f"{i}:{CONTENT}")
+
+
+def test_within_budget_sends_everything(store):
+    summarizer = Summarizer()
+    add_messages(store, 3)
+    summary, recent = make_manager(store, summarizer).compact(store.get_or_create("c"))
+    assert summary == "" and len(recent) == 3
+    assert summarizer.calls == []
+
+
+def test_over_budget_folds_the_oldest_messages(store):
+    summarizer = Summarizer()
+    manager = make_manager(store, summarizer)
+    add_messages(store, 10)
+    summary, recent = manager.compact(store.get_or_create("c"))
+    assert summarizer.calls == [6]
+    assert summary == "+6"
+    assert [message["content"][:2] for message in recent] == ["6:", "7:", "8:", "9:"]
+    assert store.get_summary("c") == ("+6", 6)
+
+    # the next turn folds one more message into the stored summary, not the whole history again
+    add_messages(store, 1, start=10)
+    summary, recent = manager.compact(store.get_or_create("c"))
+    assert summarizer.calls == [6, 1]
+    assert summary == "+6+1" and len(recent) == 4
+
+
+def test_acompact_matches_compact(store):
+    summarizer = Summarizer()
+    add_messages(store, 10)
+    summary, recent = asyncio.run(make_manager(store, summarizer).acompact(store.get_or_create("c")))
+    assert summary == "+6" and len(recent) == 4
+
+
+def test_conversation_without_id_is_sent_verbatim():
+    messages = [{"role": "user", "content": CONTENT}] * 10
+    summary, recent = make_manager(InMemoryConversationStore(), Summarizer()).compact({"messages": messages})
+    assert summary == "" and recent == messages
+
+
+def test_history_key():
+    question = {"role": "user", "content": "max altitude?"}
+    answer = {"role": "assistant", "content": "120 m"}
+    # a first question is keyed the same in every conversation
+    assert history_key("", [question]) == ""
+    key = history_key("", [question, answer, question])
+    assert key and key == history_key("", [question, answer, {"role": "user", "content": "anything"}])
+    assert key != history_key("", [question, {"role": "assistant", "content": "80 m"}, question])
+    assert key != history_key("summary", [question, answer, question])
+
+
+def test_build_prompt_keeps_the_stable_parts_first():
+    recent = [{"role": "user", "content": "q", "extra": "dropped"}]
+    messages = build_prompt("system", "summary", recent, "ATT: Roll")
+    assert [message["role"] for message in messages] == ["system", "system", "system", "user"]
+    assert messages[1]["content"].endswith("ATT: Roll")
+    assert messages[2]["content"].endswith("summary")
+    assert messages[3] == {"role": "user", "content": "q"}
@@ -0,0 +1,102 @@
+import json
+
+import numpy as np
+import pytest
+
+from backend.services.data_processor import ColumnStoreBuilder, TIME_FIELD
+
+
+def ndjson(*records):
+    return b"".join(json.dumps(record).encode("utf-8") + b"\n" for record in records)
+
+
+def chunk(msg_type, **fields):
+    return {"type": msg_type, "fields": fields}
+
+
+def test_lines_split_across_feeds():
+    data = ndjson(
+        chunk("ATT", time_boot_ms=[1, 2], Roll=[0.5, 0.6]),
+        chunk("GPS[0]", time_boot_ms=[1], Alt=[10.0]),
+        chunk("ATT", time_boot_ms=[3], Roll=[0.7]),
+    )
+    builder = ColumnStoreBuilder()
+    for start in range(0, len(data), 7):
+        builder.feed(data[start:start + 7])
+    builder.close()
+    store = builder.build()
+
+    assert sorted(store) == ["ATT", "GPS[0]"]
+    np.testing.assert_array_equal(store["ATT"].time, [1, 2, 3])
+    np.testing.assert_array_equal(store["ATT"]["Roll"], [0.5, 0.6, 0.7])
+
+
+def test_trailing_record_without_newline():
+    builder = ColumnStoreBuilder()
+    builder.feed(json.dumps(chunk("ATT", time_boot_ms=[1], Roll=[0.5])).encode("utf-8"))
+    assert builder.build() == {}
+    assert builder.close() == 1
+    assert len(builder.build()["ATT"]) == 1
+
+
+def test_disallowed_types_are_skipped():
+    builder = ColumnStoreBuilder(allowed_types={"ATT"})
+    builder.feed(ndjson(chunk("ATT", time_boot_ms=[1], Roll=[0.5]), chunk("BARO", time_boot_ms=[1], Alt=[3.0])))
+    assert list(builder.build()) == ["ATT"]
+    assert builder.skipped_types == {"BARO"}
+
+
+@pytest.mark.parametrize("line", [b"{not json}\n", b'{"fields": {}}\n', b'{"type": "ATT", "fields": {"Roll": [1]}}\n'])
+def test_invalid_records_raise_value_error(line):
+    with pytest.raises(ValueError):
+        ColumnStoreBuilder().feed(line)
+
+
+def test_field_missing_from_a_chunk_is_dropped():
+    builder = ColumnStoreBuilder()
+    builder.feed(ndjson(
+        chunk("ATT", time_boot_ms=[1, 2], Roll=[0.5, 0.6], Pitch=[1.0, 2.0]),
+        chunk("ATT", time_boot_ms=[3], Roll=[0.7]),
+    ))
+    columns = builder.build()["ATT"]
+    assert len(columns) == 3
+    assert "Pitch" not in columns
+
+
+def test_mixed_chunk_dtypes_are_promoted():
+    builder = ColumnStoreBuilder()
+    builder.feed(ndjson(
+        chunk("MSG", time_boot_ms=[1, 2], Count=[1, 2], Text=["a", "b"]),
+        chunk("MSG", time_boot_ms=[3], Count=[2.5], Text=["longer"]),
+        chunk("MSG", time_boot_ms=[4], Count=[3], Text=[7]),
+    ))
+    columns = builder.build()["MSG"]
+    assert columns["Count"].dtype == np.float64
+    np.testing.assert_array_equal(columns["Count"], [1, 2, 2.5, 3])
+    # strings and numbers have no common dtype
+    assert columns["Text"].dtype == object
+    assert list(columns["Text"]) == ["a", "b", "longer", 7]
+
+
+def records(n_chunks, chunk_size):
+    for i in range(n_chunks):
+        time = np.arange(i * chunk_size, (i + 1) * chunk_size)
+        # integer Roll chunks followed by float ones, to promote after spilling
+        roll = time if i < n_chunks // 2 else time + 0.5
+        yield chunk("ATT", time_boot_ms=time.tolist(), Roll=roll.tolist(), Mode=["AUTO"] * chunk_size)
+
+
+def test_spilled_build_matches_in_memory_build(tmp_path):
+    data = ndjson(*records(20, 500))
+    in_memory = ColumnStoreBuilder()
+    in_memory.feed(data)
+    spilling = ColumnStoreBuilder(spill_dir=tmp_path, max_buffer_bytes=16 * 1024)
+    for start in range(0, len(data), 4096):
+        spilling.feed(data[start:start + 4096])
+        assert sum(builder.buffered_bytes for builder in spilling.builders.values()) < 64 * 1024
+
+    expected, actual = in_memory.build()["ATT"], spilling.build()["ATT"]
+    assert isinstance(actual[TIME_FIELD], np.memmap)
+    for field_name in (TIME_FIELD, "Roll", "Mode"):
+        assert actual[field_name].dtype == expected[field_name].dtype
+        np.testing.assert_array_equal(actual[field_name], expected[field_name])
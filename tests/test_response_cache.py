@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+
+# the cache embeds queries with the shared OpenAI client
+pytest.importorskip("openai")
+pytest.importorskip("langchain_core")
+
+from backend.services.response_cache import ResponseCache, normalize_query
+
+VERSION = "validation-v2"
+
+
+def test_normalized_queries_share_an_entry():
+    cache = ResponseCache()
+    cache.set("flight", "What's the max   altitude?", VERSION, True)
+    assert normalize_query("What's the max   altitude?") == "what s the max altitude"
+    assert cache.get("flight", "what's the MAX altitude", VERSION) is True
+
+
+def test_new_revision_misses():
+    cache = ResponseCache()
+    cache.set("flight", "max altitude?", VERSION, "120 m", revision=1)
+    assert cache.get("flight", "max altitude?", VERSION, revision=1) == "120 m"
+    assert cache.get("flight", "max altitude?", VERSION, revision=2) is None
+    assert cache.get("other", "max altitude?", VERSION, revision=1) is None
+    assert cache.get("flight", "max altitude?", "validation-v3", revision=1) is None
+
+
+def test_context_separates_conversations():
+    cache = ResponseCache()
+    cache.set("flight", "and the minimum?", VERSION, "80 m", context="history-a")
+    assert cache.get("flight", "and the minimum?", VERSION, context="history-a") == "80 m"
+    assert cache.get("flight", "and the minimum?", VERSION, context="history-b") is None
+    assert cache.get("flight", "and the minimum?", VERSION) is None
+
+
+def test_similar_queries_only_match_the_same_revision():
+    vectors = {"max altitude": [1.0, 0.0], "highest altitude": [0.99, 0.05], "battery": [0.0, 1.0]}
+    cache = ResponseCache(embed_fn=lambda text: np.array(vectors[text]))
+    cache.set("flight", "max altitude", VERSION, "120 m", revision=1)
+    assert cache.get("flight", "highest altitude", VERSION, revision=1) == "120 m"
+    assert cache.get("flight", "highest altitude", VERSION, revision=2) is None
+    assert cache.get("flight", "battery", VERSION, revision=1) is None
+
+
+def test_entries_expire_and_are_bounded(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("backend.services.response_cache.time.monotonic", lambda: now[0])
+    cache = ResponseCache(max_entries=2, ttl_seconds=10)
+    for query in ("a", "b", "c"):
+        cache.set("flight", query, VERSION, query)
+    assert cache.get("flight", "a", VERSION) is None
+    assert cache.get("flight", "c", VERSION) == "c"
+    now[0] += 11
+    assert cache.get("flight", "c", VERSION) is None
@@ -0,0 +1,164 @@
+import json
+
+import numpy as np
+import pytest
+
+from backend.services.column_export import append_message_columns
+from backend.services.data_processor import MessageColumns
+from backend.services.session_store import (
+    PREFIX_INDEX_FILE,
+    AppendConflictError,
+    SessionStore,
+    build_stats,
+    prefix_hash,
+)
+
+
+def att(stop, start=0):
+    rows = np.arange(start, stop)
+    return MessageColumns("ATT", {
+        "time_boot_ms": rows * 10.0,
+        "Roll": np.sin(rows / 10.0),
+        "Mode": rows % 3,
+    })
+
+
+def gps(stop):
+    rows = np.arange(stop)
+    return MessageColumns("GPS[0]", {"time_boot_ms": rows * 100.0, "Alt": rows * 1.5})
+
+
+@pytest.fixture
+def store(tmp_path):
+    return SessionStore(tmp_path / "sessions")
+
+
+def assert_session_matches(session, expected):
+    columns = session.get_columns("ATT")
+    for field_name in expected.columns:
+        np.testing.assert_array_equal(columns[field_name], expected[field_name])
+    full = session.range_stats("ATT", "Roll")
+    assert full["count"] == len(expected)
+    assert full["min"] == pytest.approx(expected["Roll"].min())
+    assert full["mean"] == pytest.approx(expected["Roll"].mean())
+    stats, expected_stats = session.get_stats("ATT").to_stats(), build_stats(expected).to_stats()
+    for field_name in ("Roll", "Mode"):
+        for key in ("min", "max", "mean", "std", "count"):
+            assert stats[field_name][key] == pytest.approx(expected_stats[field_name][key])
+
+
+def test_prefix_hash_depends_only_on_the_first_samples():
+    assert prefix_hash(att(100)) == prefix_hash(att(5000))
+    assert prefix_hash(att(100)) != prefix_hash(att(100, start=1))
+
+
+def test_reupload_of_a_longer_log_appends(store):
+    session, previous = store.ingest({"ATT": att(1000)})
+    assert previous is None and session.revision == 0
+
+    appended, previous = store.ingest({"ATT": att(1500), "GPS[0]": gps(20)})
+    assert appended.flight_id == session.flight_id
+    assert previous == {"ATT": 1000, "GPS[0]": 0}
+    assert appended.revision == 1
+    assert_session_matches(appended, att(1500))
+    assert len(appended.get_columns("GPS[0]")) == 20
+
+
+def test_new_samples_only_append_to_flight_id(store):
+    session, _ = store.ingest({"ATT": att(1000)})
+    appended, previous = store.ingest({"ATT": att(1700, start=1000)}, session.flight_id)
+    assert previous == {"ATT": 1000}
+    assert_session_matches(appended, att(1700))
+
+
+def test_reupload_with_nothing_new_keeps_the_revision(store):
+    session, _ = store.ingest({"ATT": att(1000)})
+    same, previous = store.ingest({"ATT": att(1000)})
+    assert same.flight_id == session.flight_id and same.revision == 0
+    assert previous == {"ATT": 1000}
+
+
+def test_shorter_reupload_becomes_a_new_flight(store):
+    session, _ = store.ingest({"ATT": att(1000)})
+    shorter, previous = store.ingest({"ATT": att(500)})
+    assert previous is None
+    assert shorter.flight_id != session.flight_id
+    assert len(store.get(session.flight_id).get_columns("ATT")) == 1000
+
+    # an explicit flight ID still refuses it, before writing anything
+    with pytest.raises(AppendConflictError):
+        store.ingest({"ATT": att(500)}, session.flight_id)
+    with pytest.raises(AppendConflictError):
+        changed = att(1200)
+        # the last stored sample is always among the rows compared
+        changed["Roll"][999] += 1.0
+        store.ingest({"ATT": changed}, session.flight_id)
+    assert store.get(session.flight_id).revision == 0
+
+
+def test_interrupted_append_is_invisible_and_retried(store, tmp_path):
+    session, _ = store.ingest({"ATT": att(1000)})
+    # the column files get new samples, but the session index is never committed
+    append_message_columns(att(1300, start=1000), str(session.manifest_path("ATT")), at=1000)
+
+    reloaded = SessionStore(tmp_path / "sessions").get(session.flight_id)
+    assert reloaded.revision == 0
+    assert_session_matches(reloaded, att(1000))
+
+    appended, previous = SessionStore(tmp_path / "sessions").ingest({"ATT": att(1200)})
+    assert previous == {"ATT": 1000} and appended.revision == 1
+    assert_session_matches(appended, att(1200))
+
+
+def test_appends_replace_pyramid_and_stats_files(store):
+    session, _ = store.ingest({"ATT": att(1000)})
+    first = (session.pyramid_path("ATT"), session.stats_path("ATT"))
+    appended, _ = store.ingest({"ATT": att(1100)})
+    second = (appended.pyramid_path("ATT"), appended.stats_path("ATT"))
+    assert first != second
+    assert all(path.exists() for path in second)
+    assert not any(path.exists() for path in first)
+
+
+def test_reuploads_are_found_through_the_prefix_index(store, tmp_path):
+    first, _ = store.ingest({"ATT": att(1000)})
+    second, _ = store.ingest({"GPS[0]": gps(20)})
+    index = json.loads((tmp_path / "sessions" / PREFIX_INDEX_FILE).read_text())
+    assert index == {prefix_hash(att(1000)): [first.flight_id], prefix_hash(gps(20)): [second.flight_id]}
+    assert store.find_session_for({"ATT": att(2000)}) == first.flight_id
+    assert store.find_session_for({"ATT": att(100, start=1)}) is None
+
+    # stores written before the index existed are indexed from their sessions
+    (tmp_path / "sessions" / PREFIX_INDEX_FILE).unlink()
+    assert SessionStore(tmp_path / "sessions").find_session_for({"GPS[0]": gps(30)}) == second.flight_id
+
+
+def test_resident_sessions_reload_after_an_append_elsewhere(store, tmp_path):
+    session, _ = store.ingest({"ATT": att(100)})
+    # a second store on the same root stands in for a worker process
+    worker = SessionStore(tmp_path / "sessions")
+    assert len(worker.get(session.flight_id).get_columns("ATT")) == 100
+
+    store.ingest({"ATT": att(150)})
+    reloaded = worker.get(session.flight_id)
+    assert reloaded.revision == 1
+    assert_session_matches(reloaded, att(150))
+
+
+def test_superseded_sessions_rebuild_without_writing_files(store):
+    session, _ = store.ingest({"ATT": att(100)})
+    old_pyramid, old_stats = session.pyramid_path("ATT"), session.stats_path("ATT")
+    store.ingest({"ATT": att(150)})
+    assert not old_pyramid.exists() and not old_stats.exists()
+
+    assert session.range_stats("ATT", "Roll")["count"] == 100
+    assert session.get_stats("ATT").to_stats()["Roll"]["count"] == 100
+    assert not old_pyramid.exists() and not old_stats.exists()
+
+
+@pytest.mark.parametrize("flight_id", ["..", "../sessions", "a/b", "", "x.json"])
+def test_flight_ids_outside_the_store_are_unknown(store, flight_id):
+    store.ingest({"ATT": att(100)})
+    assert not store.exists(flight_id)
+    with pytest.raises(KeyError):
+        store.get(flight_id)
@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+
+from backend.utils.stats_calculator import RESERVOIR_SIZE, StatsAccumulator, calculate_message_stats
+
+FIELDS = ["Roll", "Alt"]
+
+
+def flight(n, seed=0):
+    rng = np.random.default_rng(seed)
+    time_ms = np.cumsum(rng.integers(0, 20, n)).astype(np.float64)
+    values = np.column_stack([rng.normal(size=n), rng.uniform(0, 100, n)])
+    values[rng.choice(n, n // 20, replace=False), 1] = np.nan
+    return time_ms, values
+
+
+def assert_stats_match(actual, expected, exact_percentiles=True):
+    for field_name in FIELDS:
+        got, want = actual[field_name], expected[field_name]
+        for key in ("min", "max", "mean", "std"):
+            assert got[key] == pytest.approx(want[key], rel=1e-9)
+        assert got["count"] == want["count"] and got["nan_count"] == want["nan_count"]
+        for key in ("max_abs_per_s", "mean_abs_per_s"):
+            assert got["rate_of_change"][key] == pytest.approx(want["rate_of_change"][key], rel=1e-9)
+        if exact_percentiles:
+            assert got["percentiles"] == pytest.approx(want["percentiles"])
+
+
+@pytest.mark.parametrize("splits", [[1], [500], [250, 251, 900]])
+def test_merged_blocks_match_a_full_pass(splits):
+    time_ms, values = flight(1000)
+    blocks = np.split(np.arange(len(time_ms)), splits)
+    merged = StatsAccumulator.from_values(time_ms[blocks[0]], values[blocks[0]], FIELDS)
+    for rows in blocks[1:]:
+        merged = merged.merge(StatsAccumulator.from_values(time_ms[rows], values[rows], FIELDS))
+    assert_stats_match(merged.to_stats(), calculate_message_stats(time_ms, values, FIELDS))
+
+
+def test_percentiles_become_approximate_past_the_reservoir():
+    time_ms, values = flight(3 * RESERVOIR_SIZE)
+    half = len(time_ms) // 2
+    merged = StatsAccumulator.from_values(time_ms[:half], values[:half], FIELDS).merge(
+        StatsAccumulator.from_values(time_ms[half:], values[half:], FIELDS))
+    stats, exact = merged.to_stats(), calculate_message_stats(time_ms, values, FIELDS)
+
+    assert_stats_match(stats, exact, exact_percentiles=False)
+    assert stats["Alt"]["percentiles_approximate"]
+    assert stats["Alt"]["percentiles"]["p50"] == pytest.approx(exact["Alt"]["percentiles"]["p50"], abs=3.0)
+    assert exact["Alt"]["percentiles_approximate"] is False
+
+
+def test_all_nan_field():
+    time_ms = np.arange(10.0)
+    values = np.column_stack([np.arange(10.0), np.full(10, np.nan)])
+    stats = StatsAccumulator.from_values(time_ms[:5], values[:5], FIELDS).merge(
+        StatsAccumulator.from_values(time_ms[5:], values[5:], FIELDS)).to_stats()
+    assert stats["Alt"]["min"] is None and stats["Alt"]["mean"] is None
+    assert stats["Alt"]["count"] == 0 and stats["Alt"]["nan_count"] == 10
+    assert stats["Roll"]["mean"] == pytest.approx(4.5)
+
+
+def test_merge_requires_the_same_fields():
+    time_ms, values = flight(10)
+    with pytest.raises(ValueError):
+        StatsAccumulator.from_values(time_ms, values, FIELDS).merge(
+            StatsAccumulator.from_values(time_ms, values, ["Roll", "Pitch"]))
+
+
+def test_save_and_load(tmp_path):
+    time_ms, values = flight(100)
+    accumulator = StatsAccumulator.from_values(time_ms, values, FIELDS)
+    loaded = StatsAccumulator.load(accumulator.save(tmp_path / "stats.npz"))
+    assert loaded.field_names == FIELDS
+    assert loaded.to_stats() == accumulator.to_stats()